@@ -1,8 +1,41 @@
-import os
 import io
-from typing import List, Dict, Any
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache, partial
+from typing import List, Dict, Any, Iterator, Optional
 import streamlit as st
-import pandas as pd
+from autofill_extract import (
+    extract_text_from_upload,
+    extract_texts,
+    extraction_cache_stats,
+    pdf_page_stats,
+    semear_cache,
+    versao_extrator,
+)
+from autofill_campos import FIELDS_PART1, FIELDS_PART2
+from autofill_dossiers import DossierStore, dossiers
+from autofill_arranque import aquecer_em_fundo, estado_aquecimento
+from autofill_retrieval import IndiceBM25, sincronizar
+from autofill_llm import (
+    CONCORRENCIA_IA,
+    INTERATIVO,
+    LOTE,
+    StreamStats,
+    cached_completion,
+    chat_texto,
+    escalonador_stats,
+    gerar_em_lote_sync,
+    get_openai_client,
+    llm_cache_stats,
+    origem_pedido,
+    stream_completion,
+)
+import autofill_trace
+from autofill_trace import instrumentar, span
 
 # =========================
 #  ⚙️ CONFIG GERAL
@@ -26,19 +59,11 @@ def _get_openai_client():
     if not key:
         return None, "OPENAI_API_KEY não definida em st.secrets ou variável de ambiente."
     try:
-        from openai import OpenAI
-        return OpenAI(api_key=key), ""
+        return get_openai_client(key), ""
     except Exception as e:
         return None, f"Biblioteca openai não disponível. Faz: pip install openai  [{e}]"
 
-def chamar_ia_base(user: str, extra_system: str = "") -> str:
-    """
-    Usa apenas Chat Completions (messages) para evitar erros de 'fluxo de mensagens'.
-    """
-    client, err = _get_openai_client()
-    if not client:
-        return f"[IA inativa] {err}"
-
+def _mensagens(user: str, extra_system: str = "") -> List[Dict[str, str]]:
     system = (
         "És um assistente que escreve conteúdo técnico e claro para formulários de projetos de investimento "
         "e candidaturas a programas de financiamento. Utilizas sempre fontes oficiais e fidedignas de informação, atualizadas.\n"
@@ -48,27 +73,84 @@ def chamar_ia_base(user: str, extra_system: str = "") -> str:
     if extra_system:
         system += "\n" + extra_system
 
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+@instrumentar("chamar_ia_base", lambda res, user, *a, **k: {"letras_prompt": len(user), "letras": len(res)})
+def chamar_ia_base(user: str, extra_system: str = "", regenerar: bool = False) -> str:
+    """
+    Usa apenas Chat Completions (messages) para evitar erros de 'fluxo de mensagens'.
+    Pedidos idênticos vêm do cache persistente, exceto com `regenerar=True`.
+    """
+    client, err = _get_openai_client()
+    if not client:
+        return f"[IA inativa] {err}"
+
+    messages = _mensagens(user, extra_system)
+
+    def pedido() -> str:
+        return chat_texto(client, AI_MODEL, messages, 0.4)
+
     try:
-        resp = client.chat.completions.create(
-            model=AI_MODEL,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.4,
-        )
-        return (resp.choices[0].message.content or "").strip()
+        return cached_completion(AI_MODEL, messages, 0.4, pedido, regenerar=regenerar)
     except Exception as e:
         return f"[ERRO AO CHAMAR OPENAI (chat.completions)]: {e}"
 
-def chamar_ia_para_campo(label: str, instrucao: str, contexto: str) -> str:
-    user = (
+def chamar_ia_base_stream(
+    user: str,
+    extra_system: str = "",
+    regenerar: bool = False,
+    cancel: Optional[threading.Event] = None,
+    stats: Optional[StreamStats] = None,
+) -> Iterator[str]:
+    """
+    Como `chamar_ia_base`, mas devolve o texto aos pedaços à medida que a API o gera.
+    Um erro chega como último pedaço, para aparecer no campo como no modo normal.
+    """
+    client, err = _get_openai_client()
+    if not client:
+        yield f"[IA inativa] {err}"
+        return
+    with span("chamar_ia_base_stream", letras_prompt=len(user)) as s:
+        pedacos = stream_completion(
+            client, AI_MODEL, _mensagens(user, extra_system), 0.4,
+            regenerar=regenerar, cancel=cancel, stats=stats,
+        )
+        letras = 0
+        try:
+            for pedaco in pedacos:
+                letras += len(pedaco)
+                yield pedaco
+        except Exception as e:
+            yield f"\n[ERRO AO CHAMAR OPENAI (stream)]: {e}"
+        finally:
+            pedacos.close()  # como o `yield from`: fechar este gerador fecha a ligação
+            s.set(letras=letras)
+
+def _prompt_campo(label: str, instrucao: str, contexto: str) -> str:
+    return (
         f"# Tarefa\nPreenche o campo: **{label}**.\n\n"
         f"# Instrução específica\n{instrucao}\n\n"
         f"# Estilo\n- Português de Portugal\n- Tom profissional, direto; usar listas quando útil.\n\n"
         f"# Contexto\n{contexto}\n"
     )
-    return chamar_ia_base(user)
+
+def chamar_ia_para_campo(label: str, instrucao: str, contexto: str, regenerar: bool = False) -> str:
+    return chamar_ia_base(_prompt_campo(label, instrucao, contexto), regenerar=regenerar)
+
+def chamar_ia_para_campo_stream(
+    label: str,
+    instrucao: str,
+    contexto: str,
+    regenerar: bool = False,
+    cancel: Optional[threading.Event] = None,
+    stats: Optional[StreamStats] = None,
+) -> Iterator[str]:
+    return chamar_ia_base_stream(
+        _prompt_campo(label, instrucao, contexto), regenerar=regenerar, cancel=cancel, stats=stats
+    )
 
 # =========================
 #  🧰 HELPERS (uploads/extração)
@@ -76,150 +158,332 @@ def chamar_ia_para_campo(label: str, instrucao: str, contexto: str) -> str:
 def truncate(txt: str, limit: int = LIMITE_CONTEXTO) -> str:
     return txt if len(txt) <= limit else txt[:limit] + "\n\n[Contexto truncado…]"
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    try:
-        import pypdf
-        reader = pypdf.PdfReader(io.BytesIO(file_bytes))
-        pages = []
-        for p in reader.pages:
-            pages.append(p.extract_text() or "")
-        return "\n".join(pages)
-    except Exception as e:
-        return f"[ERRO a ler PDF: {e}]"
+CAMPOS_BASE = {
+    "Empresa": "empresa_nome",
+    "Promotor": "promotor_nome",
+    "Setor": "setor",
+    "Localização": "localizacao",
+    "Público-alvo": "publico_alvo",
+    "Proposta de valor": "proposta_valor",
+    "Resumo": "resumo_geral",
+}
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    try:
-        import docx
-        doc = docx.Document(io.BytesIO(file_bytes))
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception as e:
-        return f"[ERRO a ler DOCX: {e}]"
-
-def extract_text_from_xlsx(file_bytes: bytes) -> str:
-    try:
-        with io.BytesIO(file_bytes) as f:
-            dfs = pd.read_excel(f, sheet_name=None)
-        parts = []
-        for name, df in dfs.items():
-            parts.append(f"\n### Folha: {name}\n")
-            parts.append(df.to_csv(index=False, sep=";", line_terminator="\n"))
-        return "\n".join(parts)
-    except Exception as e:
-        return f"[ERRO a ler XLSX: {e}]"
-
-def extract_text_from_upload(files) -> str:
-    texts = []
-    for uf in files or []:
-        name = uf.name.lower()
-        content = uf.read()
-        if name.endswith(".pdf"):
-            txt = extract_text_from_pdf(content)
-        elif name.endswith(".docx"):
-            txt = extract_text_from_docx(content)
-        elif name.endswith(".xlsx"):
-            txt = extract_text_from_xlsx(content)
-        else:
-            try:
-                txt = content.decode("utf-8", errors="ignore")
-            except Exception:
-                txt = "[Formato não suportado]"
-        texts.append(f"\n---\nFicheiro: {uf.name}\n{txt}")
-    return "\n".join(texts).strip()
+@lru_cache(maxsize=256)
+def _contexto_campos(valores: tuple) -> str:
+    linhas = [f"- {k}: {v}" for k, v in zip(CAMPOS_BASE, valores) if str(v).strip()]
+    return "Contexto (campos base):\n" + "\n".join(linhas) if linhas else ""
 
 def build_context_from_fields(state: Dict[str, Any]) -> str:
-    campos = {
-        "Empresa": state.get("empresa_nome", ""),
-        "Promotor": state.get("promotor_nome", ""),
-        "Setor": state.get("setor", ""),
-        "Localização": state.get("localizacao", ""),
-        "Público-alvo": state.get("publico_alvo", ""),
-        "Proposta de valor": state.get("proposta_valor", ""),
-        "Resumo": state.get("resumo_geral", ""),
-    }
-    linhas = [f"- {k}: {v}" for k, v in campos.items() if str(v).strip()]
-    return "Contexto (campos base):\n" + "\n".join(linhas) if linhas else ""
+    return _contexto_campos(tuple(str(state.get(k, "")) for k in CAMPOS_BASE.values()))
+
+def _assinatura_uploads(files) -> tuple:
+    # file_id muda a cada upload; objetos sem ele (testes, CLI) são identificados pelo conteúdo.
+    return tuple(
+        (uf.name, getattr(uf, "file_id", None) or hashlib.sha1(uf.getvalue()).hexdigest())
+        for uf in files or []
+    )
 
-def build_context(modo_fontes: str, session: Dict[str, Any], uploaded_files) -> str:
+def _indice_documentos(session: Dict[str, Any], uploaded_files) -> IndiceBM25:
+    """Índice BM25 dos uploads desta sessão; só os ficheiros novos são extraídos e indexados."""
+    indice = session.get("_indice_docs")
+    if indice is None:
+        indice = session["_indice_docs"] = IndiceBM25()
+    assinatura = _assinatura_uploads(uploaded_files)
+    if session.get("_indice_assinatura") != assinatura:
+        sincronizar(indice, [(uf.name, uf.getvalue()) for uf in uploaded_files or []], extract_texts)
+        session["_indice_assinatura"] = assinatura
+    return indice
+
+def _texto_documentos(session: Dict[str, Any], uploaded_files, orcamento: int) -> str:
+    """Início dos documentos (até `orcamento`), guardado na sessão enquanto os uploads não mudam."""
+    chave = (_assinatura_uploads(uploaded_files), orcamento)
+    guardado = session.get("_docs_texto")
+    if guardado is None or guardado[0] != chave:
+        guardado = session["_docs_texto"] = (chave, extract_text_from_upload(uploaded_files, budget=orcamento))
+    return guardado[1]
+
+@instrumentar("build_context", lambda res, modo_fontes, session, uploaded_files, consulta="": {
+    "modo": modo_fontes, "ficheiros": len(uploaded_files or []),
+    "bm25": bool(consulta and uploaded_files and session.get("ia_retrieval", True)),
+    "letras": len(res),
+})
+def build_context(modo_fontes: str, session: Dict[str, Any], uploaded_files, consulta: str = "") -> str:
+    """Contexto para um campo. Com `consulta` (título + instrução do campo), os documentos
+    entram pelos excertos mais relevantes; sem ela, pelo início, até ao limite."""
     partes = []
     if modo_fontes in ("Campos anteriores", "Ambos"):
         app_ctx = build_context_from_fields(session)
         if app_ctx: partes.append(app_ctx)
     if modo_fontes in ("Documentos", "Ambos"):
-        doc_txt = extract_text_from_upload(uploaded_files)
+        usado = len("\n\n".join(partes + ["Contexto (documentos):\n"]))
+        if consulta and uploaded_files and session.get("ia_retrieval", True):
+            doc_txt = _indice_documentos(session, uploaded_files).contexto(consulta, max(0, LIMITE_CONTEXTO - usado))
+        else:
+            # Só se extrai o que cabe no limite (+ folga para o corte coincidir com o do truncate).
+            orcamento = max(0, LIMITE_CONTEXTO - usado) + 64
+            doc_txt = _texto_documentos(session, uploaded_files, orcamento)
         if doc_txt: partes.append("Contexto (documentos):\n" + doc_txt)
     ctx = "\n\n".join(partes)
     return truncate(ctx, LIMITE_CONTEXTO)
 
 # =========================
-#  🧩 CAMPOS
+#  💾 DOSSIER (gravação automática)
 # =========================
-FIELDS_PART1: List[Dict[str, str]] = [
-    {"label": "Nome da empresa", "key": "empresa_nome", "prompt": "Indica o nome oficial da entidade promotora."},
-    {"label": "Nome do promotor", "key": "promotor_nome", "prompt": "Identifica o(s) promotor(es) do projeto e função."},
-    {"label": "Setor de atividade", "key": "setor", "prompt": "Resume o setor de atividade (CAE) e especialização."},
-    {"label": "Localização", "key": "localizacao", "prompt": "Indica a localização do projeto (concelho, região)."},
-    {"label": "Público-alvo", "key": "publico_alvo", "prompt": "Define o público-alvo e segmentos relevantes."},
-    {"label": "Proposta de valor", "key": "proposta_valor", "prompt": "Explica a proposta de valor e diferenciação."},
-    {"label": "Resumo geral do projeto", "key": "resumo_geral", "prompt": "Apresenta um resumo executivo claro do projeto."},
-]
-
-FIELDS_PART2: List[Dict[str, str]] = [
-    {"label": "1.1. Historial e apresentação do promotor", "key": "historial", "prompt": "Elabora o historial e a apresentação do promotor, incluindo experiência e resultados relevantes."},
-    {"label": "1.3. Missão, visão e valores da empresa", "key": "missao", "prompt": "Define missão, visão e valores, alinhados com o projeto e o setor."},
-    {"label": "1.4. Objetivos do projeto", "key": "objetivos", "prompt": "Estabelece objetivos específicos, mensuráveis, alcançáveis, relevantes e temporizados (SMART)."},
-    {"label": "1.5. O projeto, o serviço e a ideia", "key": "projeto_servico", "prompt": "Descreve o projeto e os serviços/produtos, destacando a proposta de valor e inovação."},
-    {"label": "2.1. Contextualização da área geográfica envolvente", "key": "area_geo", "prompt": "Caracteriza a área geográfica, dados demográficos e especificidades locais/regionais."},
-    {"label": "2.2. Concorrência", "key": "concorrencia", "prompt": "Analisa concorrentes diretos e indiretos, posicionamento e barreiras à entrada."},
-    {"label": "2.3. Clientes potenciais", "key": "clientes", "prompt": "Segmenta clientes potenciais, necessidades e critérios de decisão."},
-    {"label": "2.4. O preço", "key": "preco", "prompt": "Define a estratégia de preços (cost-plus, benchmark, valor percebido) e política comercial."},
-    {"label": "2.5. Fornecedores", "key": "fornecedores", "prompt": "Identifica fornecedores-chave, condições de fornecimento e riscos associados."},
-    {"label": "2.6. Contexto económico, tecnológico e de inovação", "key": "contexto_eco", "prompt": "Apresenta tendências económicas, tecnológicas e de inovação relevantes."},
-    {"label": "2.7. Contexto político legal", "key": "contexto_politico", "prompt": "Resume o enquadramento político-legal e regulamentar aplicável."},
-    {"label": "2.8. Contexto ambiental e ecológico", "key": "contexto_amb", "prompt": "Avalia impactos ambientais, requisitos e práticas de sustentabilidade."},
-    {"label": "2.9. Posicionamento face à análise setorial", "key": "posicionamento", "prompt": "Define o posicionamento competitivo com base na análise setorial."},
-    {"label": "3.1. Instalações", "key": "instalacoes", "prompt": "Descreve instalações (local, área, adequação) e necessidades futuras."},
-    {"label": "3.2. Equipamentos", "key": "equipamentos", "prompt": "Lista equipamentos essenciais, capacidades e justificações."},
-    {"label": "3.3. Licenciamento", "key": "licenciamento", "prompt": "Indica licenças/autorização necessárias e estado do processo."},
-    {"label": "3.4. Estratégia comercial e promoção", "key": "estrategia_comercial", "prompt": "Explica canais de venda, marketing, comunicação e métricas de sucesso."},
-    {"label": "4.1. Recursos humanos", "key": "rh", "prompt": "Apresenta organograma, perfis e afetações por função/atividade."},
-    {"label": "4.2. Formação", "key": "formacao", "prompt": "Identifica necessidades de formação e plano de capacitação."},
-    {"label": "4.3. Política de remunerações", "key": "remuneracoes", "prompt": "Explica a política remuneratória e incentivos (fixo/variável)."},
-    {"label": "4.4. SHST", "key": "shst", "prompt": "Indica medidas de Segurança, Higiene e Saúde no Trabalho."},
-    {"label": "4.5. Horário", "key": "horario", "prompt": "Descreve o horário de funcionamento e escalas relevantes."},
-    {"label": "Análise SWOT do projeto", "key": "swot", "prompt": "Elabora SWOT (forças, fraquezas, oportunidades, ameaças) com bullets claros."},
-    {"label": "6.10. Viabilidade económica", "key": "viabilidade", "prompt": "Apresenta análise de viabilidade económica com pressupostos e indicadores-chave."},
-]
+# Cada sessão trabalha num dossier com id na URL (?dossier=…): um refresh ou um reinício do
+# servidor reabre-o a partir do autofill_dossiers, com os documentos e o texto já extraído.
+# No fim de cada rerun (e de cada fragmento) só os campos que mudaram são gravados.
+VALORES_INICIAIS: Dict[str, str] = {
+    **{f["key"]: "" for f in FIELDS_PART1 + FIELDS_PART2},
+    **{f"modo_{f['key']}": "Campos anteriores" for f in FIELDS_PART2},
+}
+
+def _carregar_dossier(dossier_id: str, substituir: bool = True) -> bool:
+    """Põe o dossier na sessão (campos, fonte de cada campo, documentos) e o texto dos
+    documentos no cache de extração. Corre antes de os widgets existirem: no arranque da
+    sessão ou num callback. Devolve False se o dossier ainda não foi gravado."""
+    t0 = time.perf_counter()
+    with span("abrir_dossier") as s:
+        d = dossiers.abrir(dossier_id) if dossiers is not None else None
+        campos = {k: v for k, v in (d["campos"] if d else {}).items() if k in VALORES_INICIAIS}
+        for k, v in VALORES_INICIAIS.items():
+            if substituir:
+                st.session_state[k] = v
+            else:
+                st.session_state.setdefault(k, v)  # valores já postos antes do 1.º run (testes)
+        st.session_state.update(campos)
+        for k in ("_indice_docs", "_indice_assinatura", "_docs_texto", "_stream_stats"):
+            st.session_state.pop(k, None)
+        st.session_state["_dossier_id"] = dossier_id
+        st.session_state["_dossier_gravado"] = {**VALORES_INICIAIS, **campos}
+        st.session_state["_anexos"] = d["anexos"] if d else []
+        # Os ficheiros que já estão no uploader pertencem ao dossier anterior: não são copiados.
+        st.session_state["_anexos_widget"] = {_id_upload(uf): None for uf in st.session_state.get("uploads_sec2") or []}
+        semeados = 0
+        for a in st.session_state["_anexos"]:
+            extrator, texto = (d["textos"].get(a.file_id) or ("", None))
+            if texto is not None and extrator and extrator == versao_extrator(a.name):
+                semeados += semear_cache(a.name, a.file_id, texto)
+        s.set(campos=len(campos), ficheiros=len(st.session_state["_anexos"]), textos=semeados)
+    st.query_params["dossier"] = dossier_id
+    st.session_state["_dossier_tempos"] = {"abrir_ms": (time.perf_counter() - t0) * 1e3}
+    return d is not None
+
+def _dossier_id() -> str:
+    """Id do dossier desta sessão; na 1.ª execução abre o da URL (ou começa um novo)."""
+    if "_dossier_id" not in st.session_state:
+        _carregar_dossier(st.query_params.get("dossier") or DossierStore.novo_id(), substituir=False)
+    return st.session_state["_dossier_id"]
+
+def _novo_dossier() -> None:
+    _carregar_dossier(DossierStore.novo_id())
+
+def _abrir_dossier(widget_key: str) -> None:
+    _carregar_dossier(st.session_state[widget_key])
+
+def _guardar_dossier() -> None:
+    """Grava os campos que mudaram desde a última gravação (diferença com `_dossier_gravado`)."""
+    if dossiers is None:
+        return
+    gravado = st.session_state.get("_dossier_gravado", {})
+    mudou = {}
+    for k, inicial in VALORES_INICIAIS.items():
+        v = st.session_state.get(k, inicial)
+        if isinstance(v, str) and v != gravado.get(k, inicial):
+            mudou[k] = v
+    if not mudou:
+        return
+    t0 = time.perf_counter()
+    try:
+        dossiers.guardar_campos(_dossier_id(), mudou, nome=str(st.session_state.get("empresa_nome", "")).strip() or None)
+    except (OSError, sqlite3.Error) as e:
+        st.toast(f"⚠️ Não foi possível gravar o dossier: {e}")
+        return
+    gravado.update(mudou)
+    st.session_state.setdefault("_dossier_tempos", {}).update(
+        gravar_ms=(time.perf_counter() - t0) * 1e3, gravados=len(mudou), gravado_em=time.time(),
+    )
+
+def _id_upload(uf) -> str:
+    return getattr(uf, "file_id", None) or hashlib.sha1(uf.getvalue()).hexdigest()
+
+def _sincronizar_anexos(uploads) -> None:
+    """Uploads novos vão para os blobs do dossier (com o texto extraído); os retirados do
+    uploader saem do dossier."""
+    if dossiers is None:
+        return
+    dossier = _dossier_id()
+    vistos = st.session_state.setdefault("_anexos_widget", {})
+    atuais = {_id_upload(uf): uf for uf in uploads or []}
+    mudou = False
+    try:
+        for fid in [f for f in vistos if f not in atuais]:
+            digest = vistos.pop(fid)
+            if digest:
+                dossiers.remover_anexo(dossier, digest)
+                mudou = True
+        novos = [(fid, uf) for fid, uf in atuais.items() if fid not in vistos]
+        if novos:
+            with span("guardar_anexos", ficheiros=len(novos)):
+                conteudos = [uf.getvalue() for _, uf in novos]
+                textos = extract_texts([(uf.name, b) for (_, uf), b in zip(novos, conteudos)])
+                for (fid, uf), b, txt in zip(novos, conteudos, textos):
+                    extrator = versao_extrator(uf.name)
+                    guardar_texto = bool(extrator) and not txt.startswith("[ERRO a ler")
+                    vistos[fid] = dossiers.guardar_anexo(
+                        dossier, uf.name, b, texto=txt if guardar_texto else None, extrator=extrator,
+                    )
+            mudou = True
+    except (OSError, sqlite3.Error) as e:
+        st.toast(f"⚠️ Não foi possível guardar os documentos: {e}")
+    if mudou:
+        st.session_state["_anexos"] = dossiers.anexos(dossier)
+
+def _remover_anexo(digest: str) -> None:
+    dossiers.remover_anexo(_dossier_id(), digest)
+    st.session_state["_anexos"] = dossiers.anexos(_dossier_id())
+    vistos = st.session_state.get("_anexos_widget", {})
+    for fid, d in vistos.items():
+        if d == digest:
+            vistos[fid] = None  # continua no uploader, mas já não conta para o dossier
+
+def _documentos(uploads_key: str) -> list:
+    """Documentos que dão contexto à IA: os do dossier (que incluem os carregados nesta
+    sessão) ou, com a gravação desligada, os do uploader."""
+    if dossiers is None:
+        return st.session_state.get(uploads_key, [])
+    return st.session_state.get("_anexos", [])
 
 # =========================
 #  🧱 AÇÕES IA
 # =========================
+def _pedir_stream(key_area: str, label: str, instrucao: str, modo_fontes_key: str, uploads_key: str, expandir: bool):
+    # O callback só regista o pedido; o texto é transmitido dentro do bloco do campo,
+    # antes de o text_area ser criado (ver stream_para_campo).
+    st.session_state["_stream_pedido"] = {
+        "key_area": key_area, "label": label, "instrucao": instrucao,
+        "modo_fontes_key": modo_fontes_key, "uploads_key": uploads_key, "expandir": expandir,
+    }
+
+def _sessao() -> str:
+    """Identifica esta sessão no escalonador de pedidos à IA (partilhado por todo o servidor)."""
+    return st.session_state.setdefault("_sessao_id", uuid.uuid4().hex[:8])
+
 def gerar_para_campo(key_area: str, label: str, instrucao: str, modo_fontes_key: str, uploads_key: str):
-    uploaded_files = st.session_state.get(uploads_key, [])
+    if st.session_state.get("ia_streaming", True):
+        return _pedir_stream(key_area, label, instrucao, modo_fontes_key, uploads_key, expandir=False)
+    uploaded_files = _documentos(uploads_key)
     contexto = build_context(
         modo_fontes=st.session_state.get(modo_fontes_key, "Campos anteriores"),
         session=st.session_state,
-        uploaded_files=uploaded_files
+        uploaded_files=uploaded_files,
+        consulta=f"{label}\n{instrucao}",
     )
-    texto_ia = chamar_ia_para_campo(label=label, instrucao=instrucao, contexto=contexto)
+    # Voltar a gerar um campo já preenchido é pedir uma versão nova, não a do cache.
+    regenerar = bool(str(st.session_state.get(key_area, "")).strip())
+    with origem_pedido(_sessao(), INTERATIVO):
+        texto_ia = chamar_ia_para_campo(label=label, instrucao=instrucao, contexto=contexto, regenerar=regenerar)
     st.session_state[key_area] = texto_ia
-    st.rerun()
 
 def expandir_campo(key_area: str, label: str, instrucao: str, modo_fontes_key: str, uploads_key: str):
-    uploaded_files = st.session_state.get(uploads_key, [])
+    if st.session_state.get("ia_streaming", True):
+        return _pedir_stream(key_area, label, instrucao, modo_fontes_key, uploads_key, expandir=True)
+    uploaded_files = _documentos(uploads_key)
     contexto = build_context(
         modo_fontes=st.session_state.get(modo_fontes_key, "Campos anteriores"),
         session=st.session_state,
-        uploaded_files=uploaded_files
+        uploaded_files=uploaded_files,
+        consulta=f"{label}\n{instrucao}",
     )
-    novo = chamar_ia_para_campo(label=label, instrucao=instrucao, contexto=contexto)
+    with origem_pedido(_sessao(), INTERATIVO):
+        novo = chamar_ia_para_campo(label=label, instrucao=instrucao, contexto=contexto, regenerar=True)
     atual = st.session_state.get(key_area, "")
     st.session_state[key_area] = (atual + ("\n\n" if atual else "") + novo).strip()
-    st.rerun()
+
+def stream_para_campo(pedido: Dict[str, Any]):
+    """Transmite a geração pedida para um placeholder e guarda o texto final no campo.
+
+    Clicar em "Parar" (ou em qualquer outro widget) interrompe este rerun: o `finally`
+    fecha a ligação e guarda o texto parcial, aplicado ao campo no rerun seguinte.
+    """
+    st.session_state.pop("_stream_pedido", None)
+    key_area = pedido["key_area"]
+    contexto = build_context(
+        modo_fontes=st.session_state.get(pedido["modo_fontes_key"], "Campos anteriores"),
+        session=st.session_state,
+        uploaded_files=_documentos(pedido["uploads_key"]),
+        consulta=f"{pedido['label']}\n{pedido['instrucao']}",
+    )
+    atual = st.session_state.get(key_area, "")
+    regenerar = pedido["expandir"] or bool(str(atual).strip())
+
+    st.button("⏹ Parar geração", key=f"btn_{key_area}_parar")
+    ph = st.empty()
+    stats = StreamStats()
+    gen = chamar_ia_para_campo_stream(
+        label=pedido["label"], instrucao=pedido["instrucao"], contexto=contexto, regenerar=regenerar, stats=stats
+    )
+    texto, ultimo = "", 0.0
+    try:
+        with origem_pedido(_sessao(), INTERATIVO):
+            if escalonador_stats()["em_fila"]:
+                ph.caption("À espera de vez na fila de pedidos à IA…")
+            for pedaco in gen:
+                texto += pedaco
+                if time.perf_counter() - ultimo > 0.05:  # não enviar um delta ao browser por token
+                    ph.markdown(texto + " ▌")
+                    ultimo = time.perf_counter()
+    finally:
+        gen.close()
+        novo = texto.strip()
+        if pedido["expandir"]:
+            final = (atual + ("\n\n" if atual and novo else "") + novo).strip()
+        else:
+            final = novo or atual
+        st.session_state["_stream_resultado"] = {key_area: final}
+        st.session_state["_stream_stats"] = {**st.session_state.get("_stream_stats", {}), key_area: stats.as_dict()}
+    ph.empty()
+
+def gerar_tudo(keys: List[str], concorrencia: int, uploads_key: str):
+    """Gera vários campos em paralelo; cada resultado vai para session_state mal chega.
+
+    Tem de correr antes de os text_area da Parte 2 serem instanciados neste rerun.
+    """
+    fields = {f["key"]: f for f in FIELDS_PART2}
+    uploaded_files = _documentos(uploads_key)
+    tarefas = {}
+    for key in keys:
+        f = fields[key]
+        contexto = build_context(
+            modo_fontes=st.session_state.get(f"modo_{key}", "Campos anteriores"),
+            session=st.session_state,
+            uploaded_files=uploaded_files,
+            consulta=f"{f['label']}\n{f['prompt']}",
+        )
+        tarefas[key] = partial(
+            chamar_ia_para_campo, label=f["label"], instrucao=f["prompt"], contexto=contexto,
+            regenerar=bool(str(st.session_state.get(key, "")).strip()),
+        )
+
+    barra = st.progress(0.0, text=f"0/{len(tarefas)} campos")
+    estado = st.status(f"A gerar {len(tarefas)} campos ({concorrencia} em simultâneo)…", expanded=True)
+
+    def on_result(key: str, texto: str, feitos: int, total: int, segundos: float):
+        st.session_state[key] = texto
+        barra.progress(feitos / total, text=f"{feitos}/{total} campos")
+        estado.write(f"✅ {fields[key]['label']} — {segundos:.1f}s")
+
+    with origem_pedido(_sessao(), LOTE):
+        gerar_em_lote_sync(tarefas, max_concorrencia=concorrencia, on_result=on_result)
+    estado.update(label=f"{len(tarefas)} campos gerados.", state="complete", expanded=False)
 
 # =========================
 #  🧱 RENDERIZADORES
 # =========================
+@st.fragment
 def render_field_block(field: Dict[str, str], uploads_key: str, default_mode: str = "Campos anteriores"):
+    """Um campo da Parte 2. É um fragmento: os botões e o streaming só voltam a correr
+    este bloco, não a app inteira (o texto dos outros campos não muda com eles)."""
+    t0 = time.perf_counter()
     label = field["label"]
     key_area = field["key"]
     modo_key = f"modo_{key_area}"
@@ -228,11 +492,11 @@ def render_field_block(field: Dict[str, str], uploads_key: str, default_mode: st
     with c1:
         st.markdown(f"**{label}**")
     with c2:
+        st.session_state.setdefault(modo_key, default_mode)  # pode vir de um dossier reaberto
         st.selectbox(
             "Fonte de dados",
             ["Campos anteriores", "Documentos", "Ambos"],
             key=modo_key,
-            index=["Campos anteriores", "Documentos", "Ambos"].index(st.session_state.get(modo_key, default_mode)),
             label_visibility="collapsed",
         )
     with c3:
@@ -266,8 +530,45 @@ def render_field_block(field: Dict[str, str], uploads_key: str, default_mode: st
                 use_container_width=True,
             )
 
-    st.text_area("", key=key_area, height=220, placeholder=f"Escreve ou clica em Gerar/Expandir — {label}")
+    pedido = st.session_state.get("_stream_pedido")
+    if pedido and pedido["key_area"] == key_area:
+        stream_para_campo(pedido)
+    resultado = st.session_state.get("_stream_resultado") or {}
+    if key_area in resultado:
+        # Aplicado aqui, antes do widget existir neste rerun, para não perder para o valor do browser.
+        st.session_state[key_area] = resultado[key_area]
+        st.session_state["_stream_resultado"] = {}
+
+    st.text_area(
+        label, key=key_area, height=220, label_visibility="collapsed",
+        placeholder=f"Escreve ou clica em Gerar/Expandir — {label}",
+    )
+    info = st.session_state.get("_stream_stats", {}).get(key_area)
+    if info:
+        st.caption(
+            ("Resposta do cache. " if info["cache"] else "")
+            + ("Geração interrompida. " if info["cancelado"] else "")
+            + f"1.º token em {info['ttft_s']:.2f}s · {info['tokens']} tokens em {info['total_s']:.1f}s"
+            + (f" · {info['tokens_s']:.0f} tokens/s" if info["tokens_s"] else "")
+        )
     st.markdown("---")
+    _guardar_dossier()
+    _registar_tempo("bloco", time.perf_counter() - t0)
+
+def render_gerar_tudo(uploads_key: str):
+    labels = {f["key"]: f["label"] for f in FIELDS_PART2}
+    vazios = [k for k in labels if not str(st.session_state.get(k, "")).strip()]
+    with st.expander("⚡ Gerar tudo com IA", expanded=False):
+        sel = st.multiselect(
+            "Campos a gerar (por omissão, os que estão vazios)",
+            options=list(labels),
+            default=vazios,
+            format_func=labels.get,
+        )
+        conc = st.number_input("Pedidos em simultâneo", min_value=1, max_value=16, value=CONCORRENCIA_IA, step=1)
+        gerar = st.button("Gerar tudo", key="btn_gerar_tudo", disabled=not sel, use_container_width=True)
+    if gerar:
+        gerar_tudo(sel, int(conc), uploads_key)
 
 # =========================
 #  🖥️ UI — PARTE 1 + PARTE 2
@@ -291,28 +592,171 @@ def render_parte2():
         accept_multiple_files=True,
         key="uploads_sec2"
     )
-    # Se precisares localmente:
-    _ = uploads or st.session_state.get("uploads_sec2", [])
+    _sincronizar_anexos(uploads or st.session_state.get("uploads_sec2", []))
 
     with st.expander("Preferências de geração", expanded=False):
         st.markdown("- **Fonte de dados** por campo: *Campos anteriores*, *Documentos* ou *Ambos*.")
         st.markdown("- **Gerar com IA** preenche o campo; **Expandir com IA** acrescenta ao texto existente.")
+        st.markdown("- **Gerar tudo** preenche vários campos de uma vez, com pedidos em paralelo.")
+        st.toggle("Mostrar o texto à medida que é gerado (streaming)", value=True, key="ia_streaming")
+        st.toggle(
+            "Usar só os excertos dos documentos relevantes para cada campo (BM25)", value=True, key="ia_retrieval",
+            help="Desligado, os documentos entram pelo início até ao limite de contexto.",
+        )
+        cs = extraction_cache_stats()
+        ps = pdf_page_stats()
+        st.caption(
+            f"Cache de extração: {cs['entradas']} entrada(s), {cs['bytes'] / 1e6:.1f} MB — "
+            f"{cs['hits']} hits / {cs['misses']} misses. "
+            f"Páginas PDF lidas: {ps['paginas_lidas']}, ignoradas pelo limite: {ps['paginas_ignoradas']}."
+        )
+        tempos = st.session_state.get("_tempos_rerun")
+        if tempos and tempos["completo"]:
+            bloco = sorted(tempos["bloco"])[len(tempos["bloco"]) // 2] if tempos["bloco"] else 0.0
+            st.caption(
+                f"Último rerun completo: {tempos['completo'][-1] * 1e3:.0f} ms · "
+                f"rerun de um campo (mediana): {bloco * 1e3:.1f} ms."
+            )
+        if "_indice_docs" in st.session_state:
+            ix = st.session_state["_indice_docs"].stats()
+            st.caption(f"Índice de documentos: {ix['ficheiros']} ficheiro(s), {ix['pedacos']} excertos, {ix['termos']} termos.")
+        es = escalonador_stats()
+        st.caption(
+            f"Fila de pedidos à IA (todo o servidor): {es['ativos']}/{es['max_concorrencia']} em curso, "
+            f"{es['em_fila']} à espera ({es['em_fila_lote']} de lotes) — espera p50 {es['espera_p50_ms']:.0f} ms, "
+            f"p95 {es['espera_p95_ms']:.0f} ms; {es['fundidos']} pedido(s) iguais servidos por um só."
+            + (f" Tokens no último minuto: {es['tokens_minuto']}/{es['tpm']}." if es["tpm"] else "")
+        )
+        ls = llm_cache_stats()
+        if ls:
+            st.caption(
+                f"Cache de respostas IA: {ls['entradas']} resposta(s) — hit rate {ls['hit_rate']:.0%} "
+                f"({ls['hits']}/{ls['hits'] + ls['misses']}), {ls['latencia_poupada_s']:.1f}s poupados. "
+                "Gerar um campo já preenchido pede sempre uma versão nova."
+            )
+
+    render_diagnostico()
+    render_gerar_tudo(uploads_key="uploads_sec2")
 
     for f in FIELDS_PART2:
         render_field_block(f, uploads_key="uploads_sec2")
+    render_exportar()
+
+def exportar_docx():
+    """Parte 1 + textos preenchidos da Parte 2 num DOCX, guardado na sessão para o download."""
+    from autofill_core_bp import build_docx_bp  # pandas e python-docx só quando se exporta
+
+    textos = {"Dados base do projeto/promotor": "\n".join(
+        f"{f['label']}: {st.session_state.get(f['key'], '')}" for f in FIELDS_PART1
+    )}
+    textos.update({
+        f["label"]: st.session_state[f["key"]] for f in FIELDS_PART2 if str(st.session_state.get(f["key"], "")).strip()
+    })
+    t0 = time.perf_counter()
+    with span("exportar_docx", seccoes=len(textos)):
+        buf = io.BytesIO()
+        build_docx_bp({}, {}, textos, buf)
+    st.session_state["_docx_exportado"] = {
+        "bytes": buf.getvalue(), "seccoes": len(textos), "ms": (time.perf_counter() - t0) * 1e3,
+    }
+
+def render_exportar():
+    st.subheader("Exportar")
+    c1, c2 = st.columns(2)
+    c1.button("📄 Gerar DOCX", key="btn_exportar_docx", on_click=exportar_docx, use_container_width=True)
+    doc = st.session_state.get("_docx_exportado")
+    if doc:
+        c2.download_button(
+            "⬇️ Descarregar DOCX", data=doc["bytes"], file_name="dossier.docx", key="btn_descarregar_docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            on_click="ignore",  # descarregar não volta a correr o script
+            use_container_width=True,
+        )
+        st.caption(f"{doc['seccoes']} secção(ões), gerado em {doc['ms']:.0f} ms. Gerar de novo depois de alterar os campos.")
+
+def render_dossier():
+    """Barra lateral: dossier aberto, abrir outro / começar um novo e documentos guardados."""
+    with st.sidebar:
+        st.subheader("💾 Dossier")
+        if dossiers is None:
+            st.caption("Gravação desligada (CBIZ_DOSSIERS=0): o estado vive só nesta sessão.")
+            return
+        atual = _dossier_id()
+        recentes = {d["id"]: d for d in dossiers.listar(20)}
+        opcoes = list(recentes) if atual in recentes else [atual] + list(recentes)
+
+        def nome(i: str) -> str:
+            d = recentes.get(i)
+            if d is None:
+                return "Novo dossier (ainda sem alterações)"
+            return f"{d['nome'] or 'Sem nome'} · {time.strftime('%d/%m %H:%M', time.localtime(d['alterado']))}"
+
+        chave = f"dossier_abrir_{atual}"  # widget novo por dossier: a escolha segue o dossier aberto
+        st.selectbox("Abrir dossier", opcoes, index=opcoes.index(atual), format_func=nome, key=chave,
+                     on_change=_abrir_dossier, args=(chave,))
+        st.button("➕ Novo dossier", on_click=_novo_dossier, use_container_width=True)
+        tempos = st.session_state.get("_dossier_tempos", {})
+        st.caption(
+            f"Gravação automática de cada alteração. Aberto em {tempos.get('abrir_ms', 0.0):.1f} ms"
+            + (f"; última gravação: {tempos['gravados']} campo(s) em {tempos['gravar_ms']:.1f} ms."
+               if "gravar_ms" in tempos else ".")
+        )
+        anexos = st.session_state.get("_anexos", [])
+        if anexos:
+            st.caption(f"Documentos guardados ({len(anexos)}):")
+            for a in anexos:
+                c1, c2 = st.columns([5, 1])
+                c1.caption(f"{a.name} · {a.size / 1e6:.1f} MB")
+                c2.button("✕", key=f"rm_anexo_{a.file_id}", on_click=_remover_anexo, args=(a.file_id,), help="Retirar do dossier")
+
+def render_diagnostico():
+    """Tempos por etapa (extração, contexto, IA) e tokens, a partir dos spans do autofill_trace."""
+    with st.expander("Diagnóstico (tempos e tokens por etapa)", expanded=False):
+        st.toggle(
+            "Registar tempos por etapa", value=autofill_trace.ativo(), key="diag_trace",
+            on_change=lambda: autofill_trace.ativar(st.session_state["diag_trace"]),
+            help="Vale para todo o servidor. Cada etapa fica também no ficheiro JSONL indicado abaixo.",
+        )
+        aq = estado_aquecimento()
+        if aq["terminado"]:
+            st.caption("Aquecimento em segundo plano: " + ", ".join(f"{k} {v:.0f} ms" for k, v in aq["tempos_ms"].items()) + ".")
+        if not autofill_trace.ativo():
+            return
+        linhas = autofill_trace.resumo()
+        if not linhas:
+            st.caption("Ainda sem etapas registadas: gera um campo com IA.")
+            return
+        st.dataframe(linhas, hide_index=True)
+        st.caption("Últimas etapas")
+        st.dataframe(autofill_trace.spans_recentes(20)[::-1], hide_index=True)
+        c1, c2 = st.columns([3, 1])
+        c1.caption(f"Traço: `{autofill_trace.ficheiro() or '—'}`")
+        c2.button("Limpar", key="diag_limpar", on_click=autofill_trace.limpar)
 
 # =========================
 #  🚀 ENTRADA
 # =========================
+def _registar_tempo(tipo: str, segundos: float) -> None:
+    """Últimos tempos de rerun: "completo" (script inteiro) e "bloco" (um campo/fragmento)."""
+    tempos = st.session_state.setdefault("_tempos_rerun", {"completo": [], "bloco": []})
+    tempos[tipo] = (tempos[tipo] + [segundos])[-200:]
+
 def main():
+    t0 = time.perf_counter()
     st.set_page_config(page_title="IEFP — Formulário integrado", layout="wide")
     st.title("IEFP — Formulário integrado (CBIZ_DEV)")
     if not _get_api_key():
         st.warning("⚠️ Define a tua **OPENAI_API_KEY** em `.streamlit/secrets.toml` ou como variável de ambiente para ativar os botões de IA.")
 
+    _dossier_id()
+    render_dossier()
     render_parte1()
     render_parte2()
     st.success("Pronto. Parte 2 corrigida: já não há escrita em `st.session_state['uploads_sec2']`.")
+    _guardar_dossier()
+    _registar_tempo("completo", time.perf_counter() - t0)
+    # A página já foi desenhada: o resto do arranque (openai, extratores) fica para segundo plano.
+    aquecer_em_fundo(extra=[_get_openai_client, llm_cache_stats])
 
 if __name__ == "__main__":
     main()
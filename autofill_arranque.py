@@ -0,0 +1,56 @@
+import os
+import time
+import importlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Sequence
+
+# =========================
+#  🔥 AQUECIMENTO (arranque a frio)
+# =========================
+# As bibliotecas pesadas (openai, pypdf, docx, openpyxl) só são importadas nos caminhos que
+# as usam; sem mais nada, o primeiro clique de cada utilizador num contentor novo pagaria
+# esse import (openai sozinho demora ~1 s a frio). Depois do primeiro desenho da página,
+# uma thread em segundo plano importa-as e prepara o cliente, uma vez por processo.
+AQUECER = os.getenv("CBIZ_AQUECER", "1") != "0"
+MODULOS_PESADOS: Sequence[str] = ("openai", "pypdf", "docx", "openpyxl")
+
+_lock = threading.Lock()
+_estado: Dict[str, Any] = {"iniciado": False, "terminado": False, "tempos_ms": {}, "erros": {}}
+
+def _aquecer(modulos: Sequence[str], extra: Sequence[Callable[[], Any]]) -> None:
+    for nome in modulos:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(nome)
+        except Exception as e:  # dependência opcional em falta: o caminho que a usa dá o erro
+            _estado["erros"][nome] = str(e)
+        _estado["tempos_ms"][nome] = round((time.perf_counter() - t0) * 1e3, 1)
+    for fn in extra:
+        nome = getattr(fn, "__name__", "extra")
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            _estado["erros"][nome] = str(e)
+        _estado["tempos_ms"][nome] = round((time.perf_counter() - t0) * 1e3, 1)
+    _estado["terminado"] = True
+
+def aquecer_em_fundo(
+    modulos: Sequence[str] = MODULOS_PESADOS,
+    extra: Iterable[Callable[[], Any]] = (),
+) -> bool:
+    """Importa `modulos` e corre `extra` (ex.: criar o cliente OpenAI) numa thread daemon.
+
+    Só a primeira chamada no processo faz alguma coisa; devolve True se foi essa.
+    """
+    if not AQUECER:
+        return False
+    with _lock:
+        if _estado["iniciado"]:
+            return False
+        _estado["iniciado"] = True
+    threading.Thread(target=_aquecer, args=(tuple(modulos), tuple(extra)), name="cbiz-aquecer", daemon=True).start()
+    return True
+
+def estado_aquecimento() -> Dict[str, Any]:
+    return {**_estado, "tempos_ms": dict(_estado["tempos_ms"]), "erros": dict(_estado["erros"])}
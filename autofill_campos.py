@@ -0,0 +1,43 @@
+from typing import Dict, List
+
+# =========================
+#  🧩 CAMPOS
+# =========================
+# Campos do formulário (Parte 1: dados base; Parte 2: secções do dossier). Partilhados pela
+# app e pelo lote (autofill_lote), que assim não precisa de importar o Streamlit.
+FIELDS_PART1: List[Dict[str, str]] = [
+    {"label": "Nome da empresa", "key": "empresa_nome", "prompt": "Indica o nome oficial da entidade promotora."},
+    {"label": "Nome do promotor", "key": "promotor_nome", "prompt": "Identifica o(s) promotor(es) do projeto e função."},
+    {"label": "Setor de atividade", "key": "setor", "prompt": "Resume o setor de atividade (CAE) e especialização."},
+    {"label": "Localização", "key": "localizacao", "prompt": "Indica a localização do projeto (concelho, região)."},
+    {"label": "Público-alvo", "key": "publico_alvo", "prompt": "Define o público-alvo e segmentos relevantes."},
+    {"label": "Proposta de valor", "key": "proposta_valor", "prompt": "Explica a proposta de valor e diferenciação."},
+    {"label": "Resumo geral do projeto", "key": "resumo_geral", "prompt": "Apresenta um resumo executivo claro do projeto."},
+]
+
+FIELDS_PART2: List[Dict[str, str]] = [
+    {"label": "1.1. Historial e apresentação do promotor", "key": "historial", "prompt": "Elabora o historial e a apresentação do promotor, incluindo experiência e resultados relevantes."},
+    {"label": "1.3. Missão, visão e valores da empresa", "key": "missao", "prompt": "Define missão, visão e valores, alinhados com o projeto e o setor."},
+    {"label": "1.4. Objetivos do projeto", "key": "objetivos", "prompt": "Estabelece objetivos específicos, mensuráveis, alcançáveis, relevantes e temporizados (SMART)."},
+    {"label": "1.5. O projeto, o serviço e a ideia", "key": "projeto_servico", "prompt": "Descreve o projeto e os serviços/produtos, destacando a proposta de valor e inovação."},
+    {"label": "2.1. Contextualização da área geográfica envolvente", "key": "area_geo", "prompt": "Caracteriza a área geográfica, dados demográficos e especificidades locais/regionais."},
+    {"label": "2.2. Concorrência", "key": "concorrencia", "prompt": "Analisa concorrentes diretos e indiretos, posicionamento e barreiras à entrada."},
+    {"label": "2.3. Clientes potenciais", "key": "clientes", "prompt": "Segmenta clientes potenciais, necessidades e critérios de decisão."},
+    {"label": "2.4. O preço", "key": "preco", "prompt": "Define a estratégia de preços (cost-plus, benchmark, valor percebido) e política comercial."},
+    {"label": "2.5. Fornecedores", "key": "fornecedores", "prompt": "Identifica fornecedores-chave, condições de fornecimento e riscos associados."},
+    {"label": "2.6. Contexto económico, tecnológico e de inovação", "key": "contexto_eco", "prompt": "Apresenta tendências económicas, tecnológicas e de inovação relevantes."},
+    {"label": "2.7. Contexto político legal", "key": "contexto_politico", "prompt": "Resume o enquadramento político-legal e regulamentar aplicável."},
+    {"label": "2.8. Contexto ambiental e ecológico", "key": "contexto_amb", "prompt": "Avalia impactos ambientais, requisitos e práticas de sustentabilidade."},
+    {"label": "2.9. Posicionamento face à análise setorial", "key": "posicionamento", "prompt": "Define o posicionamento competitivo com base na análise setorial."},
+    {"label": "3.1. Instalações", "key": "instalacoes", "prompt": "Descreve instalações (local, área, adequação) e necessidades futuras."},
+    {"label": "3.2. Equipamentos", "key": "equipamentos", "prompt": "Lista equipamentos essenciais, capacidades e justificações."},
+    {"label": "3.3. Licenciamento", "key": "licenciamento", "prompt": "Indica licenças/autorização necessárias e estado do processo."},
+    {"label": "3.4. Estratégia comercial e promoção", "key": "estrategia_comercial", "prompt": "Explica canais de venda, marketing, comunicação e métricas de sucesso."},
+    {"label": "4.1. Recursos humanos", "key": "rh", "prompt": "Apresenta organograma, perfis e afetações por função/atividade."},
+    {"label": "4.2. Formação", "key": "formacao", "prompt": "Identifica necessidades de formação e plano de capacitação."},
+    {"label": "4.3. Política de remunerações", "key": "remuneracoes", "prompt": "Explica a política remuneratória e incentivos (fixo/variável)."},
+    {"label": "4.4. SHST", "key": "shst", "prompt": "Indica medidas de Segurança, Higiene e Saúde no Trabalho."},
+    {"label": "4.5. Horário", "key": "horario", "prompt": "Descreve o horário de funcionamento e escalas relevantes."},
+    {"label": "Análise SWOT do projeto", "key": "swot", "prompt": "Elabora SWOT (forças, fraquezas, oportunidades, ameaças) com bullets claros."},
+    {"label": "6.10. Viabilidade económica", "key": "viabilidade", "prompt": "Apresenta análise de viabilidade económica com pressupostos e indicadores-chave."},
+]
@@ -0,0 +1,355 @@
+import os
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from autofill_core_bp import _dep_map, _num, _rotulos, _round2
+
+# =========================
+#  📊 CENÁRIOS E SENSIBILIDADE
+# =========================
+# O modelo de calcular_financeiros reescrito para S cenários de uma só vez: cada
+# pressuposto é um vetor (S,) e as tabelas passam a (S × itens × anos). Com os mesmos
+# pressupostos, o Resultado coincide com o da DR (mesma ordem de operações e arredondamentos).
+CHAVES_ASSUM = {
+    "crescimento_receitas": 0.08,
+    "margem_bruta_target": 0.55,
+    "fse_pct_receitas": 0.12,
+    "encargos_sociais_pct": 0.2375,
+    "aumento_salarios_pct": 0.03,
+    "emprestimo_montante": 0.0,
+    "emprestimo_taxa": 0.06,
+    "emprestimo_anos": 3,
+    "dep_equipamento_anos": 5,
+    "dep_informatica_anos": 3,
+    "dep_veiculos_anos": 4,
+    "dep_intangiveis_anos": 3,
+    "dep_outros_anos": 4,
+}
+CENARIOS_WORKERS = int(os.getenv("CBIZ_CENARIOS_WORKERS", str(min(4, os.cpu_count() or 1))))
+CENARIOS_CHUNK = 20_000          # cenários por bloco (limita a memória S × itens)
+# Paralelo (threads) só a partir de 3 blocos: com 1-2 blocos de poucos ms, os passos em
+# Python entre operações NumPy seguram o GIL e o ganho não paga a divisão e o concatenate.
+CENARIOS_MIN_PARALELO = 50_000
+
+def _componentes(vendas_df: pd.DataFrame, pessoal_df: pd.DataFrame, investimento_df: pd.DataFrame) -> Dict[str, Any]:
+    """Parte do modelo que não depende dos pressupostos: lida uma vez por análise."""
+    v = vendas_df.fillna(0)
+    p = pessoal_df.fillna(0)
+    inv = investimento_df.fillna("")
+    tipos = [str(t).lower() for t in _rotulos(inv, "tipo", "outros")]
+    return {
+        "preco": _num(v, "preco", 0),
+        "qtd_mensal": _num(v, "qtd_mensal", 0),
+        "meses_y1": _num(v, "meses_y1", 12),
+        "pessoal_base": _num(p, "venc_mensal", 0) * _num(p, "n", 0) * _num(p, "meses", 12),
+        "inv_tipos": tipos,
+        "inv_valor": _num(inv, "valor", 0.0),
+    }
+
+def _vetor(params: Dict[str, np.ndarray], assum: Dict[str, float], chave: str, s: int) -> np.ndarray:
+    if chave in params:
+        return np.asarray(params[chave], dtype=float)
+    return np.full(s, float(assum.get(chave, CHAVES_ASSUM[chave])))
+
+def _avaliar(
+    anos: List[int], assum: Dict[str, float], comp: Dict[str, Any], params: Dict[str, np.ndarray], s: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    if s is None:
+        s = len(next(iter(params.values()))) if params else 1
+    n_anos = len(anos)
+    g = _vetor(params, assum, "crescimento_receitas", s)[:, None]
+
+    # Vendas (S × itens), ano a ano com o arredondamento intermédio do modelo.
+    # preco / qtd_mensal podem vir por cenário (S × itens), como no ponto de equilíbrio.
+    vendas = np.zeros((s, n_anos))
+    n_itens = np.shape(comp["preco"])[-1]
+    if n_itens:
+        y = np.broadcast_to(_round2(comp["preco"] * comp["qtd_mensal"] * comp["meses_y1"]), (s, n_itens))
+        for i in range(n_anos):
+            if i:
+                y = _round2(y * (1 + g))
+            vendas[:, i] = y.sum(axis=1)
+
+    margem = _vetor(params, assum, "margem_bruta_target", s)[:, None]
+    fse_pct = _vetor(params, assum, "fse_pct_receitas", s)[:, None]
+    cogs = _round2((1 - margem) * vendas)
+    fse = _round2(fse_pct * vendas)
+
+    # Pessoal (S × pessoas)
+    enc = _vetor(params, assum, "encargos_sociais_pct", s)[:, None]
+    aum = _vetor(params, assum, "aumento_salarios_pct", s)[:, None]
+    pessoal = np.zeros((s, n_anos))
+    if len(comp["pessoal_base"]):
+        m = comp["pessoal_base"] * (1 + enc)
+        for i in range(n_anos):
+            if i:
+                m = ((m / (1 + enc)) * (1 + aum)) * (1 + enc)
+            pessoal[:, i] = _round2(m).sum(axis=1)
+
+    # Depreciações: o mesmo valor anual em todos os anos.
+    dep = np.zeros(s)
+    if len(comp["inv_valor"]):
+        anos_dep = np.empty((s, len(comp["inv_tipos"])))
+        base_map = _dep_map(assum)
+        for j, t in enumerate(comp["inv_tipos"]):
+            tipo = t if t in base_map else "outros"
+            chave = f"dep_{tipo}_anos"
+            col = np.trunc(_vetor(params, assum, chave, s)) if chave in params else np.full(s, float(base_map[tipo]))
+            anos_dep[:, j] = np.where(col == 0, 1.0, col)
+        dep = np.add.accumulate(comp["inv_valor"] / anos_dep, axis=1)[:, -1]
+
+    # Empréstimo: amortização constante, juros sobre o saldo inicial de cada ano.
+    saldo = _vetor(params, assum, "emprestimo_montante", s).copy()
+    taxa = _vetor(params, assum, "emprestimo_taxa", s)
+    n_amort = np.trunc(_vetor(params, assum, "emprestimo_anos", s))
+    n_amort = np.where(n_amort == 0, 1.0, n_amort)
+    amort = np.where(saldo > 0, saldo / n_amort, 0.0)
+    juros = np.zeros((s, n_anos))
+    for i in range(n_anos):
+        ativo = saldo > 0
+        juros[:, i] = np.where(ativo, saldo * taxa, 0.0)
+        c = np.where(ativo, np.minimum(amort, saldo), 0.0)
+        saldo = np.maximum(0.0, saldo - c)
+
+    linhas = [
+        _round2(vendas), _round2(cogs), _round2(fse),
+        _round2(pessoal), np.repeat(_round2(dep)[:, None], n_anos, axis=1), _round2(juros),
+    ]
+    resultado = _round2(linhas[0] - linhas[1] - linhas[2] - linhas[3] - linhas[4] - linhas[5])
+    return {"vendas": linhas[0], "pessoal": linhas[3], "juros": linhas[5], "resultado": resultado}
+
+def _avaliar_bloco(args) -> Dict[str, np.ndarray]:
+    return _avaliar(*args)
+
+def avaliar_cenarios(
+    anos: List[int],
+    assum: Dict[str, float],
+    vendas_df: pd.DataFrame,
+    pessoal_df: pd.DataFrame,
+    investimento_df: pd.DataFrame,
+    variacoes: Dict[str, Sequence[float]],
+    workers: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """Avalia S cenários de uma vez; `variacoes` = {chave de assum: S valores}.
+
+    Devolve matrizes (S × anos) com vendas, pessoal, juros e resultado. Chaves não
+    indicadas ficam com o valor de `assum`. Blocos grandes correm em threads (o NumPy
+    liberta o GIL nas operações sobre vetores, sem o custo de arrancar processos).
+    """
+    desconhecidas = set(variacoes) - set(CHAVES_ASSUM)
+    if desconhecidas:
+        raise ValueError(f"Pressupostos sem efeito no modelo: {sorted(desconhecidas)}")
+    params = {k: np.asarray(v, dtype=float).ravel() for k, v in variacoes.items()}
+    tamanhos = {len(v) for v in params.values()}
+    if len(tamanhos) > 1:
+        raise ValueError("Todas as variações têm de ter o mesmo número de cenários.")
+    s = tamanhos.pop() if tamanhos else 1
+
+    comp = _componentes(vendas_df, pessoal_df, investimento_df)
+    blocos = [
+        (anos, assum, comp, {k: v[a:a + CENARIOS_CHUNK] for k, v in params.items()})
+        for a in range(0, s, CENARIOS_CHUNK)
+    ]
+    workers = CENARIOS_WORKERS if workers is None else workers
+    if workers > 1 and s >= CENARIOS_MIN_PARALELO and len(blocos) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(blocos))) as pool:
+            partes = list(pool.map(_avaliar_bloco, blocos))
+    else:
+        partes = [_avaliar_bloco(b) for b in blocos]
+    return {k: np.concatenate([p[k] for p in partes]) for k in partes[0]}
+
+# --- Geração de cenários ---
+def cenarios_grelha(grelha: Dict[str, Sequence[float]]) -> Dict[str, np.ndarray]:
+    """Produto cartesiano: {"crescimento_receitas": [0.0, 0.05, 0.1], "emprestimo_taxa": [...]}."""
+    chaves = list(grelha)
+    combos = list(itertools.product(*(list(grelha[k]) for k in chaves)))
+    return {k: np.array([c[i] for c in combos], dtype=float) for i, k in enumerate(chaves)}
+
+def cenarios_monte_carlo(
+    distribuicoes: Dict[str, Tuple[Any, ...]],
+    n: int = 10_000,
+    seed: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """Amostras aleatórias por pressuposto.
+
+    Distribuições: ("normal", média, desvio), ("uniforme", mín, máx),
+    ("triangular", mín, moda, máx) ou ("lognormal", média, desvio) do log.
+    """
+    rng = np.random.default_rng(seed)
+    out = {}
+    for chave, dist in distribuicoes.items():
+        tipo, *p = dist
+        if tipo == "normal":
+            out[chave] = rng.normal(p[0], p[1], n)
+        elif tipo == "uniforme":
+            out[chave] = rng.uniform(p[0], p[1], n)
+        elif tipo == "triangular":
+            out[chave] = rng.triangular(p[0], p[1], p[2], n)
+        elif tipo == "lognormal":
+            out[chave] = rng.lognormal(p[0], p[1], n)
+        else:
+            raise ValueError(f"Distribuição desconhecida para {chave}: {tipo}")
+    return out
+
+# --- Resumo ---
+def bandas_resultado(anos: List[int], resultado: np.ndarray, percentis: Sequence[float] = (5, 25, 50, 75, 95)) -> pd.DataFrame:
+    """Percentis do Resultado por ano, média e probabilidade de prejuízo."""
+    years = [str(a) for a in anos]
+    q = np.percentile(resultado, percentis, axis=0)
+    linhas = [{"indicador": f"P{p:g}", **{y: round(float(q[i, j]), 2) for j, y in enumerate(years)}} for i, p in enumerate(percentis)]
+    linhas.append({"indicador": "Média", **{y: round(float(resultado[:, j].mean()), 2) for j, y in enumerate(years)}})
+    linhas.append({"indicador": "Prob. Resultado < 0 (%)", **{y: round(float((resultado[:, j] < 0).mean() * 100), 1) for j, y in enumerate(years)}})
+    return pd.DataFrame(linhas)
+
+def analise_sensibilidade(
+    anos: List[int],
+    assum: Dict[str, float],
+    vendas_df: pd.DataFrame,
+    pessoal_df: pd.DataFrame,
+    investimento_df: pd.DataFrame,
+    grelha: Optional[Dict[str, Sequence[float]]] = None,
+    distribuicoes: Optional[Dict[str, Tuple[Any, ...]]] = None,
+    n: int = 10_000,
+    seed: Optional[int] = 0,
+    percentis: Sequence[float] = (5, 25, 50, 75, 95),
+) -> pd.DataFrame:
+    """Grelha e/ou Monte Carlo sobre `assum` → tabela de bandas do Resultado por ano.
+
+    Com ambas, a grelha é cruzada com cada amostra aleatória (S = combinações × n).
+    """
+    variacoes: Dict[str, np.ndarray] = {}
+    if distribuicoes:
+        variacoes = cenarios_monte_carlo(distribuicoes, n, seed)
+    if grelha:
+        g = cenarios_grelha(grelha)
+        m = len(next(iter(g.values())))
+        if variacoes:
+            k = len(next(iter(variacoes.values())))
+            variacoes = {c: np.tile(v, m) for c, v in variacoes.items()}
+            variacoes.update({c: np.repeat(v, k) for c, v in g.items()})
+        else:
+            variacoes = g
+    res = avaliar_cenarios(anos, assum, vendas_df, pessoal_df, investimento_df, variacoes)
+    return bandas_resultado(anos, res["resultado"], percentis)
+
+# =========================
+#  🎯 PONTO DE EQUILÍBRIO (goal-seek)
+# =========================
+# Procura o valor de uma variável livre que cumpre a meta, avaliando-a em lotes de
+# EQUILIBRIO_PONTOS cenários: primeiro uma escala geométrica para encontrar o intervalo
+# onde a meta muda de estado, depois subdivisões sucessivas desse intervalo.
+EQUILIBRIO_PONTOS = 64
+EQUILIBRIO_ITERACOES = 8
+VARIAVEIS_ITEM = ("preco", "qtd_mensal")
+
+def _avaliar_variavel(
+    anos: List[int], assum: Dict[str, float], comp: Dict[str, Any],
+    variavel: str, item: Optional[int], xs: np.ndarray,
+) -> np.ndarray:
+    """Resultado (S × anos) com a variável livre = cada valor de `xs`."""
+    if variavel in VARIAVEIS_ITEM:
+        c = dict(comp)
+        base = comp[variavel]
+        if item is None:
+            c[variavel] = base[None, :] * xs[:, None]   # fator sobre todos os itens
+        else:
+            m = np.repeat(base[None, :], len(xs), axis=0)
+            m[:, item] = xs
+            c[variavel] = m
+        return _avaliar(anos, assum, c, {}, s=len(xs))["resultado"]
+    return _avaliar(anos, assum, comp, {variavel: xs})["resultado"]
+
+def _metrica(resultado: np.ndarray, alvo: str, j: int) -> np.ndarray:
+    if alvo == "resultado":
+        return resultado[:, j]
+    if alvo == "resultado_acumulado":
+        return np.add.accumulate(resultado[:, :j + 1], axis=1)[:, -1]
+    raise ValueError(f"Meta desconhecida: {alvo} (usar 'resultado' ou 'resultado_acumulado')")
+
+def ponto_equilibrio(
+    anos: List[int],
+    assum: Dict[str, float],
+    vendas_df: pd.DataFrame,
+    pessoal_df: pd.DataFrame,
+    investimento_df: pd.DataFrame,
+    variavel: str,
+    ano: Optional[int] = None,
+    minimo: float = 0.0,
+    alvo: str = "resultado",
+    item: Optional[int] = None,
+    intervalo: Optional[Tuple[float, float]] = None,
+    passo: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Valor de `variavel` a partir do qual a meta é cumprida.
+
+    Meta: `alvo` ("resultado" do ano, ou "resultado_acumulado" até ao ano) ≥ `minimo`
+    no ano `ano` (por omissão, o primeiro). `variavel` é uma chave de assum
+    (ex.: emprestimo_montante) ou "preco"/"qtd_mensal": com `item` (posição da linha
+    em vendas_df) procura o valor desse item; sem `item`, o fator a aplicar a todos.
+    `passo` arredonda a resposta para o lado que cumpre a meta (1 unidade, 0.01 €, ...).
+
+    Devolve {"valor", "atingido", "sentido", "resultado" (por ano), "avaliacoes", "segundos"};
+    "sentido" é "minimo" se a meta exige valores ≥ valor e "maximo" se ≤ valor.
+    """
+    t0 = time.perf_counter()
+    if variavel not in VARIAVEIS_ITEM and variavel not in CHAVES_ASSUM:
+        raise ValueError(f"Variável sem efeito no modelo: {variavel}")
+    ano = anos[0] if ano is None else ano
+    if ano not in anos:
+        raise ValueError(f"Ano {ano} fora da projeção {anos[0]}–{anos[-1]}")
+    j = anos.index(ano)
+    comp = _componentes(vendas_df, pessoal_df, investimento_df)
+    if variavel in VARIAVEIS_ITEM:
+        if item is not None and not 0 <= item < len(comp[variavel]):
+            raise ValueError(f"Item {item} inexistente em vendas_df")
+        base = 1.0 if item is None else float(comp[variavel][item])
+    else:
+        base = float(assum.get(variavel, CHAVES_ASSUM[variavel]))
+    if passo is None and variavel == "qtd_mensal" and item is not None:
+        passo = 1.0
+    avaliacoes = 0
+
+    def cumpre(xs: np.ndarray) -> np.ndarray:
+        nonlocal avaliacoes
+        avaliacoes += len(xs)
+        return _metrica(_avaliar_variavel(anos, assum, comp, variavel, item, xs), alvo, j) >= minimo
+
+    # 1) Intervalo: os limites dados ou 0 e uma escala geométrica a partir do valor atual.
+    if intervalo is not None:
+        xs = np.linspace(float(intervalo[0]), float(intervalo[1]), EQUILIBRIO_PONTOS)
+    else:
+        xs = np.concatenate([[0.0], max(abs(base), 1.0) * 2.0 ** np.arange(-12, EQUILIBRIO_PONTOS - 13)])
+    ok = cumpre(xs)
+    muda = np.flatnonzero(ok != ok[0])
+    if not len(muda):
+        # A meta não depende da variável neste intervalo: cumprida em todo ou em nenhum ponto.
+        return {
+            "valor": float(xs[0]) if ok[0] else None, "atingido": bool(ok[0]), "sentido": None,
+            "resultado": _avaliar_variavel(anos, assum, comp, variavel, item, xs[:1])[0].tolist(),
+            "avaliacoes": avaliacoes, "segundos": time.perf_counter() - t0,
+        }
+    crescente = not ok[0]   # falha em baixo e cumpre em cima → procura o mínimo
+    a, b = float(xs[muda[0] - 1]), float(xs[muda[0]])
+
+    # 2) Refinamento: cada iteração divide o intervalo em EQUILIBRIO_PONTOS avaliados de uma vez.
+    for _ in range(EQUILIBRIO_ITERACOES):
+        if b - a <= 1e-9 * max(1.0, abs(b)) or (passo and b - a < passo):
+            break
+        xs = np.linspace(a, b, EQUILIBRIO_PONTOS)
+        k = int(np.flatnonzero(cumpre(xs) != (not crescente))[0])
+        a, b = float(xs[k - 1]), float(xs[k])
+    valor = b if crescente else a
+    if passo:
+        valor = float((np.ceil if crescente else np.floor)(round(valor / passo, 9)) * passo)
+        if not cumpre(np.array([valor]))[0]:
+            valor += passo if crescente else -passo
+    final = _avaliar_variavel(anos, assum, comp, variavel, item, np.array([valor]))[0]
+    return {
+        "valor": valor, "atingido": True, "sentido": "minimo" if crescente else "maximo",
+        "resultado": final.tolist(), "avaliacoes": avaliacoes, "segundos": time.perf_counter() - t0,
+    }
@@ -1,29 +1,28 @@
 import os, json
-import pandas as pd
-from docx import Document
 from pathlib import Path
+from autofill_llm import cached_completion, chat_texto, get_openai_client
+from autofill_trace import instrumentar, tamanho
 
 def ia_disponivel():
     return bool(os.getenv("OPENAI_API_KEY"))
 
-def gerar_texto_ia(titulo, instrucoes, contexto):
+@instrumentar("gerar_texto_ia", lambda res, titulo, *a, **k: {"campo": titulo, "letras": len(res)})
+def gerar_texto_ia(titulo, instrucoes, contexto, regenerar=False):
     if ia_disponivel():
         try:
-            from openai import OpenAI
-            client = OpenAI()
+            client = get_openai_client()
             prompt = f"Escreve um texto claro para '{titulo}' em PT-PT. Contexto: {json.dumps(contexto, ensure_ascii=False)}. {instrucoes}"
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role":"user","content":prompt}],
-                temperature=0.5,
-            )
-            return resp.choices[0].message.content.strip()
+            messages = [{"role":"user","content":prompt}]
+            pedido = lambda: chat_texto(client, "gpt-4o-mini", messages, 0.5)
+            return cached_completion("gpt-4o-mini", messages, 0.5, pedido, regenerar=regenerar)
         except Exception:
             return f"[Gerar com IA] {titulo}: {instrucoes}"
     return f"[Preencher] {titulo}: {instrucoes}"
 
+@instrumentar("calcular_tabelas")
 def calcular_tabelas(cfg):
     """Gera tabelas exemplo para Parte 1"""
+    import pandas as pd
     anos = cfg.get("anos", [2025,2026,2027])
     vendas = cfg.get("vendas", [])
     df_vendas = pd.DataFrame(vendas)
@@ -45,8 +44,12 @@ def calcular_tabelas(cfg):
         "balanco": df_balanco,
     }
 
+@instrumentar("build_docx", lambda res, cfg, tabs, out_path: {"tabelas": len(tabs), "bytes": tamanho(out_path)})
 def build_docx(cfg, tabs, out_path: Path):
     """Gera um DOCX simples com os dados"""
+    # pandas/python-docx só quando há documento para gerar: importar o módulo fica leve.
+    from docx import Document
+    from autofill_docx import escrever_tabela
     doc = Document()
     doc.add_heading("Parte 1 — Formulário IEFP", 0)
 
@@ -61,13 +64,7 @@ def build_docx(cfg, tabs, out_path: Path):
     for nome, df in tabs.items():
         doc.add_heading(nome, 1)
         if not df.empty:
-            table = doc.add_table(rows=df.shape[0]+1, cols=df.shape[1])
-            table.style = "Table Grid"
-            for j, col in enumerate(df.columns):
-                table.cell(0,j).text = str(col)
-            for i in range(df.shape[0]):
-                for j in range(df.shape[1]):
-                    table.cell(i+1,j).text = str(df.iat[i,j])
+            escrever_tabela(doc, df)
         else:
             doc.add_paragraph("(sem dados)")
 
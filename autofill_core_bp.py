@@ -1,29 +1,29 @@
-import os, json
+import os, json, pickle, hashlib
+from collections import Counter
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 import pandas as pd
-from docx import Document
+from autofill_llm import cached_completion, chat_texto, get_openai_client
+from autofill_trace import instrumentar, tamanho
 
 # --- IA helpers ---
 def ia_disponivel() -> bool:
     return bool(os.getenv("OPENAI_API_KEY"))
 
-def gerar_texto_ia(titulo: str, instrucoes: str, contexto: Dict[str, Any]) -> str:
+@instrumentar("gerar_texto_ia", lambda res, titulo, *a, **k: {"campo": titulo, "letras": len(res)})
+def gerar_texto_ia(titulo: str, instrucoes: str, contexto: Dict[str, Any], regenerar: bool = False) -> str:
     if ia_disponivel():
         try:
-            from openai import OpenAI
-            client = OpenAI()
+            client = get_openai_client()
             prompt = (
                 f"Escreve uma secção clara para '{titulo}' em PT-PT. "
                 f"Instruções: {instrucoes}. Contexto: {json.dumps(contexto, ensure_ascii=False)}. "
                 f"120-200 palavras, objetivo e profissional."
             )
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role":"user","content":prompt}],
-                temperature=0.5,
-            )
-            return resp.choices[0].message.content.strip()
+            messages = [{"role":"user","content":prompt}]
+            pedido = lambda: chat_texto(client, "gpt-4o-mini", messages, 0.5)
+            return cached_completion("gpt-4o-mini", messages, 0.5, pedido, regenerar=regenerar)
         except Exception:
             return f"[Gerar com IA] {titulo}: {instrucoes}"
     return f"[Preencher] {titulo}: {instrucoes}"
@@ -39,126 +39,302 @@ def cortar(texto: str, limite: int) -> str:
     return recorte + "…"
 
 # --- FINANCEIROS (Parte 2) ---
-def calcular_financeiros(
-    anos: List[int],
-    assum: Dict[str, float],
-    vendas_df: pd.DataFrame,
-    pessoal_df: pd.DataFrame,
-    investimento_df: pd.DataFrame,
-) -> Dict[str, pd.DataFrame]:
+# Cálculo vetorizado: cada tabela é uma matriz (itens × anos) em NumPy. As operações
+# seguem a mesma ordem que o cálculo linha a linha original, e os arredondamentos usam
+# _round2, por isso os DataFrames resultantes são idênticos aos de antes.
+def _round2(a: np.ndarray) -> np.ndarray:
+    """round(x, 2) do Python, elemento a elemento.
 
-    years = [str(a) for a in anos]
+    np.round(x, 2) faz rint(x*100)/100 e pode escolher o lado errado quando x*100 fica
+    a um ulp de ...,5; esses (raros) valores são refeitos com round().
+    """
+    a = np.asarray(a, dtype=float)
+    r = np.round(a, 2)
+    s = a * 100.0
+    amb = np.abs(s - np.floor(s) - 0.5) < 1e-6 + np.abs(s) * 1e-12
+    if amb.any():
+        r[amb] = [round(float(x), 2) for x in a[amb]]
+    return r
 
-    # Vendas: calcula Y1 e projeta crescimento para restantes anos
-    linhas_v = []
-    for _, v in vendas_df.fillna(0).iterrows():
-        y1 = float(v.get("preco",0)) * float(v.get("qtd_mensal",0)) * float(v.get("meses_y1",12))
-        row = {"designacao": v.get("designacao","—"), years[0]: round(y1,2)}
-        for i in range(1, len(anos)):
-            prev = row[years[i-1]]
-            row[years[i]] = round(prev * (1 + float(assum.get("crescimento_receitas", 0.08))), 2)
-        linhas_v.append(row)
-    df_vendas = pd.DataFrame(linhas_v) if linhas_v else pd.DataFrame(columns=["designacao", *years])
-    tot_vendas = {y: (df_vendas[y].sum() if y in df_vendas else 0.0) for y in years}
+def _num(df: pd.DataFrame, col: str, default: float) -> np.ndarray:
+    """Equivale a float(row.get(col, default)) para cada linha do iterrows()."""
+    if col not in df.columns:
+        return np.full(len(df), float(default))
+    return df[col].to_numpy(dtype=float)
 
-    # COGS e FSE em percentagem das vendas
-    margem = float(assum.get("margem_bruta_target", 0.55))
-    cogs = {y: round((1 - margem) * tot_vendas[y], 2) for y in years}
-    df_cogs = pd.DataFrame([{"rubrica": "COGS", **cogs}])
+def _rotulos(df: pd.DataFrame, col: str, default: Any) -> List[Any]:
+    """Equivale a row.get(col, default), incluindo o upcast do iterrows() em tabelas só numéricas."""
+    if col not in df.columns:
+        return [default] * len(df)
+    if all(pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t) for t in df.dtypes):
+        return list(df.values[:, df.columns.get_loc(col)])
+    return df[col].tolist()
 
-    fse_pct = float(assum.get("fse_pct_receitas", 0.12))
-    fse = {y: round(fse_pct * tot_vendas[y], 2) for y in years}
-    df_fse = pd.DataFrame([{"rubrica": "FSE", **fse}])
+def _tabela(rotulo: str, nomes: List[Any], years: List[str], matriz: np.ndarray) -> pd.DataFrame:
+    if not len(nomes):
+        return pd.DataFrame(columns=[rotulo, *years])
+    return pd.DataFrame({rotulo: nomes, **{y: matriz[:, i] for i, y in enumerate(years)}})
 
-    # Pessoal + encargos sociais e aumentos anuais
-    enc_soc = float(assum.get("encargos_sociais_pct", 0.2375))
-    aum = float(assum.get("aumento_salarios_pct", 0.03))
-    linhas_p = []
-    for _, p in pessoal_df.fillna(0).iterrows():
-        base = float(p.get("venc_mensal",0)) * float(p.get("n",0)) * float(p.get("meses",12))
-        y_vals = {years[0]: base * (1 + enc_soc)}
-        for i in range(1, len(anos)):
-            prev_base = y_vals[years[i-1]] / (1 + enc_soc)
-            y_vals[years[i]] = (prev_base * (1 + aum)) * (1 + enc_soc)
-        linhas_p.append({"rubrica": p.get("funcao","—"), **{k: round(v,2) for k,v in y_vals.items()}})
-    df_pessoal = pd.DataFrame(linhas_p) if linhas_p else pd.DataFrame(columns=["rubrica", *years])
+def _vendas_matriz(vendas_df: pd.DataFrame, n_anos: int, crescimento: float) -> Tuple[List[Any], np.ndarray]:
+    v = vendas_df.fillna(0)
+    m = np.empty((len(v), n_anos))
+    if len(v) and n_anos:
+        m[:, 0] = _round2(_num(v, "preco", 0) * _num(v, "qtd_mensal", 0) * _num(v, "meses_y1", 12))
+        for i in range(1, n_anos):
+            m[:, i] = _round2(m[:, i-1] * (1 + crescimento))
+    return _rotulos(v, "designacao", "—"), m
 
-    # Depreciações lineares por tipo
-    dep_map = {
+def _pessoal_matriz(pessoal_df: pd.DataFrame, n_anos: int, enc_soc: float, aum: float) -> Tuple[List[Any], np.ndarray]:
+    p = pessoal_df.fillna(0)
+    m = np.empty((len(p), n_anos))
+    if len(p) and n_anos:
+        base = _num(p, "venc_mensal", 0) * _num(p, "n", 0) * _num(p, "meses", 12)
+        m[:, 0] = base * (1 + enc_soc)
+        for i in range(1, n_anos):
+            prev_base = m[:, i-1] / (1 + enc_soc)
+            m[:, i] = (prev_base * (1 + aum)) * (1 + enc_soc)
+    return _rotulos(p, "funcao", "—"), _round2(m)
+
+def _depreciacoes_vetor(investimento_df: pd.DataFrame, dep_map: Dict[str, int]) -> Tuple[List[str], np.ndarray]:
+    """Devolve (designações, depreciação anual por bem), sem arredondar."""
+    inv = investimento_df.fillna("")
+    tipos = [str(t).lower() for t in _rotulos(inv, "tipo", "outros")]
+    descricoes = _rotulos(inv, "descricao", "")
+    anos_dep = np.array([dep_map.get(t, dep_map["outros"]) or 1 for t in tipos], dtype=float)
+    anu = _num(inv, "valor", 0.0) / anos_dep
+    return [f"{t}: {d}" for t, d in zip(tipos, descricoes)], anu
+
+def _dep_map(assum: Dict[str, float]) -> Dict[str, int]:
+    return {
         "equipamento": int(assum.get("dep_equipamento_anos", 5)),
         "informatica": int(assum.get("dep_informatica_anos", 3)),
         "veiculos": int(assum.get("dep_veiculos_anos", 4)),
         "intangiveis": int(assum.get("dep_intangiveis_anos", 3)),
         "outros": int(assum.get("dep_outros_anos", 4)),
     }
-    dep_rows, dep_tot = [], {y: 0.0 for y in years}
-    for _, it in investimento_df.fillna("").iterrows():
-        tipo = str(it.get("tipo","outros")).lower()
-        val = float(it.get("valor", 0.0))
-        anos_dep = dep_map.get(tipo, dep_map["outros"]) or 1
-        anu = val / anos_dep
-        row = {"bem": f"{tipo}: {it.get('descricao','')}", **{y: round(anu,2) for y in years}}
-        dep_rows.append(row)
-        for y in years:
-            dep_tot[y] += anu
-    df_dep = pd.DataFrame(dep_rows) if dep_rows else pd.DataFrame(columns=["bem", *years])
 
-    # Empréstimo: amortização constante
-    df_fin = pd.DataFrame(columns=["ano","prestacao","capital","juros","divida_final"])
-    juros_tot = {y: 0.0 for y in years}
+def _emprestimo(anos: List[int], assum: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Empréstimo: amortização constante. Linhas do plano, sem arredondar."""
+    linhas = []
     saldo = float(assum.get("emprestimo_montante", 0.0))
     taxa = float(assum.get("emprestimo_taxa", 0.06))
     anos_amort = int(assum.get("emprestimo_anos", 3)) or 1
     amort = saldo / anos_amort if saldo > 0 else 0.0
-    for i, ano in enumerate(anos):
+    for ano in anos:
         j = saldo * taxa if saldo > 0 else 0.0
         c = min(amort, saldo) if saldo > 0 else 0.0
         p = j + c
         saldo = max(0.0, saldo - c)
-        juros_tot[str(ano)] = j
-        df_fin.loc[len(df_fin)] = {
-            "ano": ano, "prestacao": round(p,2), "capital": round(c,2),
-            "juros": round(j,2), "divida_final": round(saldo,2)
-        }
+        linhas.append({"ano": ano, "prestacao": p, "capital": c, "juros": j, "divida_final": saldo})
+    return linhas
+
+# --- Grafo de cálculo ---
+# Cada tabela é um nó: lê as suas entradas (fatias dos DataFrames, chaves de assum) e os
+# resultados dos nós a montante. calcular_financeiros corre o grafo inteiro;
+# RecalculoFinanceiro guarda o último resultado de cada nó e só recalcula os nós cuja
+# chave (hash das entradas próprias + chaves dos nós a montante) mudou.
+def _no_vendas(anos, assum, dfs, up):
+    years = [str(a) for a in anos]
+    nomes_v, m_v = _vendas_matriz(dfs["vendas_df"], len(anos), float(assum.get("crescimento_receitas", 0.08)))
+    df_vendas = _tabela("designacao", nomes_v, years, m_v)
+    tot_vendas = {y: (df_vendas[y].sum() if y in df_vendas else 0.0) for y in years}
+    return {"tabela": df_vendas, "tot_vendas": tot_vendas}
+
+def _no_cogs(anos, assum, dfs, up):
+    # COGS em percentagem das vendas
+    margem = float(assum.get("margem_bruta_target", 0.55))
+    tot_vendas = up["vendas"]["tot_vendas"]
+    return {"tabela": pd.DataFrame([{"rubrica": "COGS", **{y: round((1 - margem) * tot_vendas[y], 2) for y in tot_vendas}}])}
+
+def _no_fse(anos, assum, dfs, up):
+    fse_pct = float(assum.get("fse_pct_receitas", 0.12))
+    tot_vendas = up["vendas"]["tot_vendas"]
+    return {"tabela": pd.DataFrame([{"rubrica": "FSE", **{y: round(fse_pct * tot_vendas[y], 2) for y in tot_vendas}}])}
+
+def _no_pessoal(anos, assum, dfs, up):
+    # Pessoal + encargos sociais e aumentos anuais
+    enc_soc = float(assum.get("encargos_sociais_pct", 0.2375))
+    aum = float(assum.get("aumento_salarios_pct", 0.03))
+    nomes_p, m_p = _pessoal_matriz(dfs["pessoal_df"], len(anos), enc_soc, aum)
+    return {"tabela": _tabela("rubrica", nomes_p, [str(a) for a in anos], m_p)}
+
+def _no_depreciacoes(anos, assum, dfs, up):
+    # Depreciações lineares por tipo
+    years = [str(a) for a in anos]
+    bens, anu = _depreciacoes_vetor(dfs["investimento_df"], _dep_map(assum))
+    df_dep = _tabela("bem", bens, years, np.repeat(_round2(anu)[:, None], len(years), axis=1))
+    # Soma sequencial (accumulate) para coincidir com o += linha a linha.
+    dep_anual = float(np.add.accumulate(anu)[-1]) if len(anu) else 0.0
+    return {"tabela": df_dep, "dep_tot": {y: dep_anual for y in years}}
+
+def _no_financiamento(anos, assum, dfs, up):
+    # Empréstimo: amortização constante
+    plano = _emprestimo(anos, assum)
+    if plano:
+        df_fin = pd.DataFrame([{k: (v if k == "ano" else round(v, 2)) for k, v in l.items()} for l in plano])
+    else:
+        df_fin = pd.DataFrame(columns=["ano","prestacao","capital","juros","divida_final"])
+    return {"tabela": df_fin, "juros_tot": {str(l["ano"]): l["juros"] for l in plano}}
 
+def _no_dr(anos, assum, dfs, up):
     # Demonstração de Resultados
-    df_dr = pd.DataFrame([
+    years = [str(a) for a in anos]
+    tot_vendas = up["vendas"]["tot_vendas"]
+    df_cogs, df_fse, df_pessoal = up["cogs"]["tabela"], up["fse"]["tabela"], up["pessoal"]["tabela"]
+    dep_tot, juros_tot = up["depreciacoes"]["dep_tot"], up["financiamento"]["juros_tot"]
+    linhas_dr = [
         {"rubrica": "Vendas/Serviços", **{y: round(tot_vendas[y],2) for y in years}},
         {"rubrica": "COGS", **{y: round(df_cogs[y].iloc[0] if not df_cogs.empty else 0.0,2) for y in years}},
         {"rubrica": "FSE", **{y: round(df_fse[y].sum() if y in df_fse else 0.0,2) for y in years}},
         {"rubrica": "Pessoal", **{y: round(df_pessoal[y].sum() if not df_pessoal.empty else 0.0,2) for y in years}},
         {"rubrica": "Depreciações", **{y: round(dep_tot[y],2) for y in years}},
         {"rubrica": "Juros", **{y: round(juros_tot[y],2) for y in years}},
-    ])
-    res = {"rubrica": "Resultado"}
-    for y in years:
-        res[y] = round(
-            df_dr[y].iloc[0] - df_dr[y].iloc[1] - df_dr[y].iloc[2] - df_dr[y].iloc[3] - df_dr[y].iloc[4] - df_dr[y].iloc[5],
-            2
-        )
-    df_dr.loc[len(df_dr)] = res
+    ]
+    dr = np.array([[l[y] for y in years] for l in linhas_dr], dtype=float).reshape(len(linhas_dr), len(years))
+    resultado = dr[0] - dr[1] - dr[2] - dr[3] - dr[4] - dr[5]
+    linhas_dr.append({"rubrica": "Resultado", **{y: round(float(resultado[i]), 2) for i, y in enumerate(years)}})
+    return {"tabela": pd.DataFrame(linhas_dr)}
 
+def _no_balanco(anos, assum, dfs, up):
     # Balanço (muito simplificado)
+    years = [str(a) for a in anos]
+    investimento_df = dfs["investimento_df"]
+    tot_vendas = up["vendas"]["tot_vendas"]
     inv_total = float(investimento_df.get("valor", pd.Series(dtype=float)).sum()) if not investimento_df.empty else 0.0
-    df_bal = pd.DataFrame([
+    return {"tabela": pd.DataFrame([
         {"rubrica": "Ativo Não Corrente", years[0]: round(inv_total,2)},
         {"rubrica": "Ativo Corrente", **{y: round(0.1*tot_vendas[y],2) for y in years}},
         {"rubrica": "Capital Próprio", years[0]: round(float(assum.get("capitais_proprios_iniciais",0.0)),2)},
-    ])
+    ])}
 
-    return {
-        "vendas": df_vendas,
-        "cogs": df_cogs,
-        "fse": df_fse,
-        "pessoal": df_pessoal,
-        "depreciacoes": df_dep,
-        "financiamento": df_fin,
-        "dr": df_dr,
-        "balanco": df_bal,
-    }
+# nome -> (função, nós a montante, chaves de assum lidas, fatias lidas: {df: colunas ou None = todas})
+NOS_FINANCEIROS: Dict[str, Tuple[Any, Tuple[str, ...], Tuple[str, ...], Dict[str, Optional[Tuple[str, ...]]]]] = {
+    "vendas": (_no_vendas, (), ("crescimento_receitas",), {"vendas_df": None}),
+    "cogs": (_no_cogs, ("vendas",), ("margem_bruta_target",), {}),
+    "fse": (_no_fse, ("vendas",), ("fse_pct_receitas",), {}),
+    "pessoal": (_no_pessoal, (), ("encargos_sociais_pct", "aumento_salarios_pct"), {"pessoal_df": None}),
+    "depreciacoes": (_no_depreciacoes, (), tuple(f"dep_{t}_anos" for t in ("equipamento", "informatica", "veiculos", "intangiveis", "outros")), {"investimento_df": None}),
+    "financiamento": (_no_financiamento, (), ("emprestimo_montante", "emprestimo_taxa", "emprestimo_anos"), {}),
+    "dr": (_no_dr, ("vendas", "cogs", "fse", "pessoal", "depreciacoes", "financiamento"), (), {}),
+    "balanco": (_no_balanco, ("vendas",), ("capitais_proprios_iniciais",), {"investimento_df": ("valor",)}),
+}
+
+def _hash_df(df: pd.DataFrame, colunas: Optional[Tuple[str, ...]] = None) -> str:
+    """Hash do conteúdo (ou só de `colunas`), incluindo nomes, dtypes e forma da tabela.
+
+    O índice não entra: nenhuma tabela depende dele. Colunas numéricas são lidas como
+    bytes; as restantes via pickle da lista de valores (bem mais rápido que
+    pd.util.hash_pandas_object para tabelas do tamanho das do formulário).
+    """
+    h = hashlib.sha1(repr(df.shape).encode())
+    for c in (df.columns if colunas is None else [c for c in colunas if c in df.columns]):
+        col = df[c]
+        h.update(repr((c, str(col.dtype))).encode())
+        if isinstance(col.dtype, np.dtype) and col.dtype.kind in "biuf":
+            h.update(np.ascontiguousarray(col.to_numpy()).tobytes())
+        else:
+            h.update(pickle.dumps(col.tolist()))
+    return h.hexdigest()
+
+def _chave_no(nome: str, anos: List[int], assum: Dict[str, float], dfs: Dict[str, pd.DataFrame], chaves: Dict[str, str]) -> str:
+    _, deps, ks, fatias = NOS_FINANCEIROS[nome]
+    h = hashlib.sha1(repr((nome, list(anos), [(k, assum.get(k)) for k in ks], [chaves[d] for d in deps])).encode())
+    for df_nome, colunas in fatias.items():
+        h.update(_hash_df(dfs[df_nome], colunas).encode())
+    return h.hexdigest()
+
+def _executar_grafo(
+    anos: List[int], assum: Dict[str, float], dfs: Dict[str, pd.DataFrame], memo: Optional["RecalculoFinanceiro"] = None,
+) -> Dict[str, pd.DataFrame]:
+    res: Dict[str, Dict[str, Any]] = {}
+    chaves: Dict[str, str] = {}
+    for nome, (fn, deps, _, _) in NOS_FINANCEIROS.items():   # já em ordem topológica
+        if memo is None:
+            res[nome] = fn(anos, assum, dfs, res)
+            continue
+        chaves[nome] = chave = _chave_no(nome, anos, assum, dfs, chaves)
+        guardado = memo._memo.get(nome)
+        if guardado is not None and guardado[0] == chave:
+            res[nome] = guardado[1]
+            memo.reutilizacoes[nome] += 1
+        else:
+            res[nome] = fn(anos, assum, dfs, res)
+            memo._memo[nome] = (chave, res[nome])
+            memo.recalculos[nome] += 1
+            memo.ultimos.append(nome)
+    return {nome: r["tabela"] for nome, r in res.items()}
+
+@instrumentar("calcular_financeiros", lambda res, anos, *a, **k: {
+    "anos": len(anos), "linhas": sum(len(df) for df in res.values()),
+})
+def calcular_financeiros(
+    anos: List[int],
+    assum: Dict[str, float],
+    vendas_df: pd.DataFrame,
+    pessoal_df: pd.DataFrame,
+    investimento_df: pd.DataFrame,
+) -> Dict[str, pd.DataFrame]:
+    """Tabelas da Parte 2: vendas, cogs, fse, pessoal, depreciacoes, financiamento, dr, balanco."""
+    dfs = {"vendas_df": vendas_df, "pessoal_df": pessoal_df, "investimento_df": investimento_df}
+    return _executar_grafo(anos, assum, dfs)
+
+class RecalculoFinanceiro:
+    """calcular_financeiros incremental, para recalcular a cada edição de uma tabela.
+
+    Guarda o último resultado de cada nó; numa nova chamada só recalcula os nós cujas
+    entradas mudaram (ex.: uma linha de pessoal → pessoal e dr). Uma instância por
+    sessão; as tabelas devolvidas são cópias e podem ser alteradas.
+    """
+
+    def __init__(self):
+        self._memo: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.recalculos: Counter = Counter()
+        self.reutilizacoes: Counter = Counter()
+        self.ultimos: List[str] = []
+
+    @instrumentar("calcular_financeiros", lambda res, self, *a, **k: {
+        "incremental": True, "recalculados": len(self.ultimos),
+    })
+    def calcular(
+        self,
+        anos: List[int],
+        assum: Dict[str, float],
+        vendas_df: pd.DataFrame,
+        pessoal_df: pd.DataFrame,
+        investimento_df: pd.DataFrame,
+    ) -> Dict[str, pd.DataFrame]:
+        self.ultimos = []
+        dfs = {"vendas_df": vendas_df, "pessoal_df": pessoal_df, "investimento_df": investimento_df}
+        return {nome: df.copy() for nome, df in _executar_grafo(anos, assum, dfs, self).items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recalculados": dict(self.recalculos),
+            "reutilizados": dict(self.reutilizacoes),
+            "ultimos": list(self.ultimos),
+        }
+
+    def limpar(self) -> None:
+        self._memo.clear()
+        self.recalculos.clear()
+        self.reutilizacoes.clear()
+        self.ultimos = []
 
 # --- Export DOCX (Parte 2) ---
-def build_docx_bp(cfg: Dict[str, Any], tabs: Dict[str, pd.DataFrame], textos: Dict[str,str], out_path: Path):
+@instrumentar("build_docx_bp", lambda res, cfg, tabs, textos, out_path, *a, **k: {
+    "tabelas": len(tabs), "seccoes": len(textos), "bytes": tamanho(out_path),
+})
+def build_docx_bp(
+    cfg: Dict[str, Any],
+    tabs: Dict[str, pd.DataFrame],
+    textos: Dict[str,str],
+    out_path: Path,
+    sensibilidade: Optional[pd.DataFrame] = None,
+):
+    # python-docx só aqui: o cálculo (cenários, lote sem DOCX) não paga o import.
+    from docx import Document
+    from autofill_docx import escrever_tabela
+
     doc = Document()
     doc.add_heading("Plano de Negócio — Parte 2", 0)
 
@@ -173,18 +349,148 @@ def build_docx_bp(cfg: Dict[str, Any], tabs: Dict[str, pd.DataFrame], textos: Di
         if df is None or df.empty:
             doc.add_paragraph("(sem dados)")
             return
-        rows, cols = df.shape
-        table = doc.add_table(rows=rows+1, cols=cols)
-        table.style = "Table Grid"
-        for j, col in enumerate(df.columns):
-            table.cell(0, j).text = str(col)
-        for i in range(rows):
-            for j in range(cols):
-                val = df.iat[i, j]
-                table.cell(i+1, j).text = "" if pd.isna(val) else str(val)
+        escrever_tabela(doc, df)
 
     for nome, df in tabs.items():
         write_table(nome.upper(), df)
 
+    # Bandas do Resultado (autofill_cenarios.analise_sensibilidade)
+    if sensibilidade is not None:
+        write_table("ANÁLISE DE SENSIBILIDADE — RESULTADO", sensibilidade)
+
     doc.save(out_path)
 
+
+# --- Export XLSX (Parte 2) ---
+# Rubricas da DR que são a soma da coluna do ano noutra tabela: no XLSX ficam como fórmulas,
+# e o Resultado como a diferença das linhas acima. Com os pressupostos (folha PRESSUPOSTOS),
+# também as vendas dos anos seguintes (ano anterior × crescimento), o COGS e os FSE (% das
+# vendas) são fórmulas: o revisor muda as vendas do 1.º ano ou um pressuposto e VENDAS,
+# COGS, FSE e DR acompanham. Pessoal, depreciações e juros continuam valores calculados.
+DR_SOMAS = {"Vendas/Serviços": "vendas", "COGS": "cogs", "FSE": "fse", "Pessoal": "pessoal", "Depreciações": "depreciacoes"}
+DR_RESULTADO = ("Vendas/Serviços", "COGS", "FSE", "Pessoal", "Depreciações", "Juros")
+# Pressupostos que as fórmulas referem, com os mesmos valores por omissão dos nós do grafo.
+XLSX_PRESSUPOSTOS = {"crescimento_receitas": 0.08, "margem_bruta_target": 0.55, "fse_pct_receitas": 0.12}
+
+def _pressupostos(assum: Dict[str, float]) -> pd.DataFrame:
+    return pd.DataFrame({
+        "pressuposto": list(XLSX_PRESSUPOSTOS),
+        "valor": [float(assum.get(k, d)) for k, d in XLSX_PRESSUPOSTOS.items()],
+    })
+
+def _formulas_pressupostos(
+    tabs: Dict[str, pd.DataFrame], titulos: Dict[str, str], pressupostos: pd.DataFrame, titulo_p: str,
+) -> Dict[str, Dict[Tuple[int, int], str]]:
+    """{tabela: {(linha, coluna): fórmula}} para VENDAS (anos 2+), COGS e FSE. Como na DR,
+    uma fórmula só substitui o valor se der o mesmo resultado."""
+    from autofill_xlsx import celula, intervalo, letra_coluna
+
+    ref = {k: celula(titulo_p, i + 2, 2) for i, k in enumerate(pressupostos["pressuposto"])}
+    valor = dict(zip(pressupostos["pressuposto"], pressupostos["valor"]))
+    out: Dict[str, Dict[Tuple[int, int], str]] = {}
+    vendas = tabs.get("vendas")
+    if vendas is None or vendas.empty:
+        return out
+    anos = [c for c in vendas.columns if c != "designacao"]
+    num = vendas[anos].apply(pd.to_numeric, errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    f_v: Dict[Tuple[int, int], str] = {}
+    g = valor["crescimento_receitas"]
+    for a in range(1, len(anos)):
+        j = list(vendas.columns).index(anos[a])
+        anterior = letra_coluna(j)   # a coluna à esquerda
+        for i in range(len(vendas)):
+            if abs(round(num[i, a - 1] * (1 + g), 2) - num[i, a]) < 0.005:
+                f_v[(i, j)] = f"=ROUND({anterior}{i + 2}*(1+{ref['crescimento_receitas']}),2)"
+    out["vendas"] = f_v
+
+    for nome, pct, expr in (
+        ("cogs", 1 - valor["margem_bruta_target"], f"(1-{ref['margem_bruta_target']})"),
+        ("fse", valor["fse_pct_receitas"], ref["fse_pct_receitas"]),
+    ):
+        df = tabs.get(nome)
+        if df is None or df.empty or nome not in titulos:
+            continue
+        f: Dict[Tuple[int, int], str] = {}
+        for a, y in enumerate(anos):
+            if y not in df.columns:
+                continue
+            soma = intervalo(titulos["vendas"], 2, len(vendas) + 1, list(vendas.columns).index(y) + 1)
+            esperado = round(pct * float(num[:, a].sum()), 2)
+            j = list(df.columns).index(y)
+            for i in range(len(df)):
+                if abs(esperado - float(df.iat[i, j])) < 0.005:
+                    f[(i, j)] = f"=ROUND({expr}*SUM({soma}),2)"
+        out[nome] = f
+    return out
+
+def _formulas_dr(tabs: Dict[str, pd.DataFrame], titulos: Dict[str, str]) -> Dict[Tuple[int, int], str]:
+    """{(linha, coluna) da DR: fórmula}. Uma fórmula só substitui o valor se der o mesmo
+    resultado (ex.: as depreciações somam valores por arredondar e ficam estáticas)."""
+    from autofill_xlsx import intervalo, letra_coluna
+
+    dr = tabs.get("dr")
+    if dr is None or dr.empty or "rubrica" not in dr.columns:
+        return {}
+    linha = {r: i for i, r in enumerate(dr["rubrica"])}
+    fin = tabs.get("financiamento")
+    out: Dict[Tuple[int, int], str] = {}
+    for j, y in enumerate(dr.columns):
+        if y == "rubrica":
+            continue
+        for rubrica, i in linha.items():
+            formula, valor = None, None
+            origem = tabs.get(DR_SOMAS.get(rubrica, ""))
+            if origem is not None and not origem.empty and y in origem.columns:
+                col = list(origem.columns).index(y) + 1
+                formula = f"=ROUND(SUM({intervalo(titulos[DR_SOMAS[rubrica]], 2, len(origem) + 1, col)}),2)"
+                valor = round(float(pd.to_numeric(origem[y], errors="coerce").fillna(0.0).sum()), 2)
+            elif rubrica == "Juros" and fin is not None and not fin.empty and {"ano", "juros"} <= set(fin.columns) and str(y).isdigit():
+                t, n = titulos["financiamento"], len(fin) + 1
+                anos_ref = intervalo(t, 2, n, list(fin.columns).index("ano") + 1)
+                juros_ref = intervalo(t, 2, n, list(fin.columns).index("juros") + 1)
+                formula = f"=ROUND(SUMIF({anos_ref},{int(y)},{juros_ref}),2)"
+                valor = round(float(fin.loc[fin["ano"] == int(y), "juros"].sum()), 2)
+            if formula and abs(valor - float(dr.iat[i, j])) < 0.005:
+                out[(i, j)] = formula
+        if "Resultado" in linha and all(r in linha for r in DR_RESULTADO):
+            letra = letra_coluna(j + 1)
+            termos = [f"{letra}{linha[r] + 2}" for r in DR_RESULTADO]
+            out[(linha["Resultado"], j)] = f"=ROUND({'-'.join(termos)},2)"
+    return out
+
+@instrumentar("build_xlsx_bp", lambda res, tabs, out_path, *a, **k: {
+    "tabelas": len(tabs), "formulas": res, "bytes": tamanho(out_path),
+})
+def build_xlsx_bp(
+    tabs: Dict[str, pd.DataFrame],
+    out_path: Path,
+    sensibilidade: Optional[pd.DataFrame] = None,
+    formulas: bool = True,
+    assum: Optional[Dict[str, float]] = None,
+) -> int:
+    """Tabelas financeiras num XLSX, uma folha por tabela, escrito em streaming.
+
+    Com `formulas`, os totais da DR e o Resultado ficam como fórmulas (com o valor
+    calculado guardado, para quem lê sem recalcular). Com `assum` (os pressupostos do
+    cálculo), acrescenta a folha PRESSUPOSTOS e as vendas dos anos seguintes, o COGS e
+    os FSE passam também a fórmulas sobre ela. Devolve quantas fórmulas há.
+    """
+    from autofill_xlsx import LivroXlsx, titulo_folha
+
+    usados: set = set()
+    titulos = {nome: titulo_folha(nome.upper(), usados) for nome in tabs}
+    por_tabela: Dict[str, Dict[Tuple[int, int], str]] = {}
+    pressupostos = titulo_p = None
+    if formulas:
+        por_tabela["dr"] = _formulas_dr(tabs, titulos)
+        if assum is not None:
+            pressupostos, titulo_p = _pressupostos(assum), titulo_folha("PRESSUPOSTOS", usados)
+            por_tabela.update(_formulas_pressupostos(tabs, titulos, pressupostos, titulo_p))
+    with LivroXlsx(out_path) as livro:
+        for nome, df in tabs.items():
+            livro.folha(titulos[nome], df if df is not None else pd.DataFrame(), por_tabela.get(nome))
+        if pressupostos is not None:
+            livro.folha(titulo_p, pressupostos)
+        if sensibilidade is not None:
+            livro.folha(titulo_folha("SENSIBILIDADE", usados), sensibilidade)
+    return sum(len(f) for f in por_tabela.values())
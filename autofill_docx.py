@@ -0,0 +1,89 @@
+import re
+import math
+from typing import Any, List
+
+import pandas as pd
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from xml.sax.saxutils import escape
+
+# =========================
+#  📄 TABELAS DOCX EM BLOCO
+# =========================
+# table.cell(i, j).text volta a resolver a grelha da tabela a cada chamada, e o custo
+# cresce mais do que linearmente com o número de linhas. Aqui o XML das linhas é montado
+# como texto, a partir de um modelo de célula por coluna, e lido de uma só vez.
+SEP_MILHARES = "."
+SEP_DECIMAL = ","
+_INVALIDOS_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def formatar_valor(v: Any) -> str:
+    """Texto de uma célula: reais com separador de milhares e 2 decimais (1.234,50),
+    inteiros tal como estão (anos, quantidades), vazios/NaN em branco."""
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return str(v)
+    if isinstance(v, float):
+        if math.isnan(v):
+            return ""
+        if math.isinf(v):
+            return str(v)
+        txt = f"{v:,.2f}"
+        if txt == "-0.00":
+            txt = "0.00"
+        return txt.replace(",", "\0").replace(".", SEP_DECIMAL).replace("\0", SEP_MILHARES)
+    if isinstance(v, int):
+        return str(v)
+    try:
+        if pd.isna(v):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return str(v)
+
+def _runs(texto: str) -> str:
+    """Conteúdo de um <w:p>: como run.text do python-docx (\\n → w:br, \\t → w:tab)."""
+    if not texto:
+        return ""
+    texto = _INVALIDOS_XML.sub("", texto)
+    partes = []
+    for i, linha in enumerate(texto.split("\n")):
+        if i:
+            partes.append("<w:br/>")
+        for k, bocado in enumerate(linha.split("\t")):
+            if k:
+                partes.append("<w:tab/>")
+            if bocado:
+                partes.append(f'<w:t xml:space="preserve">{escape(bocado)}</w:t>')
+    return f"<w:r>{''.join(partes)}</w:r>"
+
+def escrever_tabela(doc, df: pd.DataFrame, estilo: str = "Table Grid", formatar: bool = True):
+    """Acrescenta `df` ao documento como tabela (cabeçalho + linhas) e devolve-a.
+
+    Com `formatar`, os valores passam por formatar_valor e os números ficam alinhados
+    à direita; sem `formatar`, cada célula leva str(valor), como antes.
+    """
+    n_cols = df.shape[1]
+    table = doc.add_table(rows=0, cols=n_cols)
+    if estilo:
+        table.style = estilo
+    larguras = [g.get(f"{{{table._tbl.nsmap['w']}}}w") for g in table._tbl.tblGrid.iterchildren()]
+    abre = [f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{w}"/></w:tcPr>' for w in larguras]
+    direita = "<w:pPr><w:jc w:val=\"right\"/></w:pPr>"
+
+    def linha(textos: List[str], numeros: List[bool]) -> str:
+        return "<w:tr>" + "".join(
+            f"{abre[j]}<w:p>{direita if numeros[j] else ''}{_runs(t)}</w:p></w:tc>"
+            for j, t in enumerate(textos)
+        ) + "</w:tr>"
+
+    colunas = [df.iloc[:, j].tolist() for j in range(n_cols)]
+    fmt = formatar_valor if formatar else str
+    linhas = [linha([str(c) for c in df.columns], [False] * n_cols)]
+    for valores in zip(*colunas):
+        numeros = [formatar and isinstance(v, (int, float)) and not isinstance(v, bool) for v in valores]
+        linhas.append(linha([fmt(v) for v in valores], numeros))
+    for tr in parse_xml(f"<w:tbl {nsdecls('w')}>{''.join(linhas)}</w:tbl>"):
+        table._tbl.append(tr)
+    return table
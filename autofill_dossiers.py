@@ -0,0 +1,187 @@
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+# =========================
+#  💾 DOSSIERS GUARDADOS (SQLite + blobs)
+# =========================
+# O estado de um dossier (campos da Parte 1 e 2, fonte de dados de cada campo e documentos)
+# fica numa base SQLite; cada alteração grava só os campos que mudaram. Os ficheiros
+# carregados vão para uma pasta de blobs com o nome = sha256 do conteúdo (o mesmo PDF em
+# dez dossiers ocupa o disco uma vez) e o texto extraído fica ao lado, na linha do blob,
+# para que reabrir um dossier não volte a ler PDFs nem a pedir nada à IA.
+DOSSIERS_PATH = os.getenv("CBIZ_DOSSIERS", os.path.join(".cbiz_cache", "dossiers.sqlite"))
+BLOBS_DIR = os.getenv("CBIZ_BLOBS", os.path.join(".cbiz_cache", "blobs"))
+
+class Anexo:
+    """Documento de um dossier guardado. Imita o UploadedFile do Streamlit (name, size,
+    file_id, getvalue), por isso entra no build_context como um upload qualquer."""
+    __slots__ = ("name", "size", "file_id", "caminho")
+
+    def __init__(self, name: str, digest: str, size: int, caminho: str):
+        self.name = name
+        self.file_id = digest
+        self.size = size
+        self.caminho = caminho
+
+    def getvalue(self) -> bytes:
+        with open(self.caminho, "rb") as f:
+            return f.read()
+
+class DossierStore:
+    """Dossiers persistentes: campos por (dossier, chave) e anexos por conteúdo."""
+
+    def __init__(self, path: str = DOSSIERS_PATH, blobs: str = BLOBS_DIR):
+        self.path = path
+        self.blobs = blobs
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # com WAL, uma queda perde no máximo a última gravação
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS dossiers (id TEXT PRIMARY KEY, nome TEXT, criado REAL, alterado REAL);"
+                "CREATE TABLE IF NOT EXISTS campos ("
+                " dossier TEXT, chave TEXT, valor TEXT, PRIMARY KEY (dossier, chave)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS anexos ("
+                " dossier TEXT, digest TEXT, nome TEXT, ordem INTEGER, PRIMARY KEY (dossier, digest)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, bytes INTEGER, extrator TEXT, texto TEXT);"
+                "CREATE INDEX IF NOT EXISTS idx_dossiers_alterado ON dossiers(alterado);"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _caminho_blob(self, digest: str) -> str:
+        return os.path.join(self.blobs, digest[:2], digest)
+
+    @staticmethod
+    def _escrever_tmp(caminho: str, conteudo: bytes) -> str:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = f"{caminho}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(conteudo)
+        return tmp
+
+    @staticmethod
+    def novo_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def _tocar(self, db: sqlite3.Connection, dossier: str, nome: Optional[str]) -> None:
+        agora = time.time()
+        db.execute(
+            "INSERT INTO dossiers VALUES (?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET"
+            " alterado = excluded.alterado, nome = COALESCE(excluded.nome, dossiers.nome)",
+            (dossier, nome, agora, agora),
+        )
+
+    def guardar_campos(self, dossier: str, valores: Dict[str, str], nome: Optional[str] = None) -> int:
+        """Grava (upsert) só os campos dados; devolve quantos foram escritos."""
+        if not valores:
+            return 0
+        with self._lock:
+            db = self._db()
+            with db:
+                self._tocar(db, dossier, nome)
+                db.executemany(
+                    "INSERT OR REPLACE INTO campos VALUES (?, ?, ?)",
+                    [(dossier, k, v) for k, v in valores.items()],
+                )
+        return len(valores)
+
+    def guardar_anexo(self, dossier: str, nome: str, conteudo: bytes, texto: Optional[str] = None, extrator: str = "") -> str:
+        """Guarda o ficheiro (se o conteúdo ainda não existir) e liga-o ao dossier; devolve o sha256."""
+        digest = hashlib.sha256(conteudo).hexdigest()
+        caminho = self._caminho_blob(digest)
+        # A escrita (lenta) fica fora do lock; o ficheiro só ganha o nome final dentro dele,
+        # na mesma secção que insere as linhas: um remover_anexo de outra sessão não pode
+        # apagar o blob entre "já existe" e a ligação ao dossier.
+        tmp = None if os.path.exists(caminho) else self._escrever_tmp(caminho, conteudo)
+        with self._lock:
+            try:
+                if not os.path.exists(caminho):
+                    tmp = tmp or self._escrever_tmp(caminho, conteudo)
+                    os.replace(tmp, caminho)  # atómico: nunca fica um blob a meio com o nome final
+                    tmp = None
+            finally:
+                if tmp:
+                    os.remove(tmp)
+            db = self._db()
+            with db:
+                self._tocar(db, dossier, None)
+                db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, NULL, NULL)", (digest, len(conteudo)))
+                if texto is not None:
+                    db.execute("UPDATE blobs SET extrator = ?, texto = ? WHERE digest = ?", (extrator, texto, digest))
+                ordem = db.execute("SELECT COALESCE(MAX(ordem), -1) + 1 FROM anexos WHERE dossier = ?", (dossier,)).fetchone()[0]
+                db.execute("INSERT OR IGNORE INTO anexos VALUES (?, ?, ?, ?)", (dossier, digest, nome, ordem))
+        return digest
+
+    def remover_anexo(self, dossier: str, digest: str) -> None:
+        """Desliga o ficheiro do dossier; o blob fica enquanto outro dossier o usar."""
+        with self._lock:
+            db = self._db()
+            with db:
+                self._tocar(db, dossier, None)
+                db.execute("DELETE FROM anexos WHERE dossier = ? AND digest = ?", (dossier, digest))
+                if db.execute("SELECT 1 FROM anexos WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                    db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                    try:
+                        os.remove(self._caminho_blob(digest))
+                    except OSError:
+                        pass
+
+    def anexos(self, dossier: str) -> List[Anexo]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT a.nome, a.digest, b.bytes FROM anexos a JOIN blobs b USING (digest)"
+                " WHERE a.dossier = ? ORDER BY a.ordem",
+                (dossier,),
+            ).fetchall()
+        return [Anexo(nome, d, n, self._caminho_blob(d)) for nome, d, n in rows]
+
+    def abrir(self, dossier: str) -> Optional[Dict[str, Any]]:
+        """Campos, anexos e texto já extraído de cada anexo ({digest: (extrator, texto)})."""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT nome, alterado FROM dossiers WHERE id = ?", (dossier,)).fetchone()
+            if row is None:
+                return None
+            campos = dict(db.execute("SELECT chave, valor FROM campos WHERE dossier = ?", (dossier,)).fetchall())
+            textos = {
+                d: (ex, txt)
+                for d, ex, txt in db.execute(
+                    "SELECT b.digest, b.extrator, b.texto FROM anexos a JOIN blobs b USING (digest)"
+                    " WHERE a.dossier = ? AND b.texto IS NOT NULL",
+                    (dossier,),
+                )
+            }
+        return {
+            "id": dossier, "nome": row[0], "alterado": row[1],
+            "campos": campos, "anexos": self.anexos(dossier), "textos": textos,
+        }
+
+    def listar(self, n: int = 20) -> List[Dict[str, Any]]:
+        """Os `n` dossiers alterados mais recentemente."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, nome, alterado FROM dossiers ORDER BY alterado DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [{"id": i, "nome": nome, "alterado": alt} for i, nome, alt in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._db()
+            n = db.execute("SELECT COUNT(*) FROM dossiers").fetchone()[0]
+            blobs, b = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM blobs").fetchone()
+            ligacoes = db.execute("SELECT COUNT(*) FROM anexos").fetchone()[0]
+        return {"dossiers": n, "blobs": blobs, "bytes": b, "anexos": ligacoes}
+
+dossiers = DossierStore() if os.getenv("CBIZ_DOSSIERS", "") != "0" else None
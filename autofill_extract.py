@@ -0,0 +1,533 @@
+import os
+import io
+import csv
+import sys
+import hashlib
+import threading
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from autofill_trace import instrumentar
+
+# =========================
+#  🗃️ CACHE DE EXTRAÇÃO
+# =========================
+# Vive num módulo importado (e não no script Streamlit) para sobreviver aos reruns:
+# o script é re-executado a cada interação, os módulos importados não.
+# Subir a versão de um extrator invalida as entradas antigas desse formato.
+EXTRACTOR_VERSION: Dict[str, str] = {"pdf": "1", "docx": "1", "xlsx": "2"}
+CACHE_MAX_BYTES = int(float(os.getenv("CBIZ_EXTRACT_CACHE_MB", "64")) * 1024 * 1024)
+
+class ExtractionCache:
+    """LRU de texto extraído, chave = (formato, versão do extrator, variante, sha256 do ficheiro).
+
+    A variante distingue extrações parciais do mesmo ficheiro (ex.: intervalo de páginas).
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, str, str, str], str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(kind: str, file_bytes: Optional[bytes], variant: str = "", digest: str = "") -> Tuple[str, str, str, str]:
+        digest = digest or hashlib.sha256(file_bytes or b"").hexdigest()
+        return (kind, EXTRACTOR_VERSION.get(kind, "0"), variant, digest)
+
+    def peek(self, key: Tuple[str, str, str, str]) -> Optional[str]:
+        with self._lock:
+            txt = self._data.get(key)
+            if txt is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            return txt
+
+    def get_or_compute(self, kind: str, file_bytes: bytes, fn: Callable[[bytes], str], variant: str = "") -> str:
+        key = self.make_key(kind, file_bytes, variant)
+        with self._lock:
+            txt = self._data.get(key)
+            if txt is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return txt
+            self.misses += 1
+        # A extração corre fora do lock; exceções propagam e não ficam em cache.
+        txt = fn(file_bytes)
+        self.put(key, txt)
+        return txt
+
+    def note_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: Tuple[str, str, str, str], txt: str) -> None:
+        size = sys.getsizeof(txt)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= sys.getsizeof(old)
+            self._data[key] = txt
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, ev = self._data.popitem(last=False)
+                self._bytes -= sys.getsizeof(ev)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entradas": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+_cache = ExtractionCache()
+
+def extraction_cache_stats() -> Dict[str, int]:
+    return _cache.stats()
+
+def clear_extraction_cache() -> None:
+    _cache.clear()
+
+def versao_extrator(nome: str) -> str:
+    """"formato:versão" do extrator que lê `nome` ("" se não há extrator, ex.: TXT)."""
+    kind = _kind_of(nome)
+    return f"{kind}:{EXTRACTOR_VERSION.get(kind, '0')}" if kind else ""
+
+def semear_cache(nome: str, digest: str, texto: str) -> bool:
+    """Põe no cache o texto completo de um ficheiro extraído noutra altura (ex.: dossier
+    guardado), como se tivesse acabado de ser lido; devolve False se não há extrator."""
+    kind = _kind_of(nome)
+    if not kind:
+        return False
+    _cache.put(_cache.make_key(kind, None, digest=digest), texto)
+    return True
+
+# =========================
+#  📄 EXTRATORES
+# =========================
+def _ler_pdf(file_bytes: bytes, paginas: Optional[Tuple[int, int]] = None) -> str:
+    import pypdf
+    reader = pypdf.PdfReader(io.BytesIO(file_bytes))
+    idx = range(len(reader.pages)) if paginas is None else range(*paginas)
+    pages = []
+    for i in idx:
+        pages.append(reader.pages[i].extract_text() or "")
+    return "\n".join(pages)
+
+def _ler_docx(file_bytes: bytes) -> str:
+    import docx
+    doc = docx.Document(io.BytesIO(file_bytes))
+    return "\n".join([p.text for p in doc.paragraphs])
+
+# Folhas XLSX são lidas em streaming (openpyxl read-only): só ficam em memória as
+# primeiras linhas e os totais por coluna, seja qual for o tamanho do livro.
+XLSX_MAX_ROWS_PER_SHEET = int(os.getenv("CBIZ_XLSX_MAX_ROWS", "200"))
+XLSX_MAX_CHARS_PER_SHEET = int(os.getenv("CBIZ_XLSX_MAX_CHARS", "6000"))
+XLSX_SCAN_ROWS = int(os.getenv("CBIZ_XLSX_SCAN_ROWS", "100000"))
+XLSX_SAMPLE_ROWS = 5
+
+def _fmt_cell(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+def _csv_line(row) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, delimiter=";", lineterminator="\n").writerow([_fmt_cell(v) for v in row])
+    return buf.getvalue()
+
+def _is_num(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _ler_folha(ws, max_chars: int) -> Tuple[str, bool]:
+    """Devolve (texto, cortada); `cortada` é verdadeiro só se um `max_chars` abaixo de
+    XLSX_MAX_CHARS_PER_SHEET deu um texto diferente do que a folha daria sem orçamento."""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return "", False
+    n_cols = len(header)
+    linhas = [_csv_line(header)]
+    chars = len(linhas[0])
+    n_rows = 0
+    n_num = n_vals = 0
+    somas = [0.0] * n_cols
+    grande = cortada = False
+    for row in rows:
+        if all(v is None for v in row):
+            continue
+        n_rows += 1
+        for j, v in enumerate(row[:n_cols]):
+            if _is_num(v):
+                somas[j] += v
+                n_num += 1
+            if v is not None:
+                n_vals += 1
+        if grande:
+            if n_rows >= XLSX_SCAN_ROWS:
+                break
+            continue
+        linha = _csv_line(row)
+        if n_rows > XLSX_MAX_ROWS_PER_SHEET or chars + len(linha) > max_chars:
+            grande = True
+            # Com o limite normal esta linha ainda cabia: foi o orçamento que cortou.
+            cortada = n_rows <= XLSX_MAX_ROWS_PER_SHEET and chars + len(linha) <= XLSX_MAX_CHARS_PER_SHEET
+            # Folhas de texto param aqui; nas numéricas continua-se só a somar colunas.
+            if n_vals and n_num / n_vals < 0.5:
+                total = ws.max_row - 1 if ws.max_row else None
+                omitidas = f"{total - len(linhas) + 1}" if total else "restantes"
+                return "".join(linhas) + f"[… {omitidas} linhas omitidas]\n", cortada
+            continue
+        linhas.append(linha)
+        chars += len(linha)
+    if not grande:
+        return "".join(linhas), False
+
+    parcial = n_rows >= XLSX_SCAN_ROWS
+    total_linhas = (ws.max_row - 1) if (parcial and ws.max_row) else n_rows
+    colunas = [_fmt_cell(h) or f"col{j + 1}" for j, h in enumerate(header)]
+    totais = [f"{c}={round(sv, 2):,.2f}" for c, sv in zip(colunas, somas) if sv]
+    resumo = [
+        f"[Resumo] {total_linhas} linhas × {n_cols} colunas",
+        "Colunas: " + "; ".join(colunas),
+        ("Totais (primeiras {} linhas): ".format(n_rows) if parcial else "Totais: ") + "; ".join(totais),
+        f"Primeiras {XLSX_SAMPLE_ROWS} linhas:",
+    ]
+    return "\n".join(resumo) + "\n" + "".join(linhas[: XLSX_SAMPLE_ROWS + 1]), cortada
+
+def _ler_xlsx(file_bytes: bytes, budget: Optional[int] = None) -> Tuple[str, bool]:
+    """Devolve (texto, completo); `completo` é falso se o orçamento cortou linhas de alguma
+    folha ou deixou folhas por abrir (só um texto completo pode ir para o cache)."""
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        parts = []
+        usados = 0
+        completo = True
+        for ws in wb.worksheets:
+            max_chars = XLSX_MAX_CHARS_PER_SHEET
+            if budget is not None:
+                if usados >= budget:
+                    return "\n".join(parts), False
+                max_chars = min(max_chars, budget - usados)
+            parts.append(f"\n### Folha: {ws.title}\n")
+            txt, cortada = _ler_folha(ws, max_chars)
+            parts.append(txt)
+            completo = completo and not cortada
+            usados += len(parts[-2]) + len(parts[-1]) + 2
+        return "\n".join(parts), completo
+    finally:
+        wb.close()
+
+def iter_pdf_pages(file_bytes: bytes, report: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Gera o texto página a página, sem abrir o PDF enquanto as páginas vierem do cache.
+
+    Cada página fica em cache isoladamente, por isso um pedido com orçamento maior
+    retoma a partir da primeira página ainda não lida.
+    """
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    rep = report if report is not None else {}
+    n_key = _cache.make_key("pdf", None, "n_paginas", digest)
+    n = _cache.peek(n_key)
+    if n is not None:
+        rep["paginas_total"] = rep.get("paginas_total", 0) + int(n)
+    reader = None
+    i = 0
+    while n is None or i < int(n):
+        key = _cache.make_key("pdf", None, f"p{i}", digest)
+        txt = _cache.peek(key)
+        if txt is None:
+            if reader is None:
+                import pypdf
+                reader = pypdf.PdfReader(io.BytesIO(file_bytes))
+                if n is None:
+                    n = str(len(reader.pages))
+                    _cache.put(n_key, n)
+                    rep["paginas_total"] = rep.get("paginas_total", 0) + int(n)
+                    if i >= int(n):
+                        break
+            txt = reader.pages[i].extract_text() or ""
+            _cache.put(key, txt)
+            rep["paginas_lidas"] = rep.get("paginas_lidas", 0) + 1
+        else:
+            rep["paginas_cache"] = rep.get("paginas_cache", 0) + 1
+        yield txt
+        i += 1
+
+def extract_text_from_pdf(
+    file_bytes: bytes,
+    paginas: Optional[Tuple[int, int]] = None,
+    budget: Optional[int] = None,
+    report: Optional[Dict[str, Any]] = None,
+) -> str:
+    """`paginas` = (início, fim) extrai só esse intervalo [início, fim).
+
+    Com `budget` (caracteres) as páginas são lidas de forma preguiçosa e a leitura
+    pára assim que o orçamento fica coberto; `report` acumula páginas lidas,
+    vindas do cache e ignoradas.
+    """
+    try:
+        if budget is not None and paginas is None:
+            full = _cache.peek(_cache.make_key("pdf", file_bytes))
+            if full is not None:
+                return full
+            rep = report if report is not None else {}
+            lidas_antes = rep.get("paginas_lidas", 0)
+            antes = lidas_antes + rep.get("paginas_cache", 0)
+            total_antes = rep.get("paginas_total", 0)
+            partes, usados = [], 0
+            for txt in iter_pdf_pages(file_bytes, rep):
+                partes.append(txt)
+                usados += len(txt) + 1
+                if usados >= budget:
+                    break
+            consumidas = rep.get("paginas_lidas", 0) + rep.get("paginas_cache", 0) - antes
+            total = rep.get("paginas_total", 0) - total_antes
+            ignoradas = max(0, total - consumidas)
+            rep["paginas_ignoradas"] = rep.get("paginas_ignoradas", 0) + ignoradas
+            _registar_paginas(rep.get("paginas_lidas", 0) - lidas_antes, ignoradas)
+            return "\n".join(partes)
+        if paginas is None:
+            return _cache.get_or_compute("pdf", file_bytes, _ler_pdf)
+        return _cache.get_or_compute(
+            "pdf", file_bytes, lambda b: _ler_pdf(b, paginas), variant=f"{paginas[0]}:{paginas[1]}"
+        )
+    except Exception as e:
+        return f"[ERRO a ler PDF: {e}]"
+
+def extract_text_from_docx(file_bytes: bytes) -> str:
+    try:
+        return _cache.get_or_compute("docx", file_bytes, _ler_docx)
+    except Exception as e:
+        return f"[ERRO a ler DOCX: {e}]"
+
+def extract_text_from_xlsx(file_bytes: bytes, budget: Optional[int] = None) -> str:
+    """Com `budget` (caracteres) as folhas seguintes deixam de ser abertas quando se esgota."""
+    try:
+        if budget is None:
+            return _cache.get_or_compute("xlsx", file_bytes, lambda b: _ler_xlsx(b)[0])
+        key = _cache.make_key("xlsx", file_bytes)
+        full = _cache.peek(key)
+        if full is not None:
+            return full
+        txt, completo = _ler_xlsx(file_bytes, budget)
+        if completo:
+            _cache.put(key, txt)
+        return txt
+    except Exception as e:
+        return f"[ERRO a ler XLSX: {e}]"
+
+# =========================
+#  ⚡ EXTRAÇÃO PARALELA
+# =========================
+# Ficheiros (e PDFs grandes, por intervalos de páginas) são distribuídos por um pool de
+# processos; os extract_text_from_* acima são as unidades de trabalho de cada worker.
+# Abaixo de PARALLEL_MIN_BYTES o arranque do pool não compensa e tudo corre em série.
+MAX_WORKERS = int(os.getenv("CBIZ_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+WORKER_MEM_MB = int(os.getenv("CBIZ_EXTRACT_WORKER_MB", "1024"))
+WORKER_MAX_TASKS = 50
+PDF_PAGES_PER_CHUNK = int(os.getenv("CBIZ_PDF_PAGES_PER_CHUNK", "25"))
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+_EXTRATORES: Dict[str, Callable[..., str]] = {
+    "pdf": extract_text_from_pdf,
+    "docx": extract_text_from_docx,
+    "xlsx": extract_text_from_xlsx,
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _init_worker(mem_mb: int) -> None:
+    # Cada worker só extrai; o cache útil é o do processo principal.
+    _cache.max_bytes = 0
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+    try:
+        import resource
+        lim = mem_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (lim, lim))
+    except Exception:
+        pass  # Windows / limite já mais baixo: segue sem teto de memória
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            kwargs = {"max_tasks_per_child": WORKER_MAX_TASKS} if sys.version_info >= (3, 11) else {}
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(WORKER_MEM_MB,),
+                **kwargs,
+            )
+        return _pool
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _run_unit(kind: str, file_bytes: bytes, paginas: Optional[Tuple[int, int]] = None) -> str:
+    if paginas is not None:
+        return _EXTRATORES[kind](file_bytes, paginas)
+    return _EXTRATORES[kind](file_bytes)
+
+def _kind_of(name: str) -> str:
+    name = name.lower()
+    for ext in _EXTRATORES:
+        if name.endswith("." + ext):
+            return ext
+    return ""
+
+def _pdf_page_count(file_bytes: bytes) -> int:
+    try:
+        import pypdf
+        return len(pypdf.PdfReader(io.BytesIO(file_bytes)).pages)
+    except Exception:
+        return 0
+
+@instrumentar("extract_texts", lambda res, items: {
+    "ficheiros": len(items), "bytes": sum(len(b) for _, b in items), "letras": sum(map(len, res)),
+})
+def extract_texts(items: List[Tuple[str, bytes]]) -> List[str]:
+    """Extrai o texto de [(nome, bytes), ...] mantendo a ordem de entrada."""
+    out: List[Optional[str]] = [None] * len(items)
+    pendentes = []  # (índice, formato, bytes, chave de cache)
+    for i, (name, content) in enumerate(items):
+        kind = _kind_of(name)
+        if not kind:
+            try:
+                out[i] = content.decode("utf-8", errors="ignore")
+            except Exception:
+                out[i] = "[Formato não suportado]"
+            continue
+        key = _cache.make_key(kind, content)
+        txt = _cache.peek(key)
+        if txt is not None:
+            out[i] = txt
+        else:
+            pendentes.append((i, kind, content, key))
+
+    total = sum(len(p[2]) for p in pendentes)
+    if MAX_WORKERS <= 1 or total < PARALLEL_MIN_BYTES:
+        for i, kind, content, _ in pendentes:
+            out[i] = _run_unit(kind, content)
+        return [t or "" for t in out]
+
+    # Unidades de trabalho: ficheiro inteiro ou intervalo de páginas de um PDF grande.
+    unidades: Dict[int, List[Optional[Tuple[int, int]]]] = {}
+    for i, kind, content, _ in pendentes:
+        n = _pdf_page_count(content) if kind == "pdf" else 0
+        if n > PDF_PAGES_PER_CHUNK:
+            unidades[i] = [(a, min(a + PDF_PAGES_PER_CHUNK, n)) for a in range(0, n, PDF_PAGES_PER_CHUNK)]
+        else:
+            unidades[i] = [None]
+
+    pool = _get_pool()
+    futures = {
+        i: [pool.submit(_run_unit, kind, content, pg) for pg in unidades[i]]
+        for i, kind, content, _ in pendentes
+    }
+    partidos = False
+    for i, kind, content, key in pendentes:
+        partes = []
+        for fut in futures[i]:
+            try:
+                partes.append(fut.result())
+            except BrokenProcessPool as e:
+                partidos = True
+                partes.append(f"[ERRO a ler {kind.upper()}: worker terminado ({e})]")
+            except Exception as e:
+                partes.append(f"[ERRO a ler {kind.upper()}: {e}]")
+        txt = "\n".join(partes)
+        # Os extratores devolvem o erro como texto; esses resultados não vão para o cache.
+        _cache.note_miss()
+        if not any(p.startswith("[ERRO a ler") for p in partes):
+            _cache.put(key, txt)
+        out[i] = txt
+    if partidos:
+        shutdown_extraction_pool()
+    return [t or "" for t in out]
+
+# =========================
+#  🎯 EXTRAÇÃO COM ORÇAMENTO
+# =========================
+# O build_context corta tudo em LIMITE_CONTEXTO caracteres; com um orçamento, cada
+# ficheiro só é lido até cobrir o que falta e os seguintes nem chegam a ser abertos.
+_paginas_stats = {"paginas_lidas": 0, "paginas_ignoradas": 0}
+_paginas_lock = threading.Lock()
+
+def _registar_paginas(lidas: int, ignoradas: int) -> None:
+    with _paginas_lock:
+        _paginas_stats["paginas_lidas"] += lidas
+        _paginas_stats["paginas_ignoradas"] += ignoradas
+
+def pdf_page_stats() -> Dict[str, int]:
+    with _paginas_lock:
+        return dict(_paginas_stats)
+
+def _extract_one(name: str, content: bytes, budget: int, report: Dict[str, Any]) -> str:
+    kind = _kind_of(name)
+    if kind == "pdf":
+        return extract_text_from_pdf(content, budget=budget, report=report)
+    if kind == "xlsx":
+        return extract_text_from_xlsx(content, budget=budget)
+    if kind:
+        return _EXTRATORES[kind](content)
+    try:
+        return content.decode("utf-8", errors="ignore")
+    except Exception:
+        return "[Formato não suportado]"
+
+def _file_bytes(uf) -> bytes:
+    # UploadedFile é um BytesIO: read() esgota-o e o clique seguinte leria b"".
+    if hasattr(uf, "getvalue"):
+        return uf.getvalue()
+    return uf.read()
+
+@instrumentar("extract_text_from_upload", lambda res, files, *a, **k: {
+    "ficheiros": len(files or []), "bytes": sum(getattr(uf, "size", 0) or 0 for uf in files or []), "letras": len(res),
+})
+def extract_text_from_upload(files, budget: Optional[int] = None, report: Optional[Dict[str, Any]] = None) -> str:
+    """Sem `budget` extrai tudo (em paralelo); com `budget` lê em série e pára cedo."""
+    files = list(files or [])
+    if budget is None:
+        textos = extract_texts([(uf.name, _file_bytes(uf)) for uf in files])
+        texts = [f"\n---\nFicheiro: {uf.name}\n{txt}" for uf, txt in zip(files, textos)]
+        return "\n".join(texts).strip()
+
+    rep = report if report is not None else {}
+    texts, restante = [], budget
+    for uf in files:
+        if restante <= 0:
+            rep["ficheiros_ignorados"] = rep.get("ficheiros_ignorados", 0) + 1
+            continue
+        cab = f"\n---\nFicheiro: {uf.name}\n"
+        restante -= len(cab)
+        txt = _extract_one(uf.name, _file_bytes(uf), max(restante, 0), rep)
+        restante -= len(txt) + 1
+        texts.append(cab + txt)
+    return "\n".join(texts).strip()
@@ -0,0 +1,723 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import contextvars
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from autofill_trace import anotar
+
+# =========================
+#  🔌 CLIENTE PARTILHADO (pool HTTP + retries)
+# =========================
+# Um único OpenAI(...) por chave de API para todo o processo: as ligações HTTP ficam
+# vivas entre pedidos (keep-alive) em vez de pagar TLS a cada geração. Os retries do
+# SDK ficam desligados; os nossos usam backoff exponencial com jitter e respeitam Retry-After.
+LLM_CONNECT_TIMEOUT = float(os.getenv("CBIZ_LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("CBIZ_LLM_READ_TIMEOUT", "90"))
+LLM_MAX_RETRIES = int(os.getenv("CBIZ_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("CBIZ_LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("CBIZ_LLM_BACKOFF_MAX", "30"))
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+_retry_stats = {"pedidos": 0, "retries": 0, "falhas": 0}
+
+def get_openai_client(api_key: Optional[str] = None):
+    """Cliente OpenAI partilhado (um por chave), com timeouts de ligação/leitura configuráveis."""
+    key = api_key or os.getenv("OPENAI_API_KEY", "")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI, DefaultHttpxClient, Timeout
+            timeout = Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            client = OpenAI(
+                api_key=key or None,
+                timeout=timeout,
+                max_retries=0,
+                http_client=DefaultHttpxClient(timeout=timeout),
+            )
+            _clients[key] = client
+        return client
+
+def _status_code(e: Exception) -> Optional[int]:
+    code = getattr(e, "status_code", None)
+    if code is None and getattr(e, "response", None) is not None:
+        code = getattr(e.response, "status_code", None)
+    return code
+
+def _is_retryable(e: Exception) -> bool:
+    try:
+        import openai
+        if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+    except ImportError:
+        pass
+    code = _status_code(e)
+    return code in (408, 409, 429) or (code is not None and code >= 500)
+
+def _retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # Retry-After em formato data HTTP: usa o backoff normal
+    return None
+
+def backoff_delay(tentativa: int, retry_after: Optional[float] = None) -> float:
+    """Full jitter sobre base·2^n (limitado a LLM_BACKOFF_MAX); nunca menos que Retry-After.
+
+    O Retry-After não é cortado pelo limite: repetir antes do que o servidor pede é só
+    gastar uma tentativa noutro 429 (o with_retry desiste logo se ele passar o limite).
+    """
+    atraso = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** tentativa)))
+    if retry_after is not None:
+        atraso = max(retry_after, atraso)
+    return atraso
+
+def with_retry(fn: Callable[[], Any], max_retries: int = LLM_MAX_RETRIES) -> Any:
+    """Chama `fn`, repetindo só erros transitórios (429, 408/409, 5xx, timeouts, ligação).
+
+    Um Retry-After acima de LLM_BACKOFF_MAX falha já em vez de bloquear o pedido.
+    """
+    with _clients_lock:
+        _retry_stats["pedidos"] += 1
+    tentativa = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            espera = _retry_after(e)
+            if tentativa >= max_retries or not _is_retryable(e) or (espera or 0) > LLM_BACKOFF_MAX:
+                with _clients_lock:
+                    _retry_stats["falhas"] += 1
+                raise
+            with _clients_lock:
+                _retry_stats["retries"] += 1
+            time.sleep(backoff_delay(tentativa, espera))
+            tentativa += 1
+
+def chat_texto(client, model: str, messages: List[Dict[str, Any]], temperature: float) -> str:
+    resp = with_retry(lambda: client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+    ))
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        anotar(tokens_prompt=usage.prompt_tokens, tokens_resposta=usage.completion_tokens)
+    return (resp.choices[0].message.content or "").strip()
+
+def llm_client_stats() -> Dict[str, int]:
+    with _clients_lock:
+        return {**_retry_stats, "clientes": len(_clients)}
+
+# =========================
+#  🚦 ESCALONADOR (todas as sessões)
+# =========================
+# As sessões do servidor partilham a mesma organização na API. Tudo o que não vem do cache
+# passa por aqui: no máximo LLM_MAX_CONCORRENCIA pedidos em voo e, com LLM_TPM > 0, não mais
+# do que esses tokens por minuto (estimados à partida). Quem espera é servido por prioridade
+# (cliques antes de lotes) e, na mesma prioridade, à vez por sessão, para um "Gerar tudo"
+# não passar à frente de toda a gente. Pedidos idênticos em voo são fundidos: só o primeiro
+# vai à API e os outros recebem o mesmo texto (em streaming, os mesmos pedaços).
+LLM_MAX_CONCORRENCIA = int(os.getenv("CBIZ_LLM_MAX_CONCORRENCIA", "8"))
+LLM_TPM = int(os.getenv("CBIZ_LLM_TPM", "0"))
+LLM_TOKENS_RESPOSTA = int(os.getenv("CBIZ_LLM_TOKENS_RESPOSTA", "600"))
+INTERATIVO, LOTE = 0, 1
+
+_origem: contextvars.ContextVar = contextvars.ContextVar("cbiz_origem", default=("—", INTERATIVO))
+
+@contextmanager
+def origem_pedido(sessao: Optional[str] = None, prioridade: Optional[int] = None):
+    """Sessão e prioridade dos pedidos feitos dentro do bloco (o que não for dado mantém-se)."""
+    atual = _origem.get()
+    token = _origem.set((atual[0] if sessao is None else sessao, atual[1] if prioridade is None else prioridade))
+    try:
+        yield
+    finally:
+        _origem.reset(token)
+
+def estimar_tokens(messages: List[Dict[str, Any]]) -> int:
+    """~4 letras por token no prompt, mais uma resposta típica."""
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + LLM_TOKENS_RESPOSTA
+
+class _Vez:
+    __slots__ = ("sessao", "prioridade", "tokens", "autorizada")
+
+    def __init__(self, sessao: str, prioridade: int, tokens: int):
+        self.sessao, self.prioridade, self.tokens, self.autorizada = sessao, prioridade, tokens, False
+
+class _EmVoo:
+    """Pedido a decorrer, partilhado por quem pediu o mesmo: pedaços já recebidos e desfecho."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.partes: List[str] = []
+        self.uso: Dict[str, Any] = {}
+        self.leitores = 0
+        self.fim = False
+        self.completo = False
+        self.erro: Optional[BaseException] = None
+
+    def publicar(self, pedaco: str) -> None:
+        with self.cond:
+            self.partes.append(pedaco)
+            self.cond.notify_all()
+
+    def terminar(self, completo: bool = False, erro: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.fim, self.completo, self.erro = True, completo, erro
+            self.cond.notify_all()
+
+class Escalonador:
+    def __init__(self, max_concorrencia: int = LLM_MAX_CONCORRENCIA, tpm: int = LLM_TPM):
+        self.max_concorrencia = max(1, int(max_concorrencia))
+        self.tpm = max(0, int(tpm))
+        self._cond = threading.Condition()
+        self._filas: Dict[int, "OrderedDict[str, deque]"] = {}
+        self._ativos = 0
+        self._janela: deque = deque()          # (instante, tokens) autorizados no último minuto
+        self._em_voo: Dict[str, _EmVoo] = {}
+        self._esperas: deque = deque(maxlen=500)
+        self._contagem: Counter = Counter()
+
+    # --- vez: concorrência, tokens por minuto e justiça entre sessões
+    def _tokens_minuto(self, agora: float) -> int:
+        while self._janela and agora - self._janela[0][0] >= 60:
+            self._janela.popleft()
+        return sum(n for _, n in self._janela)
+
+    def _despachar(self) -> Optional[float]:
+        """Autoriza quem couber. Devolve quantos segundos faltam para a janela de tokens
+        libertar espaço, se é isso que está a travar a fila."""
+        agora = time.monotonic()
+        autorizou = False
+        try:
+            while self._ativos < self.max_concorrencia:
+                prioridade = min((p for p, f in self._filas.items() if f), default=None)
+                if prioridade is None:
+                    return None
+                fila = self._filas[prioridade]
+                sessao, vezes = next(iter(fila.items()))
+                vez = vezes[0]
+                if self.tpm:
+                    usados = self._tokens_minuto(agora)
+                    # Um pedido maior do que o orçamento inteiro passa com a janela vazia.
+                    if usados and usados + vez.tokens > self.tpm:
+                        return max(0.01, 60 - (agora - self._janela[0][0]))
+                    self._janela.append((agora, vez.tokens))
+                vezes.popleft()
+                if vezes:
+                    fila.move_to_end(sessao)   # a sessão seguinte é a próxima a ser servida
+                else:
+                    del fila[sessao]
+                vez.autorizada = True
+                self._ativos += 1
+                autorizou = True
+            return None
+        finally:
+            if autorizou:
+                self._cond.notify_all()
+
+    def _retirar(self, vez: _Vez) -> None:
+        fila = self._filas.get(vez.prioridade, {})
+        vezes = fila.get(vez.sessao)
+        if vezes is not None and vez in vezes:
+            vezes.remove(vez)
+            if not vezes:
+                del fila[vez.sessao]
+
+    @contextmanager
+    def vez(self, tokens: int = 0):
+        """Espera pela vez deste pedido e ocupa uma das vagas até sair do bloco."""
+        sessao, prioridade = _origem.get()
+        vez = _Vez(sessao, prioridade, tokens)
+        t0 = time.perf_counter()
+        with self._cond:
+            self._filas.setdefault(prioridade, OrderedDict()).setdefault(sessao, deque()).append(vez)
+            try:
+                while not vez.autorizada:
+                    espera = self._despachar()
+                    if not vez.autorizada:
+                        self._cond.wait(espera)
+            except BaseException:
+                if vez.autorizada:
+                    self._ativos -= 1
+                    self._despachar()
+                else:
+                    self._retirar(vez)
+                raise
+            self._contagem["pedidos"] += 1
+        espera_s = time.perf_counter() - t0
+        self._esperas.append(espera_s)
+        anotar(espera_fila_ms=round(espera_s * 1e3, 1))
+        try:
+            yield espera_s
+        finally:
+            with self._cond:
+                self._ativos -= 1
+                self._despachar()
+
+    # --- fusão de pedidos idênticos em voo
+    def _juntar(self, chave: str):
+        with self._cond:
+            voo = self._em_voo.get(chave)
+            if voo is not None:
+                with voo.cond:
+                    # Abandonado (já ninguém lê e o _bombear vai parar) ou acabado sem texto
+                    # completo: quem chega agora abre um pedido novo em vez de herdar o corte.
+                    if voo.leitores and not (voo.fim and not voo.completo):
+                        voo.leitores += 1
+                        self._contagem["fundidos"] += 1
+                        anotar(fundido=True)
+                        return voo, False
+            voo = self._em_voo[chave] = _EmVoo()
+            voo.leitores = 1
+        return voo, True
+
+    def _largar(self, chave: str, voo: _EmVoo) -> None:
+        with self._cond:
+            if self._em_voo.get(chave) is voo:
+                del self._em_voo[chave]
+
+    def executar(self, chave: Optional[str], fn: Callable[[], str], tokens: int = 0) -> str:
+        """`fn()` na sua vez; com `chave`, quem pedir o mesmo entretanto recebe este resultado."""
+        if chave is None:
+            with self.vez(tokens):
+                return fn()
+        voo, lider = self._juntar(chave)
+        if not lider:
+            with voo.cond:
+                voo.cond.wait_for(lambda: voo.fim)
+            if voo.erro is not None:
+                raise voo.erro
+            return "".join(voo.partes)
+        try:
+            with self.vez(tokens):
+                txt = fn()
+            voo.publicar(txt)
+            voo.terminar(completo=True)
+            return txt
+        except BaseException as e:
+            voo.terminar(erro=e)
+            raise
+        finally:
+            self._largar(chave, voo)
+
+    def stream(
+        self,
+        chave: str,
+        abrir: Callable[[_EmVoo], Iterator[str]],
+        tokens: int = 0,
+        cancel: Optional[threading.Event] = None,
+        uso: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """Pedaços de `abrir(voo)`, lidos por uma thread própria e partilhados por todos os que
+        pedirem a mesma `chave` enquanto decorre. Cada leitor pode desistir (cancel/close)
+        sem cortar os outros; a ligação só fecha quando já ninguém lê. No fim, `uso`
+        recebe os tokens contados pela API ({"prompt", "resposta"})."""
+        voo, lider = self._juntar(chave)
+        if lider:
+            ctx = contextvars.copy_context()   # origem (sessão/prioridade) e span de quem pediu
+            threading.Thread(target=ctx.run, args=(self._bombear, chave, voo, abrir, tokens), daemon=True,
+                             name="cbiz-ia-stream").start()
+        i = 0
+        try:
+            while True:
+                with voo.cond:
+                    while len(voo.partes) <= i and not voo.fim:
+                        if cancel is not None and cancel.is_set():
+                            return
+                        voo.cond.wait(0.1 if cancel is not None else None)
+                    novos, fim = voo.partes[i:], voo.fim
+                for p in novos:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    i += 1
+                    yield p
+                if fim and i >= len(voo.partes):
+                    if voo.erro is not None:
+                        raise voo.erro
+                    if not voo.completo:   # salvaguarda: o _juntar já não entrega pedidos abandonados
+                        raise RuntimeError("pedido interrompido; tenta de novo")
+                    if uso is not None:
+                        uso.update(voo.uso)
+                    return
+        finally:
+            with voo.cond:
+                voo.leitores -= 1
+
+    def _bombear(self, chave: str, voo: _EmVoo, abrir, tokens: int) -> None:
+        try:
+            completo = False
+            with self.vez(tokens):
+                if voo.leitores:   # todos desistiram enquanto esperavam: nem se abre a ligação
+                    pedacos = abrir(voo)
+                    try:
+                        for p in pedacos:
+                            voo.publicar(p)
+                            if not voo.leitores:
+                                break
+                        else:
+                            completo = True
+                    finally:
+                        pedacos.close()
+            voo.terminar(completo=completo)
+        except BaseException as e:
+            voo.terminar(erro=e)
+        finally:
+            self._largar(chave, voo)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            em_fila = {p: sum(len(v) for v in f.values()) for p, f in self._filas.items()}
+            tpm = self._tokens_minuto(time.monotonic()) if self.tpm else None
+            ativos, em_voo = self._ativos, len(self._em_voo)
+        esperas = sorted(self._esperas)
+        return {
+            "ativos": ativos,
+            "max_concorrencia": self.max_concorrencia,
+            "em_fila": sum(em_fila.values()),
+            "em_fila_interativos": em_fila.get(INTERATIVO, 0),
+            "em_fila_lote": em_fila.get(LOTE, 0),
+            "em_voo": em_voo,
+            "tokens_minuto": tpm,
+            "tpm": self.tpm or None,
+            "espera_p50_ms": round(esperas[len(esperas) // 2] * 1e3, 1) if esperas else 0.0,
+            "espera_p95_ms": round(esperas[min(len(esperas) - 1, int(len(esperas) * 0.95))] * 1e3, 1) if esperas else 0.0,
+            "pedidos": self._contagem["pedidos"],
+            "fundidos": self._contagem["fundidos"],
+        }
+
+escalonador = Escalonador()
+
+def escalonador_stats() -> Dict[str, Any]:
+    return escalonador.stats()
+
+# =========================
+#  🗄️ CACHE DE RESPOSTAS (SQLite)
+# =========================
+# Chave = sha256 de (modelo, mensagens, temperatura). Só respostas bem-sucedidas entram;
+# `regenerar=True` ignora o cache na leitura mas guarda a resposta nova.
+LLM_CACHE_PATH = os.getenv("CBIZ_LLM_CACHE", os.path.join(".cbiz_cache", "llm_cache.sqlite"))
+LLM_CACHE_TTL_S = float(os.getenv("CBIZ_LLM_CACHE_TTL_H", str(24 * 7))) * 3600
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("CBIZ_LLM_CACHE_MB", "50")) * 1024 * 1024)
+
+def fingerprint(model: str, messages: List[Dict[str, Any]], temperature: float) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": round(float(temperature), 4)},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Cache persistente de respostas, com TTL e limite de tamanho (evicção por último uso)."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_s: float = LLM_CACHE_TTL_S, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_s = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS respostas ("
+                " chave TEXT PRIMARY KEY, modelo TEXT, resposta TEXT,"
+                " criado REAL, usado REAL, latencia REAL, bytes INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_usado ON respostas(usado)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, chave: str) -> Optional[str]:
+        t0 = time.perf_counter()
+        agora = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT resposta, criado, latencia FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if row is None or agora - row[1] > self.ttl_s:
+                if row is not None:
+                    db.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                    db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE respostas SET usado = ? WHERE chave = ?", (agora, chave))
+            db.commit()
+            self.hits += 1
+            self.saved_s += max(0.0, (row[2] or 0.0) - (time.perf_counter() - t0))
+            return row[0]
+
+    def put(self, chave: str, modelo: str, resposta: str, latencia: float) -> None:
+        agora = time.time()
+        n = len(resposta.encode("utf-8"))
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, modelo, resposta, agora, agora, latencia, n),
+            )
+            db.execute("DELETE FROM respostas WHERE criado < ?", (agora - self.ttl_s,))
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM respostas").fetchone()[0]
+            if total > self.max_bytes:
+                # Remove as menos usadas até voltar abaixo do limite.
+                for chave_ev, b in db.execute("SELECT chave, bytes FROM respostas ORDER BY usado").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM respostas WHERE chave = ?", (chave_ev,))
+                    total -= b
+            db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM respostas")
+            self._db().commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, b = self._db().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM respostas").fetchone()
+            pedidos = self.hits + self.misses
+            return {
+                "entradas": n,
+                "bytes": b,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / pedidos) if pedidos else 0.0,
+                "latencia_poupada_s": round(self.saved_s, 3),
+            }
+
+_llm_cache = LLMCache() if os.getenv("CBIZ_LLM_CACHE", "") != "0" else None
+
+def llm_cache_stats() -> Dict[str, Any]:
+    return _llm_cache.stats() if _llm_cache else {}
+
+def cached_completion(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    pedido: Callable[[], str],
+    regenerar: bool = False,
+) -> str:
+    """Devolve a resposta em cache para o mesmo (modelo, mensagens, temperatura) ou chama `pedido`
+    na vez dada pelo escalonador (fundido com um pedido igual que já esteja em voo).
+
+    `pedido` deve levantar exceção em caso de erro, para que erros nunca fiquem em cache.
+    """
+    chave = fingerprint(model, messages, temperature)
+    if _llm_cache is not None:
+        if not regenerar:
+            try:
+                txt = _llm_cache.get(chave)
+            except sqlite3.Error:
+                txt = None
+            if txt is not None:
+                anotar(cache=True)
+                return txt
+        anotar(cache=False)
+
+    def _pedir() -> str:
+        t0 = time.perf_counter()
+        txt = pedido()
+        if txt and _llm_cache is not None:
+            try:
+                _llm_cache.put(chave, model, txt, time.perf_counter() - t0)
+            except sqlite3.Error:
+                pass  # cache indisponível (disco cheio, permissões): segue sem ele
+        return txt
+
+    return escalonador.executar(chave, _pedir, estimar_tokens(messages))
+
+# =========================
+#  📡 STREAMING
+# =========================
+class StreamStats:
+    """Métricas de uma geração em streaming (preenchidas enquanto os tokens chegam)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.ttft_s: Optional[float] = None
+        self.total_s = 0.0
+        self.tokens = 0
+        self.cache = False
+        self.cancelado = False
+
+    @property
+    def tokens_s(self) -> float:
+        gerar = self.total_s - (self.ttft_s or 0.0)
+        return self.tokens / gerar if gerar > 1e-3 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ttft_s": round(self.ttft_s or 0.0, 3),
+            "total_s": round(self.total_s, 3),
+            "tokens": self.tokens,
+            "tokens_s": round(self.tokens_s, 1),
+            "cache": self.cache,
+            "cancelado": self.cancelado,
+        }
+
+def stream_completion(
+    client,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    regenerar: bool = False,
+    cancel: Optional[threading.Event] = None,
+    stats: Optional[StreamStats] = None,
+) -> Iterator[str]:
+    """Gera os pedaços de texto à medida que chegam da API.
+
+    Só a abertura do stream passa pelos retries; `cancel.set()` (ou fechar o gerador)
+    termina a ligação a meio, a não ser que outro pedido igual esteja a ler o mesmo stream.
+    Respostas completas vão para o cache; parciais não.
+    """
+    st_ = stats if stats is not None else StreamStats()
+    chave = fingerprint(model, messages, temperature)
+    if _llm_cache is not None and not regenerar:
+        try:
+            txt = _llm_cache.get(chave)
+        except sqlite3.Error:
+            txt = None
+        if txt is not None:
+            st_.cache = True
+            st_.ttft_s = st_.total_s = time.perf_counter() - st_.inicio
+            anotar(cache=True)
+            yield txt
+            return
+
+    def abrir():
+        try:
+            return client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature,
+                stream=True, stream_options={"include_usage": True},
+            )
+        except TypeError:
+            # SDKs antigos sem stream_options: os tokens passam a ser contados por pedaço.
+            return client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True,
+            )
+
+    def pedacos_api(voo: _EmVoo) -> Iterator[str]:
+        # Corre na thread do escalonador; o que sai daqui chega a todos os pedidos fundidos.
+        t0 = time.perf_counter()
+        stream = with_retry(abrir)
+        partes: List[str] = []
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None) and chunk.usage.completion_tokens is not None:
+                    voo.uso = {"prompt": chunk.usage.prompt_tokens, "resposta": chunk.usage.completion_tokens}
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    partes.append(delta)
+                    yield delta
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        texto = "".join(partes).strip()
+        if _llm_cache is not None and texto:
+            try:
+                _llm_cache.put(chave, model, texto, time.perf_counter() - t0)
+            except sqlite3.Error:
+                pass
+
+    uso: Dict[str, Any] = {}
+    leitura = escalonador.stream(chave, pedacos_api, estimar_tokens(messages), cancel=cancel, uso=uso)
+    try:
+        for delta in leitura:
+            if cancel is not None and cancel.is_set():
+                st_.cancelado = True
+                break
+            if st_.ttft_s is None:
+                st_.ttft_s = time.perf_counter() - st_.inicio
+            st_.tokens += 1
+            yield delta
+        else:
+            if cancel is not None and cancel.is_set():
+                st_.cancelado = True
+            elif uso.get("resposta") is not None:
+                st_.tokens = uso["resposta"]
+    except GeneratorExit:
+        st_.cancelado = True
+        raise
+    finally:
+        leitura.close()   # este leitor sai; a ligação fecha se mais ninguém estiver a ler
+        st_.total_s = time.perf_counter() - st_.inicio
+        anotar(cache=False, tokens_prompt=uso.get("prompt"), tokens_resposta=st_.tokens)
+
+# =========================
+#  ⚡ GERAÇÃO EM LOTE
+# =========================
+# Os pedidos à API são bloqueantes; o lote espalha-os por threads e o asyncio só
+# coordena. Os resultados chegam pela ordem em que terminam e `on_result` corre na
+# thread que chamou (no Streamlit: a do script), por isso pode escrever em session_state.
+CONCORRENCIA_IA = int(os.getenv("CBIZ_CONCORRENCIA", "4"))
+
+OnResult = Callable[[str, str, int, int, float], None]
+
+async def gerar_em_lote(
+    tarefas: Dict[str, Callable[[], str]],
+    max_concorrencia: int = CONCORRENCIA_IA,
+    on_result: Optional[OnResult] = None,
+) -> Dict[str, str]:
+    """Corre `tarefas` ({chave: função sem argumentos}) com no máximo `max_concorrencia` em voo.
+
+    `on_result(chave, texto, feitos, total, segundos)` é chamado à medida que cada uma termina.
+    """
+    total = len(tarefas)
+    if not total:
+        return {}
+    n = max(1, int(max_concorrencia))
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(n)
+    resultados: Dict[str, str] = {}
+
+    with ThreadPoolExecutor(max_workers=min(n, total), thread_name_prefix="cbiz-ia") as pool:
+        async def _uma(key: str, fn: Callable[[], str]):
+            async with sem:
+                t0 = time.perf_counter()
+                # As threads do pool não herdam o contexto: leva-se a sessão de quem pediu,
+                # com prioridade de lote no escalonador.
+                ctx = contextvars.copy_context()
+                ctx.run(_origem.set, (_origem.get()[0], LOTE))
+                try:
+                    texto = await loop.run_in_executor(pool, ctx.run, fn)
+                except Exception as e:
+                    texto = f"[ERRO AO GERAR]: {e}"
+                return key, texto, time.perf_counter() - t0
+
+        for fut in asyncio.as_completed([_uma(k, fn) for k, fn in tarefas.items()]):
+            key, texto, dt = await fut
+            resultados[key] = texto
+            if on_result:
+                on_result(key, texto, len(resultados), total, dt)
+    return resultados
+
+def gerar_em_lote_sync(
+    tarefas: Dict[str, Callable[[], str]],
+    max_concorrencia: int = CONCORRENCIA_IA,
+    on_result: Optional[OnResult] = None,
+) -> Dict[str, str]:
+    """Versão bloqueante de `gerar_em_lote`, para chamar a partir do script Streamlit."""
+    return asyncio.run(gerar_em_lote(tarefas, max_concorrencia, on_result))
@@ -0,0 +1,257 @@
+"""Geração em lote, sem interface: uma pasta de dossiers YAML → um DOCX (Parte 2) por dossier,
+com as tabelas financeiras também em XLSX.
+
+    python autofill_lote.py dossiers/ --saida out/ --workers 4
+
+Cada dossier (*.yaml / *.yml) dá <saida>/<nome do ficheiro>.docx e .xlsx:
+
+    identificacao: {empresa_nome: ..., setor: ..., localizacao: ...}
+    anos: [2025, 2026, 2027]
+    assum: {crescimento_receitas: 0.08, emprestimo_montante: 50000, ...}
+    vendas: [{designacao: Pão, preco: 0.25, qtd_mensal: 20000}, ...]
+    pessoal: [{funcao: Padeiro, venc_mensal: 950, n: 2, meses: 14}, ...]
+    investimento: [{tipo: equipamento, descricao: Forno, valor: 18000}, ...]
+    textos:                          # por chave dos campos da Parte 2 (ou um título livre)
+      historial: "Texto já escrito"  # usado tal como está
+      missao: {prompt: "..."}        # gerado com esta instrução
+      objetivos:                     # vazio → gerado com a instrução do campo
+    secoes: [historial, missao, ...] # opcional; por omissão todas as da Parte 2
+    sensibilidade:                   # opcional; ver autofill_cenarios.analise_sensibilidade
+      distribuicoes: {crescimento_receitas: [normal, 0.08, 0.03]}
+      n: 2000
+
+Os dossiers correm em processos separados (--workers) e as secções em falta de cada um
+são pedidas à IA em paralelo (--concorrencia). Cada dossier concluído fica registado em
+<saida>/.checkpoint.jsonl; ao voltar a correr, os que não mudaram desde então e cujo
+DOCX e XLSX existem são saltados (--refazer ignora o registo).
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+import pandas as pd
+
+from autofill_campos import FIELDS_PART2
+from autofill_core_bp import build_docx_bp, build_xlsx_bp, calcular_financeiros, gerar_texto_ia
+from autofill_llm import CONCORRENCIA_IA, gerar_em_lote_sync
+from autofill_trace import instrumentar
+
+LOTE_WORKERS = int(os.getenv("CBIZ_LOTE_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHECKPOINT = ".checkpoint.jsonl"
+
+def listar_dossiers(pasta: Path) -> List[Path]:
+    return sorted(p for p in Path(pasta).iterdir() if p.suffix.lower() in (".yaml", ".yml") and p.is_file())
+
+def _hash_ficheiro(caminho: Path) -> str:
+    return hashlib.sha256(caminho.read_bytes()).hexdigest()
+
+# --- Checkpoint ---
+def ler_checkpoint(saida: Path) -> Dict[str, Dict[str, Any]]:
+    """Último registo por dossier. Linhas truncadas (queda a meio da escrita) são ignoradas."""
+    registos: Dict[str, Dict[str, Any]] = {}
+    caminho = saida / CHECKPOINT
+    if not caminho.exists():
+        return registos
+    for linha in caminho.read_text(encoding="utf-8").splitlines():
+        try:
+            r = json.loads(linha)
+        except ValueError:
+            continue
+        registos[r["dossier"]] = r
+    return registos
+
+def registar_checkpoint(saida: Path, registo: Dict[str, Any]) -> None:
+    with open(saida / CHECKPOINT, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registo, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _concluido(registo: Optional[Dict[str, Any]], digest: str, saida: Path) -> bool:
+    return bool(
+        registo and registo.get("estado") == "ok" and registo.get("hash") == digest
+        and (saida / registo.get("docx", "")).is_file()
+        and (saida / registo.get("xlsx", "")).is_file()
+    )
+
+# --- Um dossier ---
+def _textos(dossier: Dict[str, Any], tabs: Dict[str, pd.DataFrame], concorrencia: int) -> Tuple[Dict[str, str], int]:
+    """Títulos → texto, pela ordem dos campos da Parte 2; pede à IA as secções em falta."""
+    campos = {f["key"]: f for f in FIELDS_PART2}
+    dados = dict(dossier.get("textos") or {})
+    secoes = dossier.get("secoes") or list(campos)
+    chaves = list(dict.fromkeys([*[k for k in secoes if k in campos or k in dados], *dados]))
+
+    dr = tabs["dr"]
+    resultado = dr[dr["rubrica"] == "Resultado"].drop(columns="rubrica").iloc[0].to_dict() if not dr.empty else {}
+    contexto = {
+        "identificacao": dossier.get("identificacao") or {},
+        "resultado_por_ano": resultado,
+        **{k: v for k, v in dados.items() if isinstance(v, str) and v.strip()},
+    }
+
+    textos: Dict[str, str] = {}
+    tarefas = {}
+    for k in chaves:
+        titulo = campos[k]["label"] if k in campos else k
+        valor = dados.get(k)
+        if isinstance(valor, str) and valor.strip():
+            textos[k] = valor
+            continue
+        instrucoes = (valor or {}).get("prompt") if isinstance(valor, dict) else None
+        instrucoes = instrucoes or (campos[k]["prompt"] if k in campos else f"Redige a secção '{titulo}'.")
+        tarefas[k] = (lambda t=titulo, i=instrucoes: gerar_texto_ia(t, i, contexto))
+        textos[k] = ""
+    textos.update(gerar_em_lote_sync(tarefas, concorrencia))
+    return {(campos[k]["label"] if k in campos else k): textos[k] for k in chaves}, len(tarefas)
+
+@instrumentar("processar_dossier", lambda res, caminho, *a, **k: {"dossier": Path(caminho).name, "estado": res.get("estado")})
+def processar_dossier(caminho: str, saida: str, concorrencia: int = CONCORRENCIA_IA) -> Dict[str, Any]:
+    """Lê, calcula, gera as secções em falta e escreve o DOCX e o XLSX. Devolve o registo de checkpoint."""
+    caminho, saida = Path(caminho), Path(saida)
+    t0 = time.perf_counter()
+    tempos: Dict[str, float] = {}
+    digest = _hash_ficheiro(caminho)
+    dossier = yaml.safe_load(caminho.read_text(encoding="utf-8")) or {}
+    if not isinstance(dossier, dict):
+        raise ValueError("o dossier tem de ser um mapeamento YAML")
+
+    t = time.perf_counter()
+    anos = [int(a) for a in dossier.get("anos") or [2025, 2026, 2027]]
+    tabs = calcular_financeiros(
+        anos,
+        dossier.get("assum") or {},
+        pd.DataFrame(dossier.get("vendas") or []),
+        pd.DataFrame(dossier.get("pessoal") or []),
+        pd.DataFrame(dossier.get("investimento") or []),
+    )
+    sens = None
+    if dossier.get("sensibilidade"):
+        from autofill_cenarios import analise_sensibilidade
+        sens = analise_sensibilidade(
+            anos, dossier.get("assum") or {},
+            pd.DataFrame(dossier.get("vendas") or []), pd.DataFrame(dossier.get("pessoal") or []),
+            pd.DataFrame(dossier.get("investimento") or []),
+            **dossier["sensibilidade"],
+        )
+    tempos["calculo_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    textos, geradas = _textos(dossier, tabs, concorrencia)
+    tempos["textos_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    destino = saida / f"{caminho.stem}.docx"
+    tmp = destino.with_name(destino.name + ".tmp")
+    build_docx_bp(dossier, tabs, textos, tmp, sensibilidade=sens)
+    os.replace(tmp, destino)   # nunca fica um DOCX a meio com o nome final
+    tempos["docx_s"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    folhas = destino.with_suffix(".xlsx")
+    tmp = folhas.with_name(folhas.name + ".tmp")
+    build_xlsx_bp(tabs, tmp, sensibilidade=sens, assum=dossier.get("assum") or {})
+    os.replace(tmp, folhas)
+    tempos["xlsx_s"] = time.perf_counter() - t
+
+    return {
+        "dossier": caminho.name, "hash": digest, "estado": "ok", "docx": destino.name, "xlsx": folhas.name,
+        "secoes_geradas": geradas, **{k: round(v, 3) for k, v in tempos.items()},
+        "total_s": round(time.perf_counter() - t0, 3),
+    }
+
+# --- Lote ---
+def _erro(e: Exception) -> str:
+    return f"{type(e).__name__}: {(str(e).splitlines() or [''])[0]}"
+
+def correr_lote(
+    pasta: Path,
+    saida: Path,
+    workers: int = LOTE_WORKERS,
+    concorrencia: int = CONCORRENCIA_IA,
+    refazer: bool = False,
+    on_result=None,
+) -> List[Dict[str, Any]]:
+    """Processa a pasta toda; devolve os registos pela ordem dos ficheiros (saltados incluídos)."""
+    saida.mkdir(parents=True, exist_ok=True)
+    feitos = {} if refazer else ler_checkpoint(saida)
+    registos: Dict[str, Dict[str, Any]] = {}
+    pendentes = []
+    for p in listar_dossiers(pasta):
+        anterior = feitos.get(p.name)
+        if _concluido(anterior, _hash_ficheiro(p), saida):
+            registos[p.name] = {**anterior, "estado": "saltado"}
+        else:
+            pendentes.append(p)
+
+    total = len(registos) + len(pendentes)
+
+    def concluir(p: Path, registo: Dict[str, Any]) -> None:
+        registos[p.name] = registo
+        registar_checkpoint(saida, registo)
+        if on_result:
+            on_result(registo, len(registos), total)
+
+    if workers > 1 and len(pendentes) > 1:
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(pendentes)), mp_context=ctx) as pool:
+            futs = {pool.submit(processar_dossier, str(p), str(saida), concorrencia): p for p in pendentes}
+            for fut in as_completed(futs):
+                p = futs[fut]
+                try:
+                    registo = fut.result()
+                except Exception as e:
+                    registo = {"dossier": p.name, "hash": _hash_ficheiro(p), "estado": "erro", "erro": _erro(e)}
+                concluir(p, registo)
+    else:
+        for p in pendentes:
+            try:
+                registo = processar_dossier(str(p), str(saida), concorrencia)
+            except Exception as e:
+                registo = {"dossier": p.name, "hash": _hash_ficheiro(p), "estado": "erro", "erro": _erro(e)}
+            concluir(p, registo)
+    return [registos[p.name] for p in listar_dossiers(pasta) if p.name in registos]
+
+def _resumo(registos: List[Dict[str, Any]], segundos: float) -> str:
+    linhas = [f"{'dossier':<32} {'estado':<8} {'cálculo':>8} {'textos':>8} {'docx':>8} {'xlsx':>8} {'total':>8} {'IA':>4}"]
+    for r in registos:
+        if r["estado"] == "erro":
+            linhas.append(f"{r['dossier'][:32]:<32} {'erro':<8} {r.get('erro', '')}")
+            continue
+        linhas.append(
+            f"{r['dossier'][:32]:<32} {r['estado']:<8} {r['calculo_s']:>7.2f}s {r['textos_s']:>7.2f}s "
+            f"{r['docx_s']:>7.2f}s {r.get('xlsx_s', 0.0):>7.2f}s {r['total_s']:>7.2f}s {r['secoes_geradas']:>4}"
+        )
+    n = {e: sum(r["estado"] == e for r in registos) for e in ("ok", "saltado", "erro")}
+    linhas.append(f"{n['ok']} gerado(s), {n['saltado']} saltado(s), {n['erro']} com erro — {segundos:.1f}s no total")
+    return "\n".join(linhas)
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Gera os DOCX (e XLSX) da Parte 2 para uma pasta de dossiers YAML.")
+    ap.add_argument("pasta", type=Path, help="pasta com os dossiers (*.yaml / *.yml)")
+    ap.add_argument("--saida", type=Path, default=Path("saida"), help="pasta dos DOCX/XLSX e do checkpoint")
+    ap.add_argument("--workers", type=int, default=LOTE_WORKERS, help="dossiers em paralelo (processos)")
+    ap.add_argument("--concorrencia", type=int, default=CONCORRENCIA_IA, help="pedidos à IA em paralelo por dossier")
+    ap.add_argument("--refazer", action="store_true", help="ignora o checkpoint e refaz todos os dossiers")
+    args = ap.parse_args(argv)
+    if not args.pasta.is_dir():
+        ap.error(f"pasta inexistente: {args.pasta}")
+
+    def progresso(r: Dict[str, Any], feitos: int, total: int) -> None:
+        detalhe = f"{r['total_s']:.2f}s" if r["estado"] == "ok" else r.get("erro", "")
+        print(f"[{feitos}/{total}] {r['dossier']}: {r['estado']} {detalhe}", flush=True)
+
+    t0 = time.perf_counter()
+    registos = correr_lote(args.pasta, args.saida, args.workers, args.concorrencia, args.refazer, progresso)
+    print(_resumo(registos, time.perf_counter() - t0))
+    return 1 if any(r["estado"] == "erro" for r in registos) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
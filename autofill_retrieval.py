@@ -0,0 +1,194 @@
+import os
+import re
+import math
+import hashlib
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# =========================
+#  🔎 CONTEXTO POR RELEVÂNCIA (BM25)
+# =========================
+# Os documentos carregados são partidos em pedaços uma vez e indexados localmente; para
+# cada campo entram no contexto só os pedaços mais relevantes para o título/instrução,
+# em vez das primeiras LIMITE_CONTEXTO letras. Tudo em memória, sem rede.
+CHUNK_CHARS = int(os.getenv("CBIZ_RAG_CHUNK", "1200"))
+TOP_K = int(os.getenv("CBIZ_RAG_TOP_K", "8"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = set("""
+a ao aos as ate com como da das de dei deve do dos e ela elas ele eles em entre era essa
+esse esta este eu foi for ha isso isto ja la lhe mais mas me mesmo na nao nas nem no nos
+o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu sua sao so tambem
+te tem um uma umas uns vai ver voce the and of to in for on is are with
+""".split())
+_PALAVRA = re.compile(r"\w+")
+
+def _sem_acentos(txt: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", txt) if not unicodedata.combining(c))
+
+def _radical(p: str) -> str:
+    # Plural → singular e, depois, sem a vogal final (género): recursos/recurso → recurs.
+    if p.endswith("coes"):
+        p = p[:-4] + "cao"
+    elif p.endswith("oes"):
+        p = p[:-3] + "ao"
+    elif p.endswith("ais"):
+        p = p[:-3] + "al"
+    elif p.endswith("s") and len(p) > 4:
+        p = p[:-1]
+    if len(p) > 4 and p[-1] in "aeo":
+        p = p[:-1]
+    return p
+
+def tokens(txt: str) -> List[str]:
+    """Minúsculas, sem acentos nem stopwords e com um radical simples (plurais/género)."""
+    out = []
+    for p in _PALAVRA.findall(_sem_acentos(txt.lower())):
+        if len(p) < 2 or p in _STOPWORDS or p.isdigit():
+            continue
+        out.append(_radical(p))
+    return out
+
+def partir(txt: str, tamanho: int = CHUNK_CHARS) -> List[str]:
+    """Pedaços de até `tamanho` letras, por parágrafos (e por frases, se um parágrafo não cabe)."""
+    partes: List[str] = []
+    for par in re.split(r"\n\s*\n", txt):
+        par = par.strip()
+        if not par:
+            continue
+        if len(par) <= tamanho:
+            partes.append(par)
+            continue
+        frases = re.split(r"(?<=[.!?;])\s+|\n", par)
+        for f in frases:
+            while len(f) > tamanho:
+                partes.append(f[:tamanho])
+                f = f[tamanho:]
+            if f.strip():
+                partes.append(f.strip())
+    pedacos, atual = [], ""
+    for p in partes:
+        if atual and len(atual) + 2 + len(p) > tamanho:
+            pedacos.append(atual)
+            atual = p
+        else:
+            atual = f"{atual}\n\n{p}" if atual else p
+    if atual:
+        pedacos.append(atual)
+    return pedacos
+
+class IndiceBM25:
+    """Índice invertido incremental: acrescentar ou retirar um documento não refaz os outros."""
+
+    def __init__(self):
+        self._pedacos: Dict[int, Tuple[str, str, int]] = {}   # id → (digest, texto, comprimento em tokens)
+        self._postings: Dict[str, Dict[int, int]] = {}         # termo → {id: frequência}
+        self._docs: Dict[str, Tuple[str, List[int]]] = {}      # digest → (nome, ids pela ordem do texto)
+        self._total_tokens = 0
+        self._total_chars = 0
+        self._proximo = 0
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._docs
+
+    def digests(self) -> List[str]:
+        return list(self._docs)
+
+    def adicionar(self, nome: str, digest: str, texto: str) -> None:
+        if digest in self._docs:
+            return
+        ids = []
+        for pedaco in partir(texto):
+            toks = tokens(pedaco)
+            pid = self._proximo
+            self._proximo += 1
+            self._pedacos[pid] = (digest, pedaco, len(toks))
+            self._total_tokens += len(toks)
+            self._total_chars += len(pedaco)
+            for termo, tf in Counter(toks).items():
+                self._postings.setdefault(termo, {})[pid] = tf
+            ids.append(pid)
+        self._docs[digest] = (nome, ids)
+
+    def remover(self, digest: str) -> None:
+        _, ids = self._docs.pop(digest, (None, []))
+        for pid in ids:
+            _, pedaco, n = self._pedacos.pop(pid)
+            self._total_tokens -= n
+            self._total_chars -= len(pedaco)
+            for termo in set(tokens(pedaco)):
+                post = self._postings.get(termo)
+                if post is not None:
+                    post.pop(pid, None)
+                    if not post:
+                        del self._postings[termo]
+
+    def ordenar(self, digests: List[str]) -> None:
+        """Os documentos passam a seguir a ordem dos ficheiros carregados."""
+        self._docs = {d: self._docs[d] for d in digests if d in self._docs}
+
+    def pesquisar(self, consulta: str, k: int = TOP_K) -> List[Tuple[int, float]]:
+        """[(id do pedaço, pontuação)] dos `k` mais relevantes, por ordem decrescente."""
+        n = len(self._pedacos)
+        if not n:
+            return []
+        media = self._total_tokens / n or 1.0
+        pontos: Dict[int, float] = {}
+        for termo in set(tokens(consulta)):
+            post = self._postings.get(termo)
+            if not post:
+                continue
+            idf = math.log(1 + (n - len(post) + 0.5) / (len(post) + 0.5))
+            for pid, tf in post.items():
+                dl = self._pedacos[pid][2]
+                pontos[pid] = pontos.get(pid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / media))
+        return sorted(pontos.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+    def texto_completo(self) -> str:
+        return "\n".join(
+            f"\n---\nFicheiro: {nome}\n" + "\n\n".join(self._pedacos[pid][1] for pid in ids)
+            for nome, ids in self._docs.values()
+        ).strip()
+
+    def contexto(self, consulta: str, orcamento: int, k: int = TOP_K) -> str:
+        """Texto dos documentos para um campo, com no máximo `orcamento` letras.
+
+        Se tudo cabe, vai tudo; senão, os `k` pedaços mais relevantes para `consulta` que
+        couberem, agrupados por ficheiro e pela ordem em que aparecem no documento.
+        """
+        if self._total_chars <= orcamento:   # só então vale a pena montar o texto todo
+            completo = self.texto_completo()
+            if len(completo) <= orcamento:
+                return completo
+        escolhidos, usado = [], 0
+        for pid, _ in self.pesquisar(consulta, k):
+            custo = len(self._pedacos[pid][1]) + 80   # + cabeçalho do ficheiro
+            if usado + custo > orcamento:
+                continue
+            escolhidos.append(pid)
+            usado += custo
+        por_doc: Dict[str, List[int]] = {}
+        for pid in sorted(escolhidos):
+            por_doc.setdefault(self._pedacos[pid][0], []).append(pid)
+        return "\n".join(
+            f"\n---\nFicheiro: {self._docs[d][0]} (excertos)\n" + "\n[…]\n".join(self._pedacos[pid][1] for pid in ids)
+            for d, ids in por_doc.items()
+        ).strip()
+
+    def stats(self) -> Dict[str, int]:
+        return {"ficheiros": len(self._docs), "pedacos": len(self._pedacos), "termos": len(self._postings)}
+
+def sincronizar(indice: IndiceBM25, ficheiros: Iterable[Tuple[str, bytes]], extrair) -> IndiceBM25:
+    """Põe o índice em linha com os ficheiros atuais: extrai e indexa só os novos
+    (`extrair([(nome, bytes), ...]) -> [texto, ...]`) e retira os que saíram."""
+    atuais = {hashlib.sha256(b).hexdigest(): (nome, b) for nome, b in ficheiros}
+    for d in [d for d in indice.digests() if d not in atuais]:
+        indice.remover(d)
+    novos = [(d, nome, b) for d, (nome, b) in atuais.items() if d not in indice]
+    if novos:
+        for (d, nome, _), txt in zip(novos, extrair([(nome, b) for _, nome, b in novos])):
+            indice.adicionar(nome, d, txt)
+    indice.ordenar(list(atuais))
+    return indice
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# =========================
+#  ⏱️ INSTRUMENTAÇÃO (spans)
+# =========================
+# Cada etapa (extração, contexto, IA, cálculo, DOCX) regista um span com duração e
+# atributos (bytes, letras, tokens, cache). Os spans ficam num buffer para o painel de
+# diagnóstico e, se houver ficheiro, são acrescentados a um JSONL. Desligado (o normal),
+# span()/instrumentar() custam uma leitura de um booleano.
+TRACE_FILE = os.getenv("CBIZ_TRACE_FILE", os.path.join(".cbiz_cache", "trace.jsonl"))
+TRACE_BUFFER = 2_000
+
+class _Estado:
+    ativo = os.getenv("CBIZ_TRACE", "0") not in ("", "0", "false", "False")
+    ficheiro: Optional[str] = TRACE_FILE or None
+
+_spans: deque = deque(maxlen=TRACE_BUFFER)
+_lock = threading.Lock()
+_atual: contextvars.ContextVar = contextvars.ContextVar("cbiz_span", default=None)
+
+def ativar(ligado: bool = True, ficheiro: Optional[str] = None) -> None:
+    """Liga/desliga o registo para todo o processo; `ficheiro` muda o destino do JSONL ("" = nenhum)."""
+    _Estado.ativo = bool(ligado)
+    if ficheiro is not None:
+        _Estado.ficheiro = ficheiro or None
+
+def ativo() -> bool:
+    return _Estado.ativo
+
+def ficheiro() -> Optional[str]:
+    return _Estado.ficheiro
+
+class Span:
+    __slots__ = ("nome", "id", "pai", "inicio", "duracao_ms", "attrs", "_t0", "_token")
+
+    def __init__(self, nome: str, attrs: Dict[str, Any]):
+        self.nome = nome
+        self.id = uuid.uuid4().hex[:12]
+        pai = _atual.get()
+        self.pai = pai.id if pai is not None else None
+        self.inicio = time.time()
+        self.duracao_ms = None
+        self.attrs = dict(attrs)
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def somar(self, **attrs) -> None:
+        for k, v in attrs.items():
+            self.attrs[k] = self.attrs.get(k, 0) + v
+
+    def __enter__(self) -> "Span":
+        self._token = _atual.set(self)
+        return self
+
+    def __exit__(self, tipo, erro, tb) -> bool:
+        self.duracao_ms = (time.perf_counter() - self._t0) * 1e3
+        try:
+            _atual.reset(self._token)
+        except ValueError:
+            _atual.set(None)  # gerador fechado noutro contexto (ex.: pelo GC)
+        if erro is not None:
+            self.attrs["erro"] = f"{tipo.__name__}: {erro}"
+        _registar(self)
+        return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "nome": self.nome, "id": self.id, "pai": self.pai, "inicio": round(self.inicio, 3),
+            "duracao_ms": round(self.duracao_ms or 0.0, 3), **self.attrs,
+        }
+
+class _SpanNulo:
+    """O que span() devolve com a instrumentação desligada: não mede nem guarda nada."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def somar(self, **attrs) -> None:
+        pass
+
+_NULO = _SpanNulo()
+
+def span(nome: str, **attrs):
+    """with span("build_context", modo=...) as s: ...; s.set(letras=len(ctx))"""
+    return Span(nome, attrs) if _Estado.ativo else _NULO
+
+def anotar(**attrs) -> None:
+    """Acrescenta atributos ao span em curso (ex.: tokens vindos do cliente OpenAI)."""
+    s = _atual.get() if _Estado.ativo else None
+    if s is not None:
+        s.set(**attrs)
+
+def instrumentar(nome: str, attrs: Optional[Callable[..., Dict[str, Any]]] = None):
+    """Decorador: um span por chamada. `attrs(resultado, *args, **kwargs)` devolve atributos extra."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _Estado.ativo:
+                return fn(*args, **kwargs)
+            with Span(nome, {}) as s:
+                res = fn(*args, **kwargs)
+                if attrs is not None:
+                    try:
+                        s.set(**attrs(res, *args, **kwargs))
+                    except Exception:
+                        pass  # atributos são só informativos
+                return res
+        return wrapper
+    return deco
+
+def tamanho(destino) -> int:
+    """Bytes escritos em `destino`: um caminho ou um ficheiro em memória (BytesIO)."""
+    if hasattr(destino, "getbuffer"):
+        return destino.getbuffer().nbytes
+    if hasattr(destino, "tell"):
+        return destino.tell()
+    return os.path.getsize(destino)
+
+def _registar(s: Span) -> None:
+    linha = s.as_dict()
+    with _lock:
+        _spans.append(linha)
+        if _Estado.ficheiro:
+            try:
+                os.makedirs(os.path.dirname(_Estado.ficheiro) or ".", exist_ok=True)
+                with open(_Estado.ficheiro, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(linha, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass  # sem disco/permissões: fica só o buffer em memória
+
+def spans_recentes(n: int = 100) -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_spans)[-n:]
+
+def resumo() -> List[Dict[str, Any]]:
+    """Por etapa: chamadas, tempo total/mediano/p95, e somas de tokens, letras e hits de cache."""
+    with _lock:
+        spans = list(_spans)
+    grupos: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        grupos.setdefault(s["nome"], []).append(s)
+    out = []
+    for nome, ss in grupos.items():
+        d = sorted(s["duracao_ms"] for s in ss)
+        linha = {
+            "etapa": nome, "chamadas": len(ss), "total_ms": round(sum(d), 1),
+            "p50_ms": round(d[len(d) // 2], 2), "p95_ms": round(d[min(len(d) - 1, int(len(d) * 0.95))], 2),
+        }
+        for k in ("tokens_prompt", "tokens_resposta", "bytes", "letras"):
+            vals = [s[k] for s in ss if isinstance(s.get(k), (int, float))]
+            if vals:
+                linha[k] = sum(vals)
+        caches = [s["cache"] for s in ss if "cache" in s]
+        if caches:
+            linha["cache_hits"] = sum(bool(c) for c in caches)
+        out.append(linha)
+    return sorted(out, key=lambda l: -l["total_ms"])
+
+def limpar() -> None:
+    with _lock:
+        _spans.clear()
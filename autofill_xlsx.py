@@ -0,0 +1,216 @@
+import re
+import math
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+# =========================
+#  📊 FOLHAS XLSX EM STREAMING
+# =========================
+# Como no autofill_docx: o XML de cada linha é montado como texto a partir de um modelo de
+# célula por coluna, em vez de passar por um objeto Cell por valor (no openpyxl, mesmo em
+# write-only, são ~15-20 µs por célula: 15 mil linhas demoravam mais que o DOCX inteiro).
+# Cada folha é escrita diretamente na sua entrada do ZIP, aos blocos, por isso a memória
+# não cresce com o número de linhas. O ficheiro é um XLSX normal (lido pelo Excel, pelo
+# LibreOffice, pelo openpyxl e pelo pandas).
+FORMATO_REAL = "#,##0.00"   # numFmtId 4, embutido no Excel
+FORMATO_INTEIRO = "0"       # numFmtId 1
+LARGURA_MAX = 60
+LINHAS_AMOSTRA = 200        # linhas lidas para estimar a largura de cada coluna
+LINHAS_POR_BLOCO = 1_000
+_INVALIDOS_TITULO = re.compile(r"[\[\]:*?/\\]")
+_INVALIDOS_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Índices em cellXfs do styles.xml abaixo.
+_S_REAL, _S_INTEIRO, _S_CABECALHO = 1, 2, 3
+_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CABECALHO_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_ESTILOS = (
+    f'{_CABECALHO_XML}<styleSheet xmlns="{_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="1" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+def letra_coluna(n: int) -> str:
+    """1 → A, 27 → AA."""
+    letras = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        letras = chr(65 + r) + letras
+    return letras
+
+def _nome_folha(titulo: str) -> str:
+    return "'" + titulo.replace("'", "''") + "'"
+
+def titulo_folha(nome: str, usados: set) -> str:
+    """Título válido para o Excel (sem []:*?/\\, até 31 caracteres) e único no livro."""
+    base = _INVALIDOS_TITULO.sub("_", str(nome)).strip("'")[:31] or "Folha"
+    titulo, n = base, 1
+    while titulo.lower() in usados:
+        n += 1
+        titulo = f"{base[:31 - len(str(n)) - 1]}_{n}"
+    usados.add(titulo.lower())
+    return titulo
+
+def intervalo(titulo: str, linha_ini: int, linha_fim: int, coluna: int) -> str:
+    """Referência absoluta a um bloco de uma coluna de outra folha (linhas/colunas a partir de 1)."""
+    letra = letra_coluna(coluna)
+    return f"{_nome_folha(titulo)}!${letra}${linha_ini}:${letra}${linha_fim}"
+
+def celula(titulo: str, linha: int, coluna: int) -> str:
+    """Referência absoluta a uma célula de outra folha (linha/coluna a partir de 1)."""
+    return f"{_nome_folha(titulo)}!${letra_coluna(coluna)}${linha}"
+
+def _texto(v: str) -> str:
+    return escape(_INVALIDOS_XML.sub("", v))
+
+def _limpar(v: Any) -> Any:
+    """Valor de uma célula: NaN/NaT → None, tipos NumPy → Python, o resto como texto."""
+    if v is None or isinstance(v, (str, bool, int, float)):
+        return None if isinstance(v, float) and math.isnan(v) else v
+    if hasattr(v, "item"):   # np.int64, np.float64, ...
+        return _limpar(v.item())
+    try:
+        if pd.isna(v):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(v)
+
+def _linhas(df: pd.DataFrame):
+    """Linhas de `df` como tuplos de valores limpos, convertidas aos blocos (a tabela nunca
+    passa inteira para objetos Python)."""
+    for ini in range(0, len(df), LINHAS_POR_BLOCO):
+        bloco = df.iloc[ini:ini + LINHAS_POR_BLOCO]
+        yield from zip(*[[_limpar(v) for v in bloco.iloc[:, j].tolist()] for j in range(df.shape[1])])
+
+def _largura(v: Any) -> int:
+    return len(f"{v:,.2f}") if isinstance(v, float) else len(str(v))
+
+class LivroXlsx:
+    """XLSX escrito em streaming: `folha()` escreve uma tabela de cada vez; `fechar()`
+    (ou o fim do `with`) acrescenta o índice do livro e os estilos."""
+
+    def __init__(self, caminho, compresslevel: int = 1):
+        # Nível 1: o ZIP é quase tão pequeno como no 6 e comprime várias vezes mais depressa.
+        self._zip = zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        self._folhas: List[str] = []
+
+    def __enter__(self) -> "LivroXlsx":
+        return self
+
+    def __exit__(self, tipo, erro, tb) -> bool:
+        self.fechar()
+        return False
+
+    def folha(self, titulo: str, df: pd.DataFrame, formulas: Optional[Dict[Tuple[int, int], str]] = None) -> None:
+        """Acrescenta `df` como uma folha (cabeçalho a negrito, 1.ª linha e coluna fixas).
+
+        Reais ficam com FORMATO_REAL e inteiros com FORMATO_INTEIRO. `formulas` põe uma
+        fórmula ("=SUM(...)") na célula (linha, coluna) do DataFrame, a contar de 0; o valor
+        do DataFrame fica como resultado guardado, para quem ler sem recalcular.
+        """
+        self._folhas.append(titulo)
+        n_cols = df.shape[1]
+        letras = [letra_coluna(j + 1) for j in range(n_cols)]
+        cabecalho = [str(c) for c in df.columns]
+        formulas = formulas or {}
+
+        partes = [
+            f'{_CABECALHO_XML}<worksheet xmlns="{_NS}"><sheetViews><sheetView workbookViewId="0">'
+            '<pane xSplit="1" ySplit="1" topLeftCell="B2" activePane="bottomRight" state="frozen"/>'
+            '<selection pane="bottomRight"/></sheetView></sheetViews><sheetFormatPr defaultRowHeight="15"/>'
+        ]
+        if n_cols:
+            partes.append("<cols>")
+            for j in range(n_cols):
+                amostra = [_largura(v) for v in map(_limpar, df.iloc[:LINHAS_AMOSTRA, j].tolist()) if v is not None]
+                largura = min(LARGURA_MAX, max([len(cabecalho[j])] + amostra) + 2)
+                partes.append(f'<col min="{j + 1}" max="{j + 1}" width="{largura}" customWidth="1"/>')
+            partes.append("</cols>")
+        partes.append('<sheetData><row r="1">')
+        partes.extend(
+            f'<c r="{letras[j]}1" s="{_S_CABECALHO}" t="inlineStr"><is><t xml:space="preserve">{_texto(t)}</t></is></c>'
+            for j, t in enumerate(cabecalho)
+        )
+        partes.append("</row>")
+
+        # Modelos por coluna; o %d é o número da linha.
+        real = [f'<c r="{l}%d" s="{_S_REAL}"><v>%r</v></c>' for l in letras]
+        inteiro = [f'<c r="{l}%d" s="{_S_INTEIRO}"><v>%d</v></c>' for l in letras]
+        texto = [f'<c r="{l}%d" t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' for l in letras]
+        logico = [f'<c r="{l}%d" t="b"><v>%d</v></c>' for l in letras]
+
+        with self._zip.open(f"xl/worksheets/sheet{len(self._folhas)}.xml", "w") as f:
+            for i, valores in enumerate(_linhas(df)):
+                r = i + 2
+                linha = [f'<row r="{r}">']
+                for j, v in enumerate(valores):
+                    if (i, j) in formulas:
+                        guardado = f"<v>{v!r}</v>" if isinstance(v, (int, float)) and not isinstance(v, bool) else ""
+                        linha.append(f'<c r="{letras[j]}{r}" s="{_S_REAL}"><f>{_texto(formulas[(i, j)].lstrip("="))}</f>{guardado}</c>')
+                    elif v is None:
+                        continue
+                    elif isinstance(v, bool):
+                        linha.append(logico[j] % (r, v))
+                    elif isinstance(v, float):
+                        linha.append(real[j] % (r, v) if math.isfinite(v) else texto[j] % (r, v))
+                    elif isinstance(v, int):
+                        linha.append(inteiro[j] % (r, v))
+                    else:
+                        linha.append(texto[j] % (r, _texto(v)))
+                linha.append("</row>")
+                partes.append("".join(linha))
+                if len(partes) >= LINHAS_POR_BLOCO:
+                    f.write("".join(partes).encode("utf-8"))
+                    partes = []
+            partes.append("</sheetData></worksheet>")
+            f.write("".join(partes).encode("utf-8"))
+
+    def fechar(self) -> None:
+        if self._zip is None:
+            return
+        n = len(self._folhas)
+        folhas = "".join(
+            f'<sheet name="{escape(t, {chr(34): "&quot;"})}" sheetId="{k}" r:id="rId{k}"/>'
+            for k, t in enumerate(self._folhas, 1)
+        )
+        rels = "".join(
+            f'<Relationship Id="rId{k}" Type="{_NS_R}/worksheet" Target="worksheets/sheet{k}.xml"/>'
+            for k in range(1, n + 1)
+        )
+        tipos = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{k}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for k in range(1, n + 1)
+        )
+        z = self._zip
+        # fullCalcOnLoad: o Excel recalcula as fórmulas ao abrir.
+        z.writestr("xl/workbook.xml", f'{_CABECALHO_XML}<workbook xmlns="{_NS}" xmlns:r="{_NS_R}">'
+                   f'<sheets>{folhas}</sheets><calcPr calcId="124519" fullCalcOnLoad="1"/></workbook>')
+        z.writestr("xl/_rels/workbook.xml.rels", f'{_CABECALHO_XML}<Relationships xmlns="{_NS_PKG}">{rels}'
+                   f'<Relationship Id="rId{n + 1}" Type="{_NS_R}/styles" Target="styles.xml"/></Relationships>')
+        z.writestr("xl/styles.xml", _ESTILOS)
+        z.writestr("_rels/.rels", f'{_CABECALHO_XML}<Relationships xmlns="{_NS_PKG}">'
+                   f'<Relationship Id="rId1" Type="{_NS_R}/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+        z.writestr("[Content_Types].xml", f'{_CABECALHO_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="xml" ContentType="application/xml"/>'
+                   '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                   '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                   f'{tipos}</Types>')
+        z.close()
+        self._zip = None
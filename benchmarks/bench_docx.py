@@ -0,0 +1,89 @@
+"""Benchmark das tabelas DOCX: escrita em bloco (escrever_tabela) vs. table.cell(i, j).text.
+
+    python benchmarks/bench_docx.py                        # 10 / 50 / 100 / 500 / 2000 linhas, 10 anos
+    python benchmarks/bench_docx.py --anos 5 --tamanhos 100 1000 --sem-referencia
+
+Para cada tamanho gera uma tabela (designação + um valor por ano), confirma que as duas
+versões escrevem o mesmo texto em todas as células e mostra os tempos e o ganho. A versão
+célula a célula cresce muito depressa (~30 s para 100 linhas × 11 colunas), por isso só
+corre até --max-referencia linhas.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.oxml.ns import qn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from autofill_docx import escrever_tabela, formatar_valor  # noqa: E402
+
+# Versão anterior (célula a célula), mantida só como referência de resultado e de tempo.
+def escrever_tabela_celulas(doc, df: pd.DataFrame):
+    rows, cols = df.shape
+    table = doc.add_table(rows=rows+1, cols=cols)
+    table.style = "Table Grid"
+    for j, col in enumerate(df.columns):
+        table.cell(0, j).text = str(col)
+    for i in range(rows):
+        for j in range(cols):
+            table.cell(i+1, j).text = formatar_valor(df.iat[i, j].item() if hasattr(df.iat[i, j], "item") else df.iat[i, j])
+    return table
+
+def gerar_tabela(n: int, n_anos: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    dados = {"designacao": [f"Linha {i}" for i in range(n)]}
+    for k in range(n_anos):
+        dados[str(2025 + k)] = rng.uniform(-1e4, 1e6, n).round(2)
+    return pd.DataFrame(dados)
+
+def textos(table) -> List[List[str]]:
+    """Texto das células lido do XML (table.rows/cells também resolve a grelha a cada acesso)."""
+    def texto(tc) -> str:
+        return "".join(
+            e.text or "" if e.tag == qn("w:t") else "\n" if e.tag == qn("w:br") else "\t"
+            for e in tc.iter(qn("w:t"), qn("w:br"), qn("w:tab"))
+        )
+    return [[texto(tc) for tc in tr.iterchildren(qn("w:tc"))] for tr in table._tbl.iterchildren(qn("w:tr"))]
+
+def cronometrar(fn, df: pd.DataFrame, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        doc = Document()
+        t0 = time.perf_counter()
+        fn(doc, df)
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+def main(argv: List[str] = None) -> Dict[int, Dict[str, float]]:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10, 50, 100, 500, 2_000])
+    ap.add_argument("--anos", type=int, default=10)
+    ap.add_argument("--sem-referencia", action="store_true", help="não corre a versão célula a célula")
+    ap.add_argument("--max-referencia", type=int, default=100, help="maior tabela onde corre a versão célula a célula")
+    args = ap.parse_args(argv)
+
+    resultados = {}
+    print(f"{'linhas':>8} {'em bloco':>12} {'por célula':>12} {'ganho':>8}")
+    for n in args.tamanhos:
+        df = gerar_tabela(n, args.anos)
+        rep = 3 if n <= 500 else 1
+        rep_ref = 3 if n <= 10 else 1
+        t_bloco = cronometrar(escrever_tabela, df, rep)
+        linha = {"bloco_s": t_bloco}
+        if not args.sem_referencia and n <= args.max_referencia:
+            t_ref = cronometrar(escrever_tabela_celulas, df, rep_ref)
+            assert textos(escrever_tabela(Document(), df)) == textos(escrever_tabela_celulas(Document(), df))
+            linha.update(celulas_s=t_ref, ganho=t_ref / t_bloco)
+            print(f"{n:>8} {t_bloco * 1e3:>10.1f}ms {t_ref * 1e3:>10.1f}ms {t_ref / t_bloco:>7.1f}x")
+        else:
+            print(f"{n:>8} {t_bloco * 1e3:>10.1f}ms {'—':>12} {'—':>8}")
+        resultados[n] = linha
+    return resultados
+
+if __name__ == "__main__":
+    main()
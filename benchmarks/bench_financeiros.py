@@ -0,0 +1,207 @@
+"""Benchmark de calcular_financeiros: motor vetorizado vs. a versão linha a linha (iterrows).
+
+    python benchmarks/bench_financeiros.py                 # 10 / 1k / 100k linhas, 5 anos
+    python benchmarks/bench_financeiros.py --anos 10 --tamanhos 10 1000
+
+Para cada tamanho gera vendas, pessoal e investimento com N linhas, confirma que as
+duas versões devolvem DataFrames idênticos e mostra os tempos e o ganho.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from autofill_core_bp import calcular_financeiros  # noqa: E402
+
+ASSUM = {
+    "crescimento_receitas": 0.08, "margem_bruta_target": 0.55, "fse_pct_receitas": 0.12,
+    "encargos_sociais_pct": 0.2375, "aumento_salarios_pct": 0.03,
+    "emprestimo_montante": 50_000.0, "emprestimo_taxa": 0.06, "emprestimo_anos": 5,
+    "capitais_proprios_iniciais": 10_000.0,
+}
+TIPOS = ["equipamento", "informatica", "veiculos", "intangiveis", "outros"]
+
+# Versão original (linha a linha), mantida só como referência de resultado e de tempo.
+def calcular_financeiros_iterrows(
+    anos: List[int],
+    assum: Dict[str, float],
+    vendas_df: pd.DataFrame,
+    pessoal_df: pd.DataFrame,
+    investimento_df: pd.DataFrame,
+) -> Dict[str, pd.DataFrame]:
+
+    years = [str(a) for a in anos]
+
+    # Vendas: calcula Y1 e projeta crescimento para restantes anos
+    linhas_v = []
+    for _, v in vendas_df.fillna(0).iterrows():
+        y1 = float(v.get("preco",0)) * float(v.get("qtd_mensal",0)) * float(v.get("meses_y1",12))
+        row = {"designacao": v.get("designacao","—"), years[0]: round(y1,2)}
+        for i in range(1, len(anos)):
+            prev = row[years[i-1]]
+            row[years[i]] = round(prev * (1 + float(assum.get("crescimento_receitas", 0.08))), 2)
+        linhas_v.append(row)
+    df_vendas = pd.DataFrame(linhas_v) if linhas_v else pd.DataFrame(columns=["designacao", *years])
+    tot_vendas = {y: (df_vendas[y].sum() if y in df_vendas else 0.0) for y in years}
+
+    # COGS e FSE em percentagem das vendas
+    margem = float(assum.get("margem_bruta_target", 0.55))
+    cogs = {y: round((1 - margem) * tot_vendas[y], 2) for y in years}
+    df_cogs = pd.DataFrame([{"rubrica": "COGS", **cogs}])
+
+    fse_pct = float(assum.get("fse_pct_receitas", 0.12))
+    fse = {y: round(fse_pct * tot_vendas[y], 2) for y in years}
+    df_fse = pd.DataFrame([{"rubrica": "FSE", **fse}])
+
+    # Pessoal + encargos sociais e aumentos anuais
+    enc_soc = float(assum.get("encargos_sociais_pct", 0.2375))
+    aum = float(assum.get("aumento_salarios_pct", 0.03))
+    linhas_p = []
+    for _, p in pessoal_df.fillna(0).iterrows():
+        base = float(p.get("venc_mensal",0)) * float(p.get("n",0)) * float(p.get("meses",12))
+        y_vals = {years[0]: base * (1 + enc_soc)}
+        for i in range(1, len(anos)):
+            prev_base = y_vals[years[i-1]] / (1 + enc_soc)
+            y_vals[years[i]] = (prev_base * (1 + aum)) * (1 + enc_soc)
+        linhas_p.append({"rubrica": p.get("funcao","—"), **{k: round(v,2) for k,v in y_vals.items()}})
+    df_pessoal = pd.DataFrame(linhas_p) if linhas_p else pd.DataFrame(columns=["rubrica", *years])
+
+    # Depreciações lineares por tipo
+    dep_map = {
+        "equipamento": int(assum.get("dep_equipamento_anos", 5)),
+        "informatica": int(assum.get("dep_informatica_anos", 3)),
+        "veiculos": int(assum.get("dep_veiculos_anos", 4)),
+        "intangiveis": int(assum.get("dep_intangiveis_anos", 3)),
+        "outros": int(assum.get("dep_outros_anos", 4)),
+    }
+    dep_rows, dep_tot = [], {y: 0.0 for y in years}
+    for _, it in investimento_df.fillna("").iterrows():
+        tipo = str(it.get("tipo","outros")).lower()
+        val = float(it.get("valor", 0.0))
+        anos_dep = dep_map.get(tipo, dep_map["outros"]) or 1
+        anu = val / anos_dep
+        row = {"bem": f"{tipo}: {it.get('descricao','')}", **{y: round(anu,2) for y in years}}
+        dep_rows.append(row)
+        for y in years:
+            dep_tot[y] += anu
+    df_dep = pd.DataFrame(dep_rows) if dep_rows else pd.DataFrame(columns=["bem", *years])
+
+    # Empréstimo: amortização constante
+    df_fin = pd.DataFrame(columns=["ano","prestacao","capital","juros","divida_final"])
+    juros_tot = {y: 0.0 for y in years}
+    saldo = float(assum.get("emprestimo_montante", 0.0))
+    taxa = float(assum.get("emprestimo_taxa", 0.06))
+    anos_amort = int(assum.get("emprestimo_anos", 3)) or 1
+    amort = saldo / anos_amort if saldo > 0 else 0.0
+    for i, ano in enumerate(anos):
+        j = saldo * taxa if saldo > 0 else 0.0
+        c = min(amort, saldo) if saldo > 0 else 0.0
+        p = j + c
+        saldo = max(0.0, saldo - c)
+        juros_tot[str(ano)] = j
+        df_fin.loc[len(df_fin)] = {
+            "ano": ano, "prestacao": round(p,2), "capital": round(c,2),
+            "juros": round(j,2), "divida_final": round(saldo,2)
+        }
+
+    # Demonstração de Resultados
+    df_dr = pd.DataFrame([
+        {"rubrica": "Vendas/Serviços", **{y: round(tot_vendas[y],2) for y in years}},
+        {"rubrica": "COGS", **{y: round(df_cogs[y].iloc[0] if not df_cogs.empty else 0.0,2) for y in years}},
+        {"rubrica": "FSE", **{y: round(df_fse[y].sum() if y in df_fse else 0.0,2) for y in years}},
+        {"rubrica": "Pessoal", **{y: round(df_pessoal[y].sum() if not df_pessoal.empty else 0.0,2) for y in years}},
+        {"rubrica": "Depreciações", **{y: round(dep_tot[y],2) for y in years}},
+        {"rubrica": "Juros", **{y: round(juros_tot[y],2) for y in years}},
+    ])
+    res = {"rubrica": "Resultado"}
+    for y in years:
+        res[y] = round(
+            df_dr[y].iloc[0] - df_dr[y].iloc[1] - df_dr[y].iloc[2] - df_dr[y].iloc[3] - df_dr[y].iloc[4] - df_dr[y].iloc[5],
+            2
+        )
+    df_dr.loc[len(df_dr)] = res
+
+    # Balanço (muito simplificado)
+    inv_total = float(investimento_df.get("valor", pd.Series(dtype=float)).sum()) if not investimento_df.empty else 0.0
+    df_bal = pd.DataFrame([
+        {"rubrica": "Ativo Não Corrente", years[0]: round(inv_total,2)},
+        {"rubrica": "Ativo Corrente", **{y: round(0.1*tot_vendas[y],2) for y in years}},
+        {"rubrica": "Capital Próprio", years[0]: round(float(assum.get("capitais_proprios_iniciais",0.0)),2)},
+    ])
+
+    return {
+        "vendas": df_vendas,
+        "cogs": df_cogs,
+        "fse": df_fse,
+        "pessoal": df_pessoal,
+        "depreciacoes": df_dep,
+        "financiamento": df_fin,
+        "dr": df_dr,
+        "balanco": df_bal,
+    }
+
+
+def gerar_dados(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vendas = pd.DataFrame({
+        "designacao": [f"Produto {i}" for i in range(n)],
+        "preco": rng.uniform(1, 500, n).round(2),
+        "qtd_mensal": rng.integers(1, 400, n),
+        "meses_y1": rng.integers(6, 13, n),
+    })
+    pessoal = pd.DataFrame({
+        "funcao": [f"Função {i}" for i in range(n)],
+        "venc_mensal": rng.uniform(820, 4000, n).round(2),
+        "n": rng.integers(1, 4, n),
+        "meses": 14,
+    })
+    investimento = pd.DataFrame({
+        "tipo": [TIPOS[i % len(TIPOS)] for i in range(n)],
+        "descricao": [f"Bem {i}" for i in range(n)],
+        "valor": rng.uniform(100, 50_000, n).round(2),
+    })
+    return vendas, pessoal, investimento
+
+def cronometrar(fn, *args, repeticoes: int = 1) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(*args)
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+def main(argv: List[str] = None) -> Dict[int, Dict[str, float]]:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10, 1_000, 100_000])
+    ap.add_argument("--anos", type=int, default=5)
+    ap.add_argument("--sem-referencia", action="store_true", help="não corre a versão iterrows")
+    args = ap.parse_args(argv)
+
+    anos = list(range(2025, 2025 + args.anos))
+    resultados = {}
+    print(f"{'linhas':>8} {'vetorizado':>12} {'iterrows':>12} {'ganho':>8}")
+    for n in args.tamanhos:
+        dados = gerar_dados(n)
+        rep = 5 if n <= 1_000 else 1
+        t_vec = cronometrar(calcular_financeiros, anos, ASSUM, *dados, repeticoes=rep)
+        linha = {"vetorizado_s": t_vec}
+        if not args.sem_referencia:
+            t_ref = cronometrar(calcular_financeiros_iterrows, anos, ASSUM, *dados, repeticoes=rep)
+            novo = calcular_financeiros(anos, ASSUM, *dados)
+            ref = calcular_financeiros_iterrows(anos, ASSUM, *dados)
+            for k in ref:
+                pd.testing.assert_frame_equal(novo[k], ref[k], check_exact=True)
+            linha.update(iterrows_s=t_ref, ganho=t_ref / t_vec)
+            print(f"{n:>8} {t_vec * 1e3:>10.1f}ms {t_ref * 1e3:>10.1f}ms {t_ref / t_vec:>7.1f}x")
+        else:
+            print(f"{n:>8} {t_vec * 1e3:>10.1f}ms {'—':>12} {'—':>8}")
+        resultados[n] = linha
+    return resultados
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark do tempo de rerun da app: script completo vs. um campo (fragmento).
+
+    python benchmarks/bench_rerun.py                       # 20 reruns, campos com ~2000 letras
+    python benchmarks/bench_rerun.py --reruns 50 --letras 5000
+
+Precisa de requirements-dev.txt (usa o servidor e o browser simulado de carga.py).
+
+Arranca a app com `streamlit run` e liga-se como um browser, com os 24 campos da Parte 2
+preenchidos. Cada medição é a mesma edição de um campo da Parte 2, do envio da mensagem
+até ao fim do rerun: uma vez como rerun do fragmento desse campo (o que o browser manda
+hoje) e outra como rerun do script inteiro (o que qualquer clique fazia antes dos
+fragmentos). Os tempos incluem o websocket e o custo fixo de um rerun no servidor.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def mediana(xs: List[float]) -> float:
+    xs = sorted(xs)
+    return xs[len(xs) // 2] if xs else 0.0
+
+async def medir(srv, args) -> Dict[str, List[float]]:
+    from carga import Medicoes, Utilizador
+    from autofill_campos import FIELDS_PART2
+
+    def texto(i: int) -> str:
+        return (f"Texto de exemplo {i}. " * (args.letras // 18 + 1))[: args.letras]
+
+    with ThreadPoolExecutor(max_workers=2) as http:
+        u = Utilizador(srv, Medicoes(), http, timeout=120.0)
+        try:
+            await u.abrir()
+            for f in FIELDS_PART2:
+                await u.escrever(f["key"], texto(0))
+            chave = FIELDS_PART2[len(FIELDS_PART2) // 2]["key"]
+            if chave not in u.fragmentos:
+                raise RuntimeError(f"o campo '{chave}' não está num fragmento")
+            tempos: Dict[str, List[float]] = {"fragmento": [], "completo": []}
+            for i in range(1, args.reruns + 1):
+                # Alterna a ordem para o ruído da máquina não favorecer nenhum dos dois.
+                for tipo in (("fragmento", "completo") if i % 2 else ("completo", "fragmento")):
+                    w = u._widget(chave, string_value=texto(2 * i + (tipo == "completo")))
+                    t0 = time.perf_counter()
+                    await u._rerun(w, fragmento=u.fragmentos[chave] if tipo == "fragmento" else "")
+                    tempos[tipo].append(time.perf_counter() - t0)
+            return tempos
+        finally:
+            await u.fechar()
+
+def main(argv: List[str] = None) -> Dict[str, float]:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--reruns", type=int, default=20)
+    ap.add_argument("--letras", type=int, default=2_000, help="texto em cada campo da Parte 2")
+    args = ap.parse_args(argv)
+
+    import openai_stub
+    from carga import Servidor
+
+    stub, url = openai_stub.start_stub()
+    with tempfile.TemporaryDirectory(prefix="cbiz_rerun_") as pasta:
+        srv = Servidor(Path(pasta), url)
+        try:
+            srv.esperar()
+            tempos = asyncio.run(medir(srv, args))
+        finally:
+            srv.parar()
+            stub.shutdown()
+    res = {
+        "completo_ms": mediana(tempos["completo"]) * 1e3,
+        "fragmento_ms": mediana(tempos["fragmento"]) * 1e3,
+    }
+    res["ganho"] = res["completo_ms"] / res["fragmento_ms"] if res["fragmento_ms"] else float("inf")
+    print(f"editar um campo, rerun do script inteiro: {res['completo_ms']:.1f} ms (mediana de {args.reruns})")
+    print(f"editar um campo, rerun do fragmento:      {res['fragmento_ms']:.1f} ms  → {res['ganho']:.1f}x mais rápido por edição")
+    return res
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+"""Teste de carga: N utilizadores simulados contra a app real (servidor Streamlit + stub da IA).
+
+    python benchmarks/carga.py                                   # 1, 2, 4 e 8 utilizadores
+    python benchmarks/carga.py --utilizadores 1 4 16 --latencia 0.8 --token-latencia 0.03 --erros 0.05
+    python benchmarks/carga.py --sem-streaming --pausa 0 --json carga.json
+
+Precisa de requirements-dev.txt (websockets e requests, além da app).
+
+Arranca o stub da OpenAI (openai_stub.py, com latência, intervalo entre tokens e fração de
+429 configuráveis) e um `streamlit run app_streamlit_integrado.py` noutro processo, apontado
+ao stub e com dossiers, blobs e cache de respostas numa pasta temporária. Cada utilizador
+liga-se como um browser (websocket em /_stcore/stream com as mensagens protobuf do
+Streamlit; uploads por HTTP) e percorre o fluxo: abrir a app, preencher a Parte 1, carregar
+um PDF, um DOCX e um XLSX, escolher "Ambos" como fonte, gerar e expandir secções da Parte 2
+e exportar e descarregar o DOCX. Os textos da Parte 1 e os documentos são diferentes em cada
+utilizador, para não medir o cache de respostas nem a fusão de pedidos iguais.
+
+Para cada nível de concorrência: débito (ações/s, fluxos/min), p50/p95/p99 de cada ação,
+erros, CPU e memória do servidor por sessão (de /proc, incluindo processos filhos). O
+servidor "degrada" no primeiro nível em que o p95 de uma ação passa --fator vezes o do
+nível mais baixo (com um piso de PISO_MS, para não contar ruído em ações de milissegundos)
+ou em que os erros passam --max-erros.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import zipfile
+import argparse
+import tempfile
+import subprocess
+from io import BytesIO
+from pathlib import Path
+from functools import lru_cache, partial
+from urllib.parse import urljoin
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RAIZ = Path(__file__).resolve().parent.parent
+APP = RAIZ / "app_streamlit_integrado.py"
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "benchmarks"))
+
+import requests
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+# Uma ação degradou quando o p95 passa FATOR × o do nível mais baixo; abaixo de PISO_MS
+# as diferenças são ruído da máquina (um rerun de 20 ms a passar a 45 ms não é degradação).
+FATOR = float(os.getenv("CBIZ_CARGA_FATOR", "2.0"))
+MAX_ERROS = float(os.getenv("CBIZ_CARGA_ERROS", "0.01"))
+PISO_MS = float(os.getenv("CBIZ_CARGA_PISO_MS", "100"))
+
+TERMINAIS = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+class ErroAcao(Exception):
+    """A ação terminou, mas a app mostrou uma exceção/erro ou o resultado não é o esperado."""
+
+# O que faz falhar uma ação (conta como erro dela) e acaba o fluxo desse utilizador.
+FALHAS = (ErroAcao, asyncio.TimeoutError, requests.RequestException, websockets.WebSocketException, OSError)
+
+# =========================
+#  🧪 FIXTURES
+# =========================
+def _marcar_zip(conteudo: bytes, marca: str) -> bytes:
+    """Acrescenta uma entrada ao zip (DOCX/XLSX): conteúdo diferente, mesmo documento."""
+    b = BytesIO(conteudo)
+    with zipfile.ZipFile(b, "a") as z:
+        z.writestr("cbiz-carga.txt", marca)
+    return b.getvalue()
+
+@lru_cache(maxsize=None)
+def _base_documentos(paginas: int) -> Tuple[bytes, bytes, bytes]:
+    from suite import gerar_docx, gerar_pdf, gerar_xlsx
+    return gerar_pdf(paginas), gerar_docx(200), gerar_xlsx(500)
+
+def documentos(marca: str, paginas: int) -> Dict[str, bytes]:
+    """PDF, DOCX e XLSX com um sha256 próprio por utilizador (sem dedupe nem cache de extração)."""
+    pdf, docx, xlsx = _base_documentos(paginas)
+    return {
+        "relatorio.pdf": pdf + f"% {marca}\n".encode(),  # depois do %%EOF: os leitores ignoram
+        "memoria.docx": _marcar_zip(docx, marca),
+        "contas.xlsx": _marcar_zip(xlsx, marca),
+    }
+
+# =========================
+#  🖥️ SERVIDOR (streamlit run + /proc)
+# =========================
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _descendentes(pid: int) -> List[int]:
+    pids, i = [pid], 0
+    while i < len(pids):
+        for tarefa in Path(f"/proc/{pids[i]}/task").glob("*/children"):
+            try:
+                pids += [int(p) for p in tarefa.read_text().split()]
+            except OSError:
+                pass
+        i += 1
+    return pids
+
+class Servidor:
+    """`streamlit run` da app num processo à parte, com CPU e RSS lidos de /proc."""
+
+    def __init__(self, pasta: Path, url_ia: str, porta: int = 0):
+        self.porta = porta or _porta_livre()
+        self.http = f"http://127.0.0.1:{self.porta}"
+        self.ws = f"ws://127.0.0.1:{self.porta}/_stcore/stream"
+        self.log = pasta / "servidor.log"
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": url_ia,
+            "CBIZ_DOSSIERS": str(pasta / "dossiers.sqlite"), "CBIZ_BLOBS": str(pasta / "blobs"),
+            "CBIZ_LLM_CACHE": str(pasta / "llm_cache.sqlite"),
+        }
+        cmd = [
+            sys.executable, "-m", "streamlit", "run", str(APP),
+            "--server.port", str(self.porta), "--server.address", "127.0.0.1", "--server.headless", "true",
+            "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false",
+        ]
+        self._log = open(self.log, "wb")
+        self.proc = subprocess.Popen(cmd, cwd=str(RAIZ), env=env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    def esperar(self, timeout: float = 60.0) -> float:
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < timeout:
+            if self.proc.poll() is not None:
+                break
+            try:
+                if requests.get(f"{self.http}/_stcore/health", timeout=1).ok:
+                    return time.perf_counter() - t0
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"o servidor não arrancou; últimas linhas de {self.log}:\n" + self.ultimas_linhas())
+
+    def ultimas_linhas(self, n: int = 20) -> str:
+        self._log.flush()
+        return "\n".join(self.log.read_text(errors="replace").splitlines()[-n:])
+
+    def cpu_s(self) -> float:
+        """Tempo de CPU (user + sys) do servidor e dos processos filhos vivos."""
+        total = 0
+        for pid in _descendentes(self.proc.pid):
+            try:
+                campos = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            total += int(campos[11]) + int(campos[12])  # utime, stime
+        return total / os.sysconf("SC_CLK_TCK")
+
+    def rss_mb(self) -> float:
+        total = 0
+        for pid in _descendentes(self.proc.pid):
+            try:
+                linhas = Path(f"/proc/{pid}/status").read_text().splitlines()
+            except OSError:
+                continue
+            total += next((int(l.split()[1]) for l in linhas if l.startswith("VmRSS:")), 0)
+        return total / 1024
+
+    def parar(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._log.close()
+
+# =========================
+#  👤 UTILIZADOR SIMULADO
+# =========================
+class Medicoes:
+    def __init__(self):
+        self.tempos: Dict[str, List[float]] = defaultdict(list)
+        self.erros: Counter = Counter()
+        self.exemplos: Dict[str, str] = {}
+        self.fluxos = 0
+
+    def registar(self, acao: str, segundos: Optional[float], erro: str = "") -> None:
+        if erro:
+            self.erros[acao] += 1
+            self.exemplos.setdefault(acao, erro[:200])
+        else:
+            self.tempos[acao].append(segundos)
+
+class Utilizador:
+    """Um browser: websocket com o servidor, estado dos widgets e chamadas HTTP (uploads, media)."""
+
+    def __init__(self, srv: Servidor, med: Medicoes, http: ThreadPoolExecutor, timeout: float):
+        self.srv, self.med, self.pool, self.timeout = srv, med, http, timeout
+        self.sessao = requests.Session()
+        self.session_id = ""
+        self.widgets: Dict[str, str] = {}     # chave do widget -> id
+        self.fragmentos: Dict[str, str] = {}  # chave do widget -> fragment_id
+        self.valores: Dict[str, str] = {}     # chave do text_area -> valor atual
+        self.media: Dict[str, str] = {}       # chave do download_button -> url
+        self.estado: Dict[str, WidgetState] = {}  # o que o browser reenvia em cada rerun
+        self.problemas: List[str] = []
+        self.conn = None
+
+    async def _http(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, partial(fn, *args, **kwargs))
+
+    def _processar(self, fm: ForwardMsg) -> None:
+        tipo = fm.WhichOneof("type")
+        if tipo == "new_session":
+            self.session_id = fm.new_session.initialize.session_id
+        elif tipo == "delta" and fm.delta.WhichOneof("type") == "new_element":
+            el = fm.delta.new_element
+            kind = el.WhichOneof("type")
+            if kind == "exception":
+                self.problemas.append(f"{el.exception.type}: {el.exception.message}")
+                return
+            if kind == "alert" and el.alert.format == Alert.ERROR:
+                self.problemas.append(el.alert.body)
+                return
+            w = getattr(el, kind, None)
+            wid = getattr(w, "id", "") if w is not None else ""
+            if not wid.startswith("$$ID-"):
+                return
+            chave = wid.split("-", 2)[2]  # $$ID-<hash>-<key>
+            self.widgets[chave] = wid
+            if fm.delta.fragment_id:
+                self.fragmentos[chave] = fm.delta.fragment_id
+            if kind == "text_area" and w.set_value:  # o servidor só manda o valor quando o mudou
+                self.valores[chave] = w.value
+            elif kind == "download_button":
+                self.media[chave] = w.url
+
+    async def _esperar(self, fim: Callable[[ForwardMsg], bool]) -> ForwardMsg:
+        async def ciclo():
+            while True:
+                fm = ForwardMsg()
+                fm.ParseFromString(await self.conn.recv())
+                self._processar(fm)
+                if fim(fm):
+                    return fm
+        return await asyncio.wait_for(ciclo(), self.timeout)
+
+    async def _rerun(self, *novos: WidgetState, fragmento: str = "") -> None:
+        msg = BackMsg()
+        cs = msg.rerun_script
+        cs.query_string = ""
+        gatilhos = [w for w in novos if w.WhichOneof("value") == "trigger_value"]
+        self.estado.update((w.id, w) for w in novos if w not in gatilhos)
+        cs.widget_states.widgets.extend([*self.estado.values(), *gatilhos])
+        if fragmento:
+            cs.fragment_id = fragmento
+        self.problemas = []
+        await self.conn.send(msg.SerializeToString())
+        fm = await self._esperar(lambda m: m.WhichOneof("type") == "script_finished"
+                                 and m.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN)
+        if fm.script_finished not in TERMINAIS:
+            raise ErroAcao(ForwardMsg.ScriptFinishedStatus.Name(fm.script_finished))
+        if self.problemas:
+            raise ErroAcao(self.problemas[0])
+
+    def _widget(self, chave: str, **valor) -> WidgetState:
+        if chave not in self.widgets:
+            raise ErroAcao(f"widget '{chave}' não apareceu na página")
+        w = WidgetState(id=self.widgets[chave])
+        for campo, v in valor.items():
+            setattr(w, campo, v)
+        return w
+
+    async def acao(self, nome: str, coro) -> None:
+        t0 = time.perf_counter()
+        try:
+            await coro
+        except FALHAS as e:
+            self.med.registar(nome, None, f"{type(e).__name__}: {e}")
+            raise
+        self.med.registar(nome, time.perf_counter() - t0)
+
+    # --- ações (o que um utilizador faz na página) ---
+    async def abrir(self) -> None:
+        self.conn = await websockets.connect(self.srv.ws, subprotocols=["streamlit"], max_size=None)
+        await self._rerun()
+
+    async def escrever(self, chave: str, texto: str) -> None:
+        await self._rerun(self._widget(chave, string_value=texto), fragmento=self.fragmentos.get(chave, ""))
+
+    async def alternar(self, chave: str, ligado: bool) -> None:
+        await self._rerun(self._widget(chave, bool_value=ligado), fragmento=self.fragmentos.get(chave, ""))
+
+    async def clicar(self, chave: str) -> None:
+        await self._rerun(self._widget(chave, trigger_value=True), fragmento=self.fragmentos.get(chave, ""))
+
+    async def carregar(self, chave: str, ficheiros: Dict[str, bytes]) -> None:
+        w = self._widget(chave)
+        pedido = uuid.uuid4().hex
+        msg = BackMsg()
+        msg.file_urls_request.request_id = pedido
+        msg.file_urls_request.session_id = self.session_id
+        msg.file_urls_request.file_names.extend(ficheiros)
+        await self.conn.send(msg.SerializeToString())
+        fm = await self._esperar(lambda m: m.WhichOneof("type") == "file_urls_response"
+                                 and m.file_urls_response.response_id == pedido)
+        if fm.file_urls_response.error_msg:
+            raise ErroAcao(fm.file_urls_response.error_msg)
+        for (nome, dados), urls in zip(ficheiros.items(), fm.file_urls_response.file_urls):
+            r = await self._http(self.sessao.put, urljoin(self.srv.http, urls.upload_url),
+                                 files={"file": (nome, dados)}, timeout=self.timeout)
+            r.raise_for_status()
+            w.file_uploader_state_value.uploaded_file_info.append(
+                UploadedFileInfo(name=nome, size=len(dados), file_id=urls.file_id, file_urls=urls)
+            )
+        await self._rerun(w)
+
+    async def gerar(self, chave: str, botao: str) -> None:
+        antes = self.valores.get(chave, "")
+        await self.clicar(botao)
+        depois = self.valores.get(chave, "")
+        if not depois.strip() or depois == antes:
+            raise ErroAcao(f"o campo '{chave}' ficou sem texto novo")
+
+    async def descarregar(self, chave: str) -> None:
+        if chave not in self.media:
+            raise ErroAcao(f"sem botão de download '{chave}'")
+        r = await self._http(self.sessao.get, urljoin(self.srv.http, self.media[chave]), timeout=self.timeout)
+        r.raise_for_status()
+        if not r.content.startswith(b"PK"):
+            raise ErroAcao("o ficheiro descarregado não é um DOCX")
+
+    async def fechar(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+        self.sessao.close()
+
+async def fluxo(u: Utilizador, marca: str, args, seccoes: List[str], parte1: List[Dict[str, str]]) -> None:
+    """Um dossier do princípio ao fim, com uma pausa "humana" (±50%) entre ações."""
+    async def pausa():
+        if args.pausa:
+            await asyncio.sleep(args.pausa * random.uniform(0.5, 1.5))
+
+    docs = await asyncio.get_running_loop().run_in_executor(u.pool, documentos, marca, args.paginas)
+    await u.acao("abrir", u.abrir())
+    if args.sem_streaming:
+        await u.acao("preferencias", u.alternar("ia_streaming", False))
+    for f in parte1:
+        await pausa()
+        await u.acao("parte1", u.escrever(f["key"], f"{f['label']} do dossier {marca}"))
+    await pausa()
+    await u.acao("upload", u.carregar("uploads_sec2", docs))
+    for i, chave in enumerate(seccoes):
+        await pausa()
+        await u.acao("fonte", u.escrever(f"modo_{chave}", "Ambos"))
+        await pausa()
+        await u.acao("gerar", u.gerar(chave, f"btn_{chave}_gerar"))
+        if i < args.expandir:
+            await pausa()
+            await u.acao("expandir", u.gerar(chave, f"btn_{chave}_expandir"))
+    await pausa()
+    await u.acao("exportar_docx", u.clicar("btn_exportar_docx"))
+    await u.acao("descarregar_docx", u.descarregar("btn_descarregar_docx"))
+    u.med.fluxos += 1
+
+# =========================
+#  📈 NÍVEIS E RELATÓRIO
+# =========================
+def percentil(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else 0.0
+
+async def nivel(srv: Servidor, n: int, args, seccoes: List[str], parte1: List[Dict[str, str]]) -> Dict[str, Any]:
+    med = Medicoes()
+    cpu0, rss0 = srv.cpu_s(), srv.rss_mb()
+    pico = rss0
+    a_correr = True
+
+    async def amostrar():
+        nonlocal pico
+        while a_correr:
+            pico = max(pico, srv.rss_mb())
+            await asyncio.sleep(0.25)
+
+    async def utilizador(i: int):
+        await asyncio.sleep(random.uniform(0, args.pausa))  # não chegam todos no mesmo milissegundo
+        for k in range(args.fluxos):
+            u = Utilizador(srv, med, pool, args.timeout)
+            try:
+                await fluxo(u, f"n{n}-u{i}-f{k}-{uuid.uuid4().hex[:6]}", args, seccoes, parte1)
+            except FALHAS:
+                pass  # já contado na ação que falhou; este fluxo fica por aqui
+            finally:
+                await u.fechar()
+
+    with ThreadPoolExecutor(max_workers=max(4, 2 * n)) as pool:
+        t0 = time.perf_counter()
+        tarefa = asyncio.create_task(amostrar())
+        await asyncio.gather(*(utilizador(i) for i in range(n)))
+        parede = time.perf_counter() - t0
+        a_correr = False
+        await tarefa
+    cpu = srv.cpu_s() - cpu0
+    feitas = sum(len(v) for v in med.tempos.values())
+    erros = sum(med.erros.values())
+    acoes = {
+        a: {"n": len(t), "erros": med.erros.get(a, 0), "p50_ms": percentil(t, 50) * 1e3,
+            "p95_ms": percentil(t, 95) * 1e3, "p99_ms": percentil(t, 99) * 1e3}
+        for a, t in med.tempos.items()
+    }
+    for a in med.erros:
+        acoes.setdefault(a, {"n": 0, "erros": med.erros[a], "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0})
+    return {
+        "utilizadores": n, "parede_s": parede, "fluxos": med.fluxos,
+        "acoes_s": feitas / parede, "fluxos_min": med.fluxos / parede * 60,
+        "erros": erros, "taxa_erros": erros / max(1, feitas + erros), "exemplos_erro": med.exemplos,
+        "cpu_s": cpu, "cpu_pct": cpu / parede * 100, "cpu_s_fluxo": cpu / max(1, n * args.fluxos),
+        "rss_inicio_mb": rss0, "rss_pico_mb": pico, "rss_fim_mb": srv.rss_mb(),
+        "rss_mb_sessao": (pico - rss0) / n, "acoes": acoes,
+    }
+
+def degradacao(niveis: List[Dict[str, Any]], fator: float, max_erros: float) -> Optional[Dict[str, Any]]:
+    """Primeiro nível com p95 > fator × o do nível mais baixo (por ação) ou erros > max_erros."""
+    base = niveis[0]["acoes"]
+    for r in niveis[1:]:
+        if r["taxa_erros"] > max_erros:
+            return {"utilizadores": r["utilizadores"], "motivo": f"erros {r['taxa_erros']:.1%} > {max_erros:.0%}"}
+        piores = [
+            (r["acoes"][a]["p95_ms"] / max(base[a]["p95_ms"], PISO_MS), a)
+            for a in r["acoes"] if a in base and base[a]["n"] and r["acoes"][a]["n"]
+        ]
+        razao, acao = max(piores, default=(0.0, ""))
+        if razao > fator:
+            return {"utilizadores": r["utilizadores"],
+                    "motivo": f"p95 de '{acao}' {razao:.1f}× o de {niveis[0]['utilizadores']} utilizador(es)"}
+    return None
+
+def imprimir(niveis: List[Dict[str, Any]], deg: Optional[Dict[str, Any]], fator: float) -> None:
+    print(f"\n{'utilizadores':>12} {'ações/s':>8} {'fluxos/min':>10} {'erros':>6} {'CPU %':>6} "
+          f"{'CPU s/fluxo':>11} {'RSS MB/sessão':>13} {'RSS pico MB':>11}")
+    for r in niveis:
+        print(f"{r['utilizadores']:>12} {r['acoes_s']:>8.2f} {r['fluxos_min']:>10.1f} {r['erros']:>6} "
+              f"{r['cpu_pct']:>6.0f} {r['cpu_s_fluxo']:>11.2f} {r['rss_mb_sessao']:>13.1f} {r['rss_pico_mb']:>11.0f}")
+    acoes = list(dict.fromkeys(a for r in niveis for a in r["acoes"]))
+    print(f"\n{'ação':<18} " + " ".join(f"{str(r['utilizadores']) + ' utiliz. p50/p95/p99 ms':>28}" for r in niveis))
+    for a in acoes:
+        celulas = []
+        for r in niveis:
+            x = r["acoes"].get(a)
+            celulas.append(f"{x['p50_ms']:>8.0f} {x['p95_ms']:>8.0f} {x['p99_ms']:>8.0f}" + ("!" if x["erros"] else " ")
+                           if x else " " * 27)
+        print(f"{a:<18} " + " ".join(f"{c:>28}" for c in celulas))
+    for r in niveis:
+        for a, e in r["exemplos_erro"].items():
+            print(f"  ! {r['utilizadores']} utiliz., {a}: {e}")
+    if deg:
+        print(f"\nO servidor degrada a partir de {deg['utilizadores']} utilizadores simultâneos ({deg['motivo']}).")
+    else:
+        print(f"\nSem degradação até {niveis[-1]['utilizadores']} utilizadores (p95 ≤ {fator:g}× e erros ≤ limite).")
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--utilizadores", type=int, nargs="+", default=[1, 2, 4, 8], help="níveis de concorrência")
+    ap.add_argument("--fluxos", type=int, default=2, help="dossiers completos por utilizador em cada nível")
+    ap.add_argument("--seccoes", type=int, default=3, help="secções da Parte 2 geradas por fluxo")
+    ap.add_argument("--expandir", type=int, default=1, help="quantas dessas secções são também expandidas")
+    ap.add_argument("--paginas", type=int, default=20, help="páginas do PDF carregado")
+    ap.add_argument("--pausa", type=float, default=0.5, help="segundos (em média) entre ações de um utilizador")
+    ap.add_argument("--latencia", type=float, default=0.3, help="stub: segundos até ao 1.º token")
+    ap.add_argument("--token-latencia", type=float, default=0.02, help="stub: segundos entre tokens")
+    ap.add_argument("--erros", type=float, default=0.0, help="stub: fração de respostas 429")
+    ap.add_argument("--sem-streaming", action="store_true", help="desliga o streaming na app (pedido único)")
+    ap.add_argument("--timeout", type=float, default=120.0, help="segundos por ação")
+    ap.add_argument("--fator", type=float, default=FATOR)
+    ap.add_argument("--max-erros", type=float, default=MAX_ERROS)
+    ap.add_argument("--sem-aquecimento", action="store_true", help="o 1.º nível paga também o arranque da app")
+    ap.add_argument("--porta", type=int, default=0)
+    ap.add_argument("--json", help="escreve o resultado completo em JSON ('-' = stdout)")
+    args = ap.parse_args(argv)
+
+    import openai_stub
+    from autofill_campos import FIELDS_PART1, FIELDS_PART2
+
+    seccoes = [f["key"] for f in FIELDS_PART2[: args.seccoes]]
+    stub, url = openai_stub.start_stub(latency=args.latencia, token_latency=args.token_latencia,
+                                       error_rate=args.erros, retry_after=0.5)
+    with tempfile.TemporaryDirectory(prefix="cbiz_carga_") as pasta:
+        srv = Servidor(Path(pasta), url, args.porta)
+        try:
+            arranque = srv.esperar()
+            print(f"Servidor em {srv.http} (pronto em {arranque:.1f}s), stub da IA em {url}: "
+                  f"latência {args.latencia:g}s, {args.token_latencia * 1e3:g} ms/token, {args.erros:.0%} de 429.")
+            if not args.sem_aquecimento:
+                # Os imports preguiçosos da app (pandas, python-docx, extratores) e os caches do
+                # Streamlit pagam-se uma vez por servidor: fora das medições do primeiro nível.
+                t0 = time.perf_counter()
+                asyncio.run(nivel(srv, 1, args, seccoes, FIELDS_PART1))
+                print(f"Aquecimento (um fluxo, não conta): {time.perf_counter() - t0:.1f}s, RSS {srv.rss_mb():.0f} MB.")
+            niveis = []
+            for n in sorted(set(args.utilizadores)):
+                print(f"… {n} utilizador(es)", flush=True)
+                niveis.append(asyncio.run(nivel(srv, n, args, seccoes, FIELDS_PART1)))
+            if srv.proc.poll() is not None:
+                print("O servidor terminou a meio:\n" + srv.ultimas_linhas(), file=sys.stderr)
+        finally:
+            srv.parar()
+            stub.shutdown()
+    deg = degradacao(niveis, args.fator, args.max_erros)
+    imprimir(niveis, deg, args.fator)
+    if args.json:
+        res = json.dumps({"args": vars(args), "niveis": niveis, "degradacao": deg}, ensure_ascii=False, indent=2)
+        if args.json == "-":
+            print(res)
+        else:
+            Path(args.json).write_text(res, encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""Suite de micro-benchmarks dos caminhos quentes, com baseline e limiar de regressão.
+
+    python benchmarks/suite.py                              # corre tudo e compara com a baseline
+    python benchmarks/suite.py --filtro extract --limiar 0.5
+    python benchmarks/suite.py --rapido --json -            # tamanhos pequenos, resultado JSON no stdout
+    python benchmarks/suite.py --gravar-baseline            # a medição atual passa a ser a referência
+
+Cada caso é cronometrado em várias amostras (cada amostra com chamadas suficientes para
+≥ --amostra-ms) e compara-se a mediana por chamada, menos sensível do que o melhor tempo a
+uma amostra com sorte (na baseline) ou azar. Um caso regride quando fica mais de
+--limiar acima da baseline (e mais de --minimo-us em absoluto); havendo regressões o
+processo termina com código 1. Os resultados vão, em JSON, para --json e são acrescentados
+a --historico (uma linha por execução, com o commit) para seguir a tendência.
+
+Antes dos casos mede-se o import a frio de cada módulo num interpretador novo, contra um
+orçamento fixo (ORCAMENTO_IMPORT_MS), e confirma-se que a app não importa pandas, openai,
+pypdf, python-docx nem openpyxl só por arrancar (--sem-arranque salta esta parte).
+
+A IA é o stub local (openai_stub.py, sem latência e sem cache de respostas): o que se mede é
+o nosso lado (prompt, cliente, parsing), de forma determinística e sem rede. A baseline só é
+comparável na mesma máquina; noutra, gravar uma nova.
+"""
+import gc
+import io
+import os
+import re
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "benchmarks"))
+
+BASELINE = RAIZ / "benchmarks" / "baseline.json"
+HISTORICO = RAIZ / ".cbiz_cache" / "bench_historico.jsonl"
+# Numa VM partilhada de 1 vCPU o mesmo caso varia ±30% entre execuções; em máquinas
+# dedicadas pode baixar-se (CBIZ_BENCH_LIMIAR=0.15).
+LIMIAR = float(os.getenv("CBIZ_BENCH_LIMIAR", "0.5"))
+MINIMO_US = 50.0
+
+# =========================
+#  🧪 FIXTURES
+# =========================
+def gerar_pdf(paginas: int, linhas: int = 40) -> bytes:
+    """PDF mínimo (Helvetica, texto simples) escrito à mão: não precisa de bibliotecas de escrita."""
+    objs = [
+        (1, "<< /Type /Catalog /Pages 2 0 R >>"),
+        (3, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ]
+    kids = []
+    for p in range(paginas):
+        texto = "BT /F1 10 Tf 50 750 Td 12 TL " + " ".join(
+            f"(Pagina {p + 1} linha {l}: volume de vendas e margem do projeto) '" for l in range(linhas)
+        ) + " ET"
+        cid, pid = 4 + 2 * p, 5 + 2 * p
+        objs.append((cid, f"<< /Length {len(texto)} >>\nstream\n{texto}\nendstream"))
+        objs.append((pid, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {cid} 0 R "
+                          "/Resources << /Font << /F1 3 0 R >> >> >>"))
+        kids.append(f"{pid} 0 R")
+    objs.append((2, f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {paginas} >>"))
+    objs.sort()
+    out, offsets = b"%PDF-1.4\n", []
+    for i, conteudo in objs:
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{conteudo}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def gerar_docx(paragrafos: int) -> bytes:
+    from docx import Document
+    doc = Document()
+    for i in range(paragrafos):
+        doc.add_paragraph(f"Parágrafo {i}: descrição do mercado, concorrência e estratégia comercial do projeto.")
+    b = io.BytesIO()
+    doc.save(b)
+    return b.getvalue()
+
+def gerar_xlsx(linhas: int, colunas: int = 6) -> bytes:
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Contas")
+    ws.append(["conta"] + [f"m{j}" for j in range(1, colunas)])
+    for i in range(linhas):
+        ws.append([f"Conta {i}"] + [float(i * j) + 0.5 for j in range(1, colunas)])
+    b = io.BytesIO()
+    wb.save(b)
+    return b.getvalue()
+
+class Upload(io.BytesIO):
+    """Imita o UploadedFile do Streamlit (name, size, file_id, getvalue)."""
+    def __init__(self, nome: str, conteudo: bytes):
+        super().__init__(conteudo)
+        self.name, self.size, self.file_id = nome, len(conteudo), f"{nome}-{len(conteudo)}"
+
+# =========================
+#  📋 CASOS
+# =========================
+class Caso:
+    """`preparar()` devolve a função (sem argumentos) a cronometrar; `antes` corre antes de
+    cada chamada, fora do tempo (ex.: limpar o cache de extração)."""
+
+    def __init__(self, nome: str, preparar: Callable[[], Callable[[], Any]], antes: Optional[Callable[[], None]] = None, **params):
+        self.nome, self.preparar, self.antes, self.params = nome, preparar, antes, params
+
+def casos(rapido: bool = False) -> List[Caso]:
+    from bench_financeiros import ASSUM, gerar_dados
+    from bench_docx import gerar_tabela
+    from autofill_core import build_docx
+    from autofill_core_bp import build_docx_bp, build_xlsx_bp, calcular_financeiros, cortar, gerar_texto_ia
+    from autofill_extract import (
+        clear_extraction_cache, extract_text_from_docx, extract_text_from_pdf, extract_text_from_xlsx,
+    )
+    from autofill_llm import get_openai_client, stream_completion
+    import app_streamlit_integrado as app
+
+    out: List[Caso] = []
+    tmp = tempfile.mkdtemp(prefix="cbiz_bench_")
+
+    def financeiros(n, n_anos):
+        dados, anos = gerar_dados(n), list(range(2025, 2025 + n_anos))
+        return lambda: calcular_financeiros(anos, ASSUM, *dados)
+    for n in ([10, 1_000] if rapido else [10, 1_000, 10_000]):
+        for n_anos in (3, 10):
+            out.append(Caso(f"calcular_financeiros[{n}x{n_anos}]", lambda n=n, a=n_anos: financeiros(n, a), linhas=n, anos=n_anos))
+
+    def docx_bp(n):
+        tabs = {f"tabela {k}": gerar_tabela(n, 5) for k in range(4)}
+        textos = {f"Secção {k}": "Texto da secção. " * 60 for k in range(6)}
+        destino = os.path.join(tmp, f"bp_{n}.docx")
+        return lambda: build_docx_bp({}, tabs, textos, destino)
+    def docx_core(n):
+        tabs = {f"tabela {k}": gerar_tabela(n, 3) for k in range(4)}
+        cfg = {"identificacao": {"empresa": "Exemplo, Lda.", "nif": "500000000"}}
+        destino = os.path.join(tmp, f"core_{n}.docx")
+        return lambda: build_docx(cfg, tabs, destino)
+    def xlsx_bp(n):
+        dados, anos = gerar_dados(n), list(range(2025, 2035))
+        tabs = calcular_financeiros(anos, ASSUM, *dados)
+        destino = os.path.join(tmp, f"bp_{n}.xlsx")
+        return lambda: build_xlsx_bp(tabs, destino, assum=ASSUM)
+    for n in ([10, 100] if rapido else [10, 100, 1_000]):
+        out.append(Caso(f"build_docx_bp[{n}]", lambda n=n: docx_bp(n), linhas=n))
+        out.append(Caso(f"build_xlsx_bp[{n}]", lambda n=n: xlsx_bp(n), linhas=n))
+        out.append(Caso(f"build_docx[{n}]", lambda n=n: docx_core(n), linhas=n))
+
+    # Extração sem cache: mede o extrator, não o LRU.
+    for n in ([1, 10] if rapido else [1, 10, 50]):
+        out.append(Caso(f"extract_pdf[{n}p]", lambda n=n: (lambda b=gerar_pdf(n): extract_text_from_pdf(b)), clear_extraction_cache, paginas=n))
+    for n in ([100, 1_000] if rapido else [100, 1_000, 5_000]):
+        out.append(Caso(f"extract_docx[{n}]", lambda n=n: (lambda b=gerar_docx(n): extract_text_from_docx(b)), clear_extraction_cache, paragrafos=n))
+    for n in ([100, 1_000] if rapido else [100, 1_000, 20_000]):
+        out.append(Caso(f"extract_xlsx[{n}]", lambda n=n: (lambda b=gerar_xlsx(n): extract_text_from_xlsx(b)), clear_extraction_cache, linhas=n))
+
+    # Contexto por campo, em regime estável (índice/texto já na sessão, como entre cliques).
+    def contexto(paginas, consulta):
+        sessao = {k: f"Valor de {k} " * 20 for k in app.CAMPOS_BASE.values()}
+        ficheiros = [Upload("dossier.pdf", gerar_pdf(paginas)), Upload("notas.docx", gerar_docx(paginas * 20))]
+        app.build_context("Ambos", sessao, ficheiros, consulta)
+        return lambda: app.build_context("Ambos", sessao, ficheiros, consulta)
+    for n in ([5] if rapido else [5, 50]):
+        out.append(Caso(f"build_context[{n}p]", lambda n=n: contexto(n, ""), paginas=n))
+        out.append(Caso(f"build_context_bm25[{n}p]", lambda n=n: contexto(n, "Análise de mercado: volume de vendas e margem"), paginas=n))
+    grande = "Texto longo do documento de suporte. " * 30_000
+    out.append(Caso("truncate[1MB]", lambda: (lambda: app.truncate(grande)), letras=len(grande)))
+    out.append(Caso("cortar[1MB]", lambda: (lambda: cortar(grande, 20_000)), letras=len(grande)))
+    out.append(Caso("cortar[curto]", lambda: (lambda: cortar("Resumo do projeto em poucas palavras. " * 20, 300)), letras=760))
+
+    # IA pelo stub: prompt + cliente + HTTP local + parsing.
+    ctx_ia = {"empresa": "Exemplo, Lda.", "setor": "Restauração", "resumo": "Texto " * 200}
+    out.append(Caso("gerar_texto_ia[stub]", lambda: (lambda: gerar_texto_ia("Análise de mercado", "Sê concreto.", ctx_ia))))
+    def stream():
+        msgs = [{"role": "user", "content": "Descreve o mercado. " * 50}]
+        return lambda: "".join(stream_completion(get_openai_client(), "stub", msgs, 0.4))
+    out.append(Caso("stream_completion[stub]", stream))
+    return out
+
+# =========================
+#  🚀 ARRANQUE (import a frio)
+# =========================
+# Cada módulo é importado num interpretador novo (python -X importtime) e o tempo acumulado
+# tem de caber no orçamento, multiplicado por CBIZ_BENCH_ARRANQUE_FATOR em máquinas lentas.
+# Além do tempo, verifica-se que as bibliotecas pesadas continuam a ser importadas só a pedido.
+ORCAMENTO_IMPORT_MS: Dict[str, float] = {
+    "app_streamlit_integrado": 1_000,   # quase tudo é o próprio streamlit (~250 ms a quente)
+    "autofill_core": 150,
+    "autofill_core_bp": 1_500,          # numpy + pandas, que o cálculo usa sempre
+    "autofill_llm": 100,
+    "autofill_extract": 100,
+    "autofill_retrieval": 50,
+    "autofill_trace": 30,
+    "autofill_arranque": 30,
+    "autofill_dossiers": 30,
+}
+PESADOS = ("pandas", "numpy", "openai", "pypdf", "docx", "openpyxl")
+SO_A_PEDIDO: Dict[str, Sequence[str]] = {
+    "app_streamlit_integrado": PESADOS,
+    "autofill_core": PESADOS,
+    "autofill_llm": PESADOS,
+    "autofill_extract": PESADOS,
+    "autofill_core_bp": ("openai", "pypdf", "docx", "openpyxl"),
+}
+FATOR_ARRANQUE = float(os.getenv("CBIZ_BENCH_ARRANQUE_FATOR", "1"))
+
+def medir_import(modulo: str, repeticoes: int = 3) -> Dict[str, Any]:
+    codigo = f"import sys, json; import {modulo}; print(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))"
+    tempos, importados = [], []
+    for _ in range(repeticoes):
+        p = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo], cwd=RAIZ, capture_output=True, text=True,
+            env={**os.environ, "PYTHONPATH": str(RAIZ)}, timeout=120,
+        )
+        if p.returncode != 0:
+            raise RuntimeError(f"import {modulo} falhou: {p.stderr.strip().splitlines()[-1:]}")
+        # "import time: self [us] | cumulative | nome"; a linha do próprio módulo não tem indentação.
+        for linha in p.stderr.splitlines():
+            partes = linha.split("|")
+            if len(partes) == 3 and partes[2].rstrip() == f" {modulo}":
+                tempos.append(int(partes[1]) / 1e6)
+        importados = json.loads(p.stdout.strip().splitlines()[-1])
+    tempos.sort()
+    orcamento = ORCAMENTO_IMPORT_MS[modulo] * FATOR_ARRANQUE / 1e3
+    proibidos = sorted(set(importados) & set(SO_A_PEDIDO.get(modulo, ())))
+    return {
+        "numero": 1, "amostras": repeticoes, "min_s": tempos[0], "mediana_s": tempos[len(tempos) // 2],
+        "max_s": tempos[-1], "orcamento_s": orcamento, "importados": importados, "proibidos": proibidos,
+        "estado": "orcamento" if tempos[len(tempos) // 2] > orcamento or proibidos else "ok",
+    }
+
+# =========================
+#  ⏱️ MEDIÇÃO
+# =========================
+def medir(caso: Caso, amostras: int, amostra_ms: float) -> Dict[str, Any]:
+    fn = caso.preparar()
+    if caso.antes:
+        caso.antes()
+    t0 = time.perf_counter()
+    fn()  # aquecimento (imports, caches de módulos) e calibração
+    uma = time.perf_counter() - t0
+    numero = 1 if caso.antes else max(1, int(amostra_ms / 1e3 / max(uma, 1e-9)))
+    tempos = []
+    for _ in range(amostras):
+        total = 0.0
+        gc.collect()
+        gc.disable()  # uma recolha a meio de uma amostra pesa mais do que o próprio caso
+        try:
+            for _ in range(numero):
+                if caso.antes:
+                    caso.antes()
+                t0 = time.perf_counter()
+                fn()
+                total += time.perf_counter() - t0
+        finally:
+            gc.enable()
+        tempos.append(total / numero)
+    tempos.sort()
+    return {
+        **caso.params, "numero": numero, "amostras": amostras,
+        "min_s": tempos[0], "mediana_s": tempos[len(tempos) // 2], "max_s": tempos[-1],
+    }
+
+def comparar(atual: Dict[str, Any], base: Dict[str, Any], limiar: float, minimo_us: float) -> Dict[str, Any]:
+    if base is None:
+        return {"estado": "novo"}
+    a, b = atual["mediana_s"], base["mediana_s"]
+    rel = a / b - 1 if b else 0.0
+    if rel > limiar and (a - b) * 1e6 > minimo_us:
+        estado = "regressao"
+    elif rel < -limiar and (b - a) * 1e6 > minimo_us:
+        estado = "melhoria"
+    else:
+        estado = "ok"
+    return {"estado": estado, "baseline_s": b, "variacao": rel}
+
+def _commit() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, timeout=10)
+        sujo = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ, capture_output=True, text=True, timeout=10)
+        return {"commit": rev.stdout.strip() or None, "alteracoes_locais": bool(sujo.stdout.strip())}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "alteracoes_locais": None}
+
+def _maquina() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()}
+
+def _fmt(s: float) -> str:
+    return f"{s * 1e3:.2f} ms" if s >= 1e-3 else f"{s * 1e6:.1f} µs"
+
+def _linha(nome: str, r: Dict[str, Any], saida) -> None:
+    b = _fmt(r["baseline_s"]) if "baseline_s" in r else "—"
+    v = f"{r['variacao']:+.0%}" if "variacao" in r else "—"
+    print(f"{nome:<32} {_fmt(r['min_s']):>12} {_fmt(r['mediana_s']):>12} {b:>12} {v:>9}  {r['estado']}", file=saida)
+
+def _stub_ia() -> None:
+    # Antes de importar autofill_llm: o cache de respostas é decidido no import.
+    import openai_stub
+    _, url = openai_stub.start_stub(latency=0.0)
+    os.environ.update(OPENAI_API_KEY="stub", OPENAI_BASE_URL=url, CBIZ_LLM_CACHE="0", CBIZ_TRACE="0")
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--filtro", help="regex sobre o nome dos casos")
+    ap.add_argument("--rapido", action="store_true", help="só os tamanhos pequenos")
+    ap.add_argument("--sem-arranque", action="store_true", help="não mede o import a frio dos módulos")
+    ap.add_argument("--amostras", type=int, default=7)
+    ap.add_argument("--amostra-ms", type=float, default=50.0, help="duração mínima de cada amostra")
+    ap.add_argument("--limiar", type=float, default=LIMIAR, help="abrandamento relativo tolerado (0.5 = +50%%)")
+    ap.add_argument("--minimo-us", type=float, default=MINIMO_US, help="diferenças absolutas abaixo disto não contam")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--gravar-baseline", action="store_true")
+    ap.add_argument("--json", help="escreve o resultado completo em JSON ('-' = stdout)")
+    ap.add_argument("--historico", default=str(HISTORICO), help="JSONL onde cada execução é acrescentada ('' = nenhum)")
+    args = ap.parse_args(argv)
+
+    base = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {"casos": {}}
+    saida = sys.stderr if args.json == "-" else sys.stdout
+
+    arranque: Dict[str, Any] = {}
+    modulos = [] if args.sem_arranque else [m for m in ORCAMENTO_IMPORT_MS if not args.filtro or re.search(args.filtro, f"import[{m}]")]
+    if modulos:
+        print(f"{'import a frio':<32} {'mediana':>12} {'orçamento':>12}  estado", file=saida)
+    for m in modulos:
+        r = arranque[f"import[{m}]"] = medir_import(m)
+        extra = f" (importou {', '.join(r['proibidos'])})" if r["proibidos"] else ""
+        print(f"{'import[' + m + ']':<32} {_fmt(r['mediana_s']):>12} {_fmt(r['orcamento_s']):>12}  {r['estado']}{extra}", file=saida)
+
+    _stub_ia()
+    selecionados = [c for c in casos(args.rapido) if not args.filtro or re.search(args.filtro, c.nome)]
+    resultados: Dict[str, Any] = {}
+    if selecionados:
+        print(f"{'caso':<32} {'melhor':>12} {'mediana':>12} {'baseline':>12} {'variação':>9}  estado", file=saida)
+    for caso in selecionados:
+        r = medir(caso, args.amostras, args.amostra_ms)
+        r.update(comparar(r, base["casos"].get(caso.nome), args.limiar, args.minimo_us))
+        resultados[caso.nome] = r
+        _linha(caso.nome, r, saida)
+    # Confirmação no fim: os abrandamentos da máquina duram segundos, por isso a segunda
+    # medição fica afastada da primeira e conta a melhor das duas. Ao gravar a baseline
+    # medem-se todos duas vezes e guarda-se a média, nem a medição de sorte nem a de azar.
+    suspeitos = [c for c in selecionados if args.gravar_baseline or resultados[c.nome]["estado"] == "regressao"]
+    if suspeitos:
+        print(f"a confirmar {len(suspeitos)} caso(s)…", file=saida)
+    for caso in suspeitos:
+        r, r1 = medir(caso, args.amostras, args.amostra_ms), resultados[caso.nome]
+        if args.gravar_baseline:
+            r = {**r, "min_s": min(r["min_s"], r1["min_s"]), "mediana_s": (r["mediana_s"] + r1["mediana_s"]) / 2}
+        elif r["mediana_s"] >= r1["mediana_s"]:
+            r = r1
+        r.update(comparar(r, base["casos"].get(caso.nome), args.limiar, args.minimo_us))
+        r["confirmado"] = r["estado"] == "regressao"
+        resultados[caso.nome] = r
+        _linha(caso.nome, r, saida)
+
+    relatorio = {
+        **_commit(), "data": time.strftime("%Y-%m-%dT%H:%M:%S"), "maquina": _maquina(),
+        "limiar": args.limiar, "casos": resultados, "arranque": arranque,
+    }
+    regressoes = [n for n, r in resultados.items() if r["estado"] == "regressao"]
+    fora_orcamento = [n for n, r in arranque.items() if r["estado"] == "orcamento"]
+    relatorio["regressoes"] = regressoes
+    relatorio["fora_orcamento"] = fora_orcamento
+    if base.get("maquina") and base["maquina"] != relatorio["maquina"]:
+        print("aviso: a baseline foi gravada noutra máquina; os tempos podem não ser comparáveis.", file=saida)
+
+    if args.json == "-":
+        print(json.dumps(relatorio, ensure_ascii=False, indent=1))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(relatorio, ensure_ascii=False, indent=1), encoding="utf-8")
+    if args.historico:
+        Path(args.historico).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.historico, "a", encoding="utf-8") as f:
+            f.write(json.dumps(relatorio, ensure_ascii=False) + "\n")
+    if args.gravar_baseline:
+        casos_base = {**base["casos"], **{n: {k: r[k] for k in ("min_s", "mediana_s")} for n, r in resultados.items()}}
+        args.baseline.write_text(json.dumps(
+            {"commit": relatorio["commit"], "data": relatorio["data"], "maquina": relatorio["maquina"], "casos": casos_base},
+            ensure_ascii=False, indent=1, sort_keys=True,
+        ) + "\n", encoding="utf-8")
+        print(f"baseline gravada em {args.baseline} ({len(resultados)} casos).", file=saida)
+        return 0
+    if fora_orcamento:
+        print(f"arranque fora do orçamento: {', '.join(fora_orcamento)}", file=saida)
+    if regressoes:
+        print(f"{len(regressoes)} regressão(ões) acima de {args.limiar:.0%}: {', '.join(regressoes)}", file=saida)
+    return 1 if regressoes or fora_orcamento else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Servidor local compatível com a API OpenAI (só /v1/chat/completions), para testes.
+
+    python openai_stub.py --port 8089 --latency 0.5
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8089/v1 streamlit run app_streamlit_integrado.py
+
+As respostas são determinísticas (dependem só do prompt) e nada sai da máquina.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+
+def resposta_simulada(messages) -> str:
+    user = next((m.get("content", "") for m in reversed(messages or []) if m.get("role") == "user"), "")
+    # Primeira linha de conteúdo (os prompts da app começam com cabeçalhos "# …").
+    primeira = next((l.strip() for l in str(user).splitlines() if l.strip() and not l.startswith("#")), "")
+    return f"[stub] Texto gerado para: {primeira[:120]}"
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_latency = 0.0
+    error_rate = 0.0
+    retry_after = 1.0
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # cabeçalhos e corpo vão em write() separados: sem isto, +40 ms por pedido
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, code: int, payload: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return self._json(400, {"error": {"message": "JSON inválido"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": f"rota desconhecida: {self.path}"}})
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self._json(
+                429,
+                {"error": {"message": "Rate limit (simulado)", "type": "rate_limit_exceeded"}},
+                {"Retry-After": f"{self.retry_after:g}"},
+            )
+        texto = resposta_simulada(req.get("messages"))
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in req.get("messages") or [])
+        if req.get("stream"):
+            return self._stream(req, texto, prompt_chars)
+        self._json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": texto},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(texto) // 4,
+                "total_tokens": prompt_chars // 4 + len(texto) // 4,
+            },
+        })
+
+    def _stream(self, req: Dict[str, Any], texto: str, prompt_chars: int) -> None:
+        """Server-sent events como a API real: um pedaço por palavra e, no fim, [DONE]."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": req.get("model", "stub")}
+
+        def enviar(payload) -> None:
+            data = ("data: " + (payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)) + "\n\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        palavras = texto.split(" ")
+        try:
+            for i, w in enumerate(palavras):
+                if i and self.token_latency:
+                    time.sleep(self.token_latency)
+                delta = {"content": (w if i == 0 else " " + w)}
+                if i == 0:
+                    delta["role"] = "assistant"
+                enviar({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            enviar({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (req.get("stream_options") or {}).get("include_usage"):
+                enviar({**base, "choices": [], "usage": {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": len(palavras),
+                    "total_tokens": prompt_chars // 4 + len(palavras),
+                }})
+            enviar("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # cliente cancelou a meio
+
+def start_stub(
+    port: int = 0, latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0,
+    token_latency: float = 0.0,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Arranca o stub numa thread em segundo plano; devolve (servidor, base_url).
+
+    `latency` é o tempo até à resposta (ou ao primeiro token, em streaming),
+    `token_latency` o intervalo entre tokens e `error_rate` a fração de pedidos
+    respondidos com 429 + Retry-After.
+    """
+    handler = type("Handler", (StubHandler,), {
+        "latency": latency, "error_rate": error_rate, "retry_after": retry_after,
+        "token_latency": token_latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub local da API OpenAI (chat.completions).")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.0, help="segundos de espera por pedido")
+    ap.add_argument("--token-latency", type=float, default=0.0, help="segundos entre tokens (streaming)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 429")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="valor do cabeçalho Retry-After")
+    args = ap.parse_args()
+    server, url = start_stub(args.port, args.latency, args.error_rate, args.retry_after, args.token_latency)
+    print(f"Stub OpenAI em {url}  (Ctrl+C para sair)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Os módulos da app estão na raiz do repositório (sem pacote).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Nada de caches nem traços em .cbiz_cache/ ao importar os módulos nos testes.
+for var in ("CBIZ_LLM_CACHE", "CBIZ_DOSSIERS", "CBIZ_TRACE"):
+    os.environ.setdefault(var, "0")
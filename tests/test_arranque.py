@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Orçamentos e medição partilhados com a suite de benchmarks (uma só lista a manter).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from suite import ORCAMENTO_IMPORT_MS, PESADOS, medir_import  # noqa: E402
+
+@pytest.mark.parametrize("modulo", ["app_streamlit_integrado", "autofill_llm", "autofill_extract"])
+def test_import_a_frio_dentro_do_orcamento_e_sem_pesados(modulo):
+    r = medir_import(modulo)
+    assert r["importados"] == [], f"{modulo} importa {r['importados']} só por arrancar (devem ficar entre {PESADOS})"
+    assert r["mediana_s"] <= r["orcamento_s"], (
+        f"import de {modulo}: {r['mediana_s'] * 1e3:.0f} ms > {ORCAMENTO_IMPORT_MS[modulo]:.0f} ms "
+        "(em máquinas lentas: CBIZ_BENCH_ARRANQUE_FATOR)"
+    )
@@ -0,0 +1,111 @@
+import pytest
+
+import autofill_llm
+from autofill_llm import LLMCache, cached_completion, fingerprint
+
+MSGS = [{"role": "user", "content": "Descreve a empresa."}]
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = LLMCache(str(tmp_path / "llm_cache.sqlite"), ttl_s=3600, max_bytes=1_000_000)
+    monkeypatch.setattr(autofill_llm, "_llm_cache", c)
+    return c
+
+class Pedido:
+    """Completion falsa: conta as chamadas e devolve respostas numeradas."""
+
+    def __init__(self, prefixo="resposta"):
+        self.prefixo = prefixo
+        self.n = 0
+
+    def __call__(self):
+        self.n += 1
+        return f"{self.prefixo} {self.n}"
+
+def _envelhecer(cache, segundos, chave=None):
+    db = cache._db()
+    if chave is None:
+        db.execute("UPDATE respostas SET criado = criado - ?", (segundos,))
+    else:
+        db.execute("UPDATE respostas SET criado = criado - ? WHERE chave = ?", (segundos, chave))
+    db.commit()
+
+def test_segunda_chamada_vem_do_cache(cache):
+    pedido = Pedido()
+    assert cached_completion("m", MSGS, 0.4, pedido) == "resposta 1"
+    assert cached_completion("m", MSGS, 0.4, pedido) == "resposta 1"
+    assert pedido.n == 1
+
+def test_ttl_expirado_volta_a_pedir_e_apaga_a_entrada(cache):
+    pedido = Pedido()
+    cached_completion("m", MSGS, 0.4, pedido)
+    _envelhecer(cache, cache.ttl_s + 1)
+    assert cache.get(fingerprint("m", MSGS, 0.4)) is None
+    assert cache.stats()["entradas"] == 0
+    assert cached_completion("m", MSGS, 0.4, pedido) == "resposta 2"
+
+def test_dentro_do_ttl_continua_valida(cache):
+    pedido = Pedido()
+    cached_completion("m", MSGS, 0.4, pedido)
+    _envelhecer(cache, cache.ttl_s - 60)
+    assert cached_completion("m", MSGS, 0.4, pedido) == "resposta 1"
+
+def test_put_limpa_entradas_expiradas(cache):
+    cache.put("velha", "m", "x", 0.1)
+    _envelhecer(cache, cache.ttl_s + 1, "velha")
+    cache.put("nova", "m", "y", 0.1)
+    assert cache.stats()["entradas"] == 1
+
+def test_limite_de_tamanho_remove_as_menos_usadas(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite"), ttl_s=3600, max_bytes=30)
+    for chave in ("a", "b", "c"):
+        cache.put(chave, "m", chave * 10, 0.1)   # 10 bytes cada: 30, no limite
+    db = cache._db()
+    db.executemany("UPDATE respostas SET usado = ? WHERE chave = ?", [(1, "a"), (2, "b"), (3, "c")])
+    db.commit()
+    assert cache.get("a") == "a" * 10   # "a" foi a primeira a entrar, mas passa a ser a última usada
+    cache.put("d", "m", "d" * 10, 0.1)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in ("a", "c", "d")] == ["a" * 10, "c" * 10, "d" * 10]
+    assert cache.stats()["bytes"] == 30
+
+def test_regenerar_ignora_a_leitura_mas_guarda_a_resposta_nova(cache):
+    pedido = Pedido()
+    cached_completion("m", MSGS, 0.4, pedido)
+    assert cached_completion("m", MSGS, 0.4, pedido, regenerar=True) == "resposta 2"
+    assert cached_completion("m", MSGS, 0.4, pedido) == "resposta 2"
+    assert pedido.n == 2
+
+def test_erros_nao_ficam_em_cache(cache):
+    def falha():
+        raise RuntimeError("429")
+
+    with pytest.raises(RuntimeError):
+        cached_completion("m", MSGS, 0.4, falha)
+    assert cache.stats()["entradas"] == 0
+
+@pytest.mark.parametrize("outro", [
+    ("m2", MSGS, 0.4),
+    ("m", [{"role": "user", "content": "Descreve a empresa!"}], 0.4),
+    ("m", MSGS + [{"role": "assistant", "content": "ok"}], 0.4),
+    ("m", MSGS, 0.7),
+])
+def test_chave_muda_com_modelo_prompt_e_parametros(cache, outro):
+    pedido = Pedido()
+    cached_completion("m", MSGS, 0.4, pedido)
+    assert fingerprint(*outro) != fingerprint("m", MSGS, 0.4)
+    assert cached_completion(*outro, pedido) == "resposta 2"
+
+def test_chave_ignora_ordem_das_chaves_e_ruido_na_temperatura():
+    invertidas = [{"content": "Descreve a empresa.", "role": "user"}]
+    assert fingerprint("m", invertidas, 0.4) == fingerprint("m", MSGS, 0.40000001)
+
+def test_stats_de_hits_e_latencia_poupada(cache):
+    cache.put("k", "m", "texto", latencia=1.5)
+    assert cache.get("k") == "texto"
+    assert cache.get("k") == "texto"
+    assert cache.get("outra") is None
+    st = cache.stats()
+    assert (st["hits"], st["misses"], st["entradas"]) == (2, 1, 1)
+    assert st["hit_rate"] == pytest.approx(2 / 3)
+    assert 2.9 < st["latencia_poupada_s"] <= 3.0
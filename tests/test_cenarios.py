@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import autofill_cenarios
+from autofill_cenarios import analise_sensibilidade, avaliar_cenarios, cenarios_grelha, cenarios_monte_carlo, ponto_equilibrio
+from autofill_core_bp import calcular_financeiros
+
+ANOS = [2025, 2026, 2027, 2028]
+ASSUM = {
+    "crescimento_receitas": 0.08, "margem_bruta_target": 0.55, "fse_pct_receitas": 0.12,
+    "encargos_sociais_pct": 0.2375, "aumento_salarios_pct": 0.03,
+    "emprestimo_montante": 40_000.0, "emprestimo_taxa": 0.06, "emprestimo_anos": 3,
+}
+VENDAS = pd.DataFrame({"designacao": ["A", "B", "C"], "preco": [12.5, 40.0, 3.2], "qtd_mensal": [300, 45, 900], "meses_y1": [12, 9, 12]})
+PESSOAL = pd.DataFrame({"funcao": ["Gestor", "Técnico"], "venc_mensal": [1800.0, 1150.0], "n": [1, 2], "meses": [14, 14]})
+INVESTIMENTO = pd.DataFrame({
+    "tipo": ["equipamento", "informatica", "veiculos"], "descricao": ["Forno", "Portátil", "Carrinha"],
+    "valor": [12_000.0, 1_500.0, 18_000.0],
+})
+
+def _dr(assum=ASSUM, vendas=VENDAS) -> pd.DataFrame:
+    dr = calcular_financeiros(ANOS, assum, vendas, PESSOAL, INVESTIMENTO)["dr"]
+    return dr.set_index("rubrica")[[str(a) for a in ANOS]]
+
+# --- Ponto de equilíbrio: o valor encontrado, devolvido a calcular_financeiros
+
+def _metrica(dr: pd.DataFrame, ano: int, alvo: str) -> float:
+    linha = dr.loc["Resultado"]
+    return float(linha[: str(ano)].sum() if alvo == "resultado_acumulado" else linha[str(ano)])
+
+def _com_valor(variavel, item, valor):
+    if item is None:
+        return {**ASSUM, variavel: valor}, VENDAS
+    vendas = VENDAS.copy()
+    vendas[variavel] = vendas[variavel].astype(float)
+    vendas.loc[item, variavel] = valor
+    return ASSUM, vendas
+
+@pytest.mark.parametrize("variavel, item, passo, ano, minimo, alvo", [
+    ("qtd_mensal", 0, None, 2025, 0.0, "resultado"),
+    ("preco", 1, 0.01, 2026, 5_000.0, "resultado"),
+    ("margem_bruta_target", None, 0.0001, 2025, 0.0, "resultado"),
+    ("crescimento_receitas", None, 0.0001, 2028, -20_000.0, "resultado"),
+    ("emprestimo_montante", None, 1.0, 2027, -120_000.0, "resultado_acumulado"),
+])
+def test_ponto_equilibrio_confirmado_pelo_modelo_completo(variavel, item, passo, ano, minimo, alvo):
+    r = ponto_equilibrio(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, variavel, ano=ano, minimo=minimo, alvo=alvo, item=item, passo=passo)
+    assert r["atingido"]
+    passo = passo or 1.0   # qtd_mensal de um item: unidades inteiras
+    valor = r["valor"]
+    dr = _dr(*_com_valor(variavel, item, valor))
+    assert _metrica(dr, ano, alvo) >= minimo
+    assert r["resultado"] == pytest.approx(dr.loc["Resultado"].tolist())
+    # um passo para o lado que não cumpre já falha a meta
+    fora = valor - passo if r["sentido"] == "minimo" else valor + passo
+    assert _metrica(_dr(*_com_valor(variavel, item, fora)), ano, alvo) < minimo
+
+def test_ponto_equilibrio_sentido_do_emprestimo_e_maximo():
+    r = ponto_equilibrio(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, "emprestimo_montante", ano=2027, minimo=-120_000.0,
+                         alvo="resultado_acumulado", passo=1.0)
+    assert r["sentido"] == "maximo"
+
+# --- _avaliar vetorizado = calcular_financeiros cenário a cenário
+
+GRELHA = {
+    "crescimento_receitas": [-0.05, 0.0, 0.12],
+    "margem_bruta_target": [0.3, 0.55],
+    "fse_pct_receitas": [0.08, 0.2],
+    "aumento_salarios_pct": [0.0, 0.05],
+    "emprestimo_montante": [0.0, 25_000.0],
+    "emprestimo_anos": [2, 5],
+    "dep_equipamento_anos": [3, 8],
+}
+
+def _comparar_com_completo(variacoes, res):
+    s = len(next(iter(variacoes.values())))
+    for i in range(s):
+        dr = _dr({**ASSUM, **{k: float(v[i]) for k, v in variacoes.items()}})
+        np.testing.assert_array_equal(res["resultado"][i], dr.loc["Resultado"].to_numpy())
+        np.testing.assert_array_equal(res["vendas"][i], dr.loc["Vendas/Serviços"].to_numpy())
+        np.testing.assert_array_equal(res["pessoal"][i], dr.loc["Pessoal"].to_numpy())
+        np.testing.assert_array_equal(res["juros"][i], dr.loc["Juros"].to_numpy())
+
+def test_avaliar_igual_a_calcular_financeiros_por_cenario():
+    variacoes = cenarios_grelha(GRELHA)
+    res = avaliar_cenarios(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, variacoes, workers=1)
+    assert res["resultado"].shape == (len(variacoes["crescimento_receitas"]), len(ANOS))
+    _comparar_com_completo(variacoes, res)
+
+def test_avaliar_em_blocos_e_threads_igual_ao_sequencial(monkeypatch):
+    variacoes = cenarios_monte_carlo({
+        "crescimento_receitas": ("normal", 0.05, 0.04),
+        "margem_bruta_target": ("uniforme", 0.4, 0.6),
+        "encargos_sociais_pct": ("triangular", 0.2, 0.2375, 0.3),
+    }, n=50, seed=3)
+    sequencial = avaliar_cenarios(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, variacoes, workers=1)
+    monkeypatch.setattr(autofill_cenarios, "CENARIOS_CHUNK", 7)
+    monkeypatch.setattr(autofill_cenarios, "CENARIOS_MIN_PARALELO", 0)
+    paralelo = avaliar_cenarios(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, variacoes, workers=3)
+    for k in sequencial:
+        np.testing.assert_array_equal(paralelo[k], sequencial[k])
+    _comparar_com_completo({k: v[:10] for k, v in variacoes.items()}, {k: v[:10] for k, v in paralelo.items()})
+
+def test_sem_variacoes_e_a_dr():
+    res = avaliar_cenarios(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, {})
+    np.testing.assert_array_equal(res["resultado"][0], _dr().loc["Resultado"].to_numpy())
+
+def test_pressuposto_desconhecido_e_erro():
+    with pytest.raises(ValueError):
+        avaliar_cenarios(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, {"capitais_proprios_iniciais": [1.0]})
+
+# --- Monte Carlo com semente fixa
+
+DISTRIBUICOES = {
+    "crescimento_receitas": ("normal", 0.06, 0.03),
+    "margem_bruta_target": ("triangular", 0.45, 0.55, 0.6),
+    "emprestimo_taxa": ("uniforme", 0.03, 0.09),
+    "fse_pct_receitas": ("lognormal", -2.1, 0.2),
+}
+
+def test_monte_carlo_com_semente_e_deterministico():
+    a = cenarios_monte_carlo(DISTRIBUICOES, n=500, seed=7)
+    b = cenarios_monte_carlo(DISTRIBUICOES, n=500, seed=7)
+    assert list(a) == list(DISTRIBUICOES)
+    for k in a:
+        np.testing.assert_array_equal(a[k], b[k])
+    c = cenarios_monte_carlo(DISTRIBUICOES, n=500, seed=8)
+    assert not np.array_equal(a["crescimento_receitas"], c["crescimento_receitas"])
+
+def test_bandas_com_semente_sao_reprodutiveis():
+    kw = dict(distribuicoes=DISTRIBUICOES, grelha={"emprestimo_montante": [0.0, 40_000.0]}, n=400, seed=11)
+    a = analise_sensibilidade(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, **kw)
+    b = analise_sensibilidade(ANOS, ASSUM, VENDAS, PESSOAL, INVESTIMENTO, **kw)
+    pd.testing.assert_frame_equal(a, b)
+    assert a["indicador"].tolist()[-2:] == ["Média", "Prob. Resultado < 0 (%)"]
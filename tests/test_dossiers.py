@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from autofill_dossiers import DossierStore
+
+@pytest.fixture
+def store(tmp_path):
+    return DossierStore(str(tmp_path / "dossiers.sqlite"), str(tmp_path / "blobs"))
+
+def _ficheiros_blob(store):
+    return [f for _, _, fs in os.walk(store.blobs) for f in fs]
+
+def test_mesmo_conteudo_ocupa_um_blob(store):
+    a, b = store.novo_id(), store.novo_id()
+    d1 = store.guardar_anexo(a, "plano.pdf", b"%PDF conteudo")
+    d2 = store.guardar_anexo(b, "copia.pdf", b"%PDF conteudo")
+    assert d1 == d2
+    assert store.stats() == {"dossiers": 2, "blobs": 1, "bytes": 13, "anexos": 2}
+    assert _ficheiros_blob(store) == [d1]
+
+def test_remover_mantem_blob_ligado_a_outro_dossier(store):
+    a, b = store.novo_id(), store.novo_id()
+    digest = store.guardar_anexo(a, "x.docx", b"partilhado")
+    store.guardar_anexo(b, "x.docx", b"partilhado")
+
+    store.remover_anexo(a, digest)
+    assert store.anexos(a) == []
+    assert [x.getvalue() for x in store.anexos(b)] == [b"partilhado"]
+
+    store.remover_anexo(b, digest)
+    assert store.stats()["blobs"] == 0
+    assert _ficheiros_blob(store) == []
+
+def test_voltar_a_ligar_blob_removido_reescreve_o_ficheiro(store):
+    a, b = store.novo_id(), store.novo_id()
+    digest = store.guardar_anexo(a, "x.pdf", b"conteudo")
+    store.remover_anexo(a, digest)
+    store.guardar_anexo(b, "x.pdf", b"conteudo")
+    assert store.anexos(b)[0].getvalue() == b"conteudo"
+
+def test_reabrir_depois_de_recarregar(store, tmp_path):
+    d = store.novo_id()
+    store.guardar_campos(d, {"empresa_nome": "ACME", "modo_historial": "Ambos"}, nome="ACME")
+    digest = store.guardar_anexo(d, "contas.xlsx", b"PK xlsx", texto="Vendas 100", extrator="xlsx:1")
+    store.guardar_campos(d, {"empresa_nome": "ACME Lda"})
+
+    outro = DossierStore(store.path, store.blobs)  # como depois de reiniciar o servidor
+    aberto = outro.abrir(d)
+    assert aberto["nome"] == "ACME"
+    assert aberto["campos"] == {"empresa_nome": "ACME Lda", "modo_historial": "Ambos"}
+    assert [(x.name, x.file_id, x.getvalue()) for x in aberto["anexos"]] == [("contas.xlsx", digest, b"PK xlsx")]
+    assert aberto["textos"] == {digest: ("xlsx:1", "Vendas 100")}
+    assert outro.abrir("nao-existe") is None
+
+def test_blob_apagado_por_outra_sessao_entre_verificar_e_ligar(store, monkeypatch):
+    a, b = store.novo_id(), store.novo_id()
+    digest = store.guardar_anexo(a, "x.pdf", b"conteudo")
+    existe = os.path.exists
+    chamadas = []
+
+    def existe_e_remove(p):
+        # A 1.ª verificação vê o blob; logo a seguir outra sessão retira a última ligação.
+        r = existe(p)
+        if not chamadas and p.endswith(digest):
+            chamadas.append(p)
+            store.remover_anexo(a, digest)
+        return r
+
+    monkeypatch.setattr(os.path, "exists", existe_e_remove)
+    store.guardar_anexo(b, "x.pdf", b"conteudo")
+    monkeypatch.undo()
+    assert chamadas
+    assert store.anexos(b)[0].getvalue() == b"conteudo"
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import autofill_llm
+from autofill_llm import INTERATIVO, LOTE, Escalonador, origem_pedido
+
+def _ate(cond, timeout: float = 5.0) -> None:
+    t0 = time.monotonic()
+    while not cond():
+        assert time.monotonic() - t0 < timeout, "condição não chegou a acontecer"
+        time.sleep(0.005)
+
+def _em_thread(fn, *args):
+    t = threading.Thread(target=fn, args=args, daemon=True)
+    t.start()
+    return t
+
+def _ocupar(esc: Escalonador, livre: threading.Event):
+    """Ocupa a única vaga até `livre` (o resto da fila fica à espera, por ordem de chegada)."""
+    def ocupar():
+        with origem_pedido("ocupa", INTERATIVO), esc.vez():
+            livre.wait()
+    t = _em_thread(ocupar)
+    _ate(lambda: esc.stats()["ativos"] == 1)
+    return t
+
+def _enfileirar(esc: Escalonador, pedidos, ordem):
+    def pedir(sessao, prioridade, nome):
+        with origem_pedido(sessao, prioridade), esc.vez():
+            ordem.append(nome)
+    threads = []
+    for sessao, prioridade, nome in pedidos:
+        n = esc.stats()["em_fila"]
+        threads.append(_em_thread(pedir, sessao, prioridade, nome))
+        _ate(lambda: esc.stats()["em_fila"] == n + 1)  # um de cada vez: a ordem de chegada é a da lista
+    return threads
+
+def test_sessoes_servidas_a_vez():
+    esc, livre, ordem = Escalonador(max_concorrencia=1), threading.Event(), []
+    ocupa = _ocupar(esc, livre)
+    threads = _enfileirar(esc, [
+        ("A", INTERATIVO, "a1"), ("A", INTERATIVO, "a2"), ("A", INTERATIVO, "a3"),
+        ("B", INTERATIVO, "b1"), ("B", INTERATIVO, "b2"),
+    ], ordem)
+    livre.set()
+    for t in [ocupa, *threads]:
+        t.join(5)
+    assert ordem == ["a1", "b1", "a2", "b2", "a3"]
+
+def test_cliques_antes_dos_lotes():
+    esc, livre, ordem = Escalonador(max_concorrencia=1), threading.Event(), []
+    ocupa = _ocupar(esc, livre)
+    threads = _enfileirar(esc, [("A", LOTE, "lote1"), ("A", LOTE, "lote2"), ("B", INTERATIVO, "clique")], ordem)
+    livre.set()
+    for t in [ocupa, *threads]:
+        t.join(5)
+    assert ordem == ["clique", "lote1", "lote2"]
+
+def test_pedidos_iguais_fundidos_numa_chamada():
+    esc, livre, chamadas, resultados = Escalonador(), threading.Event(), [], []
+
+    def fn():
+        chamadas.append(1)
+        livre.wait()
+        return "texto"
+
+    def pedir():
+        resultados.append(esc.executar("mesma-chave", fn))
+
+    threads = [_em_thread(pedir)]
+    _ate(lambda: chamadas)
+    threads += [_em_thread(pedir) for _ in range(3)]
+    _ate(lambda: esc.stats()["fundidos"] == 3)
+    livre.set()
+    for t in threads:
+        t.join(5)
+    assert resultados == ["texto"] * 4
+    assert len(chamadas) == 1 and esc.stats()["pedidos"] == 1
+
+def test_quem_chega_depois_de_todos_desistirem_abre_pedido_novo():
+    esc, continuar, aberturas = Escalonador(), threading.Event(), []
+
+    def abrir(voo):
+        aberturas.append(voo)
+        yield "a"
+        if len(aberturas) == 1:
+            continuar.wait(5)  # o 1.º pedido fica a meio até o leitor ter desistido
+        yield "b"
+
+    primeiro = esc.stream("k", abrir)
+    assert next(primeiro) == "a"
+    primeiro.close()  # o único leitor desiste; o _bombear ainda não reparou
+    assert aberturas[0].leitores == 0 and esc.stats()["em_voo"] == 1
+
+    segundo = esc.stream("k", abrir)
+    assert next(segundo) == "a"
+    continuar.set()
+    assert list(segundo) == ["b"]
+    assert len(aberturas) == 2 and esc.stats()["fundidos"] == 0
+
+def test_limite_de_tokens_por_minuto_trava_e_liberta(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(autofill_llm.time, "monotonic", lambda: agora[0])
+    esc, feitos = Escalonador(max_concorrencia=4, tpm=100), []
+    with esc.vez(tokens=80):
+        pass
+
+    def pedir():
+        with esc.vez(tokens=50):
+            feitos.append(1)
+
+    t = _em_thread(pedir)
+    _ate(lambda: esc.stats()["em_fila"] == 1)
+    time.sleep(0.1)
+    assert not feitos and esc.stats()["tokens_minuto"] == 80
+
+    agora[0] += 61  # a janela de um minuto já não conta os 80 tokens
+    with esc._cond:
+        esc._cond.notify_all()
+    t.join(5)
+    assert feitos and esc.stats()["tokens_minuto"] == 50
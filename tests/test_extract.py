@@ -0,0 +1,42 @@
+import io
+
+import openpyxl
+
+from autofill_extract import XLSX_MAX_CHARS_PER_SHEET, _cache, _ler_xlsx, extract_text_from_xlsx
+
+def _xlsx(folhas) -> bytes:
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for nome, linhas in folhas.items():
+        ws = wb.create_sheet(nome)
+        ws.append(["conta", "descricao"])
+        for i in range(linhas):
+            ws.append([f"C{i}", f"descrição da conta número {i} do plano"])
+    b = io.BytesIO()
+    wb.save(b)
+    return b.getvalue()
+
+def test_orcamento_abaixo_do_maximo_sem_cortar_e_completo():
+    b = _xlsx({"Vendas": 5, "Custos": 5})
+    cheio = _ler_xlsx(b)[0]
+    assert len(cheio) < 2_000 < XLSX_MAX_CHARS_PER_SHEET
+    assert _ler_xlsx(b, budget=2_000) == (cheio, True)
+
+def test_orcamento_que_corta_linhas_nao_e_completo():
+    b = _xlsx({"Notas": 60})
+    cheio = _ler_xlsx(b)[0]
+    txt, completo = _ler_xlsx(b, budget=len(cheio) // 2)
+    assert not completo and txt != cheio
+
+def test_folhas_por_abrir_nao_e_completo():
+    b = _xlsx({"A": 40, "B": 40})
+    cheio = _ler_xlsx(b)[0]
+    txt, completo = _ler_xlsx(b, budget=cheio.index("\n### Folha: B"))  # a folha A inteira esgota-o
+    assert not completo and "### Folha: B" not in txt
+
+def test_leitura_completa_com_orcamento_vai_para_o_cache():
+    b = _xlsx({"Resumo": 3})
+    chave = _cache.make_key("xlsx", b)
+    assert _cache.peek(chave) is None
+    txt = extract_text_from_xlsx(b, budget=1_000)
+    assert _cache.peek(chave) == txt
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import autofill_llm
+from autofill_llm import backoff_delay, cached_completion, chat_texto, gerar_em_lote, gerar_em_lote_sync, with_retry
+from openai_stub import start_stub
+
+class Erro429(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str):
+        super().__init__("rate limit")
+        self.response = type("R", (), {"status_code": 429, "headers": {"retry-after": retry_after}})()
+
+def test_backoff_respeita_retry_after_acima_do_limite():
+    assert backoff_delay(0, retry_after=60.0) >= 60.0
+    assert backoff_delay(0, retry_after=2.0) >= 2.0
+    assert backoff_delay(0) <= autofill_llm.LLM_BACKOFF_BASE
+
+def test_retry_after_acima_do_limite_falha_logo(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(autofill_llm.time, "sleep", esperas.append)
+    chamadas = []
+
+    def fn():
+        chamadas.append(1)
+        raise Erro429(str(autofill_llm.LLM_BACKOFF_MAX + 30))
+
+    with pytest.raises(Erro429):
+        with_retry(fn)
+    assert chamadas == [1] and esperas == []
+
+def test_retry_after_curto_espera_e_repete(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(autofill_llm.time, "sleep", esperas.append)
+    respostas = iter([Erro429("3"), "ok"])
+
+    def fn():
+        r = next(respostas)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    assert with_retry(fn) == "ok"
+    assert len(esperas) == 1 and esperas[0] >= 3.0
+
+# --- Geração em lote contra o stub local da API
+
+@pytest.fixture
+def stub():
+    """Arranca stubs da API (`stub(latency=..., error_rate=...)`) e devolve um cliente para cada um."""
+    from openai import OpenAI
+
+    servidores = []
+
+    def _arrancar(**kw):
+        servidor, url = start_stub(**kw)
+        servidores.append(servidor)
+        return OpenAI(api_key="stub", base_url=url, max_retries=0)
+
+    yield _arrancar
+    for s in servidores:
+        s.shutdown()
+        s.server_close()
+
+def _mensagens(chave):
+    return [{"role": "user", "content": f"Escreve a secção {chave}."}]
+
+def test_lote_respeita_a_concorrencia_e_entrega_na_thread_de_quem_chama(stub):
+    cliente = stub(latency=0.1)
+    em_voo, pico, lock = [0], [0], threading.Lock()
+
+    def tarefa(chave):
+        def fn():
+            with lock:
+                em_voo[0] += 1
+                pico[0] = max(pico[0], em_voo[0])
+            try:
+                msgs = _mensagens(chave)
+                return cached_completion("stub", msgs, 0.4, lambda: chat_texto(cliente, "stub", msgs, 0.4))
+            finally:
+                with lock:
+                    em_voo[0] -= 1
+        return fn
+
+    chamadas = []
+    tarefas = {f"campo_{i}": tarefa(f"campo_{i}") for i in range(8)}
+    res = gerar_em_lote_sync(
+        tarefas, max_concorrencia=3,
+        on_result=lambda k, txt, feitos, total, dt: chamadas.append((k, feitos, total, threading.get_ident())),
+    )
+    assert pico[0] == 3
+    assert sorted(k for k, *_ in chamadas) == sorted(tarefas)
+    assert [feitos for _, feitos, _, _ in chamadas] == list(range(1, 9))
+    assert {total for *_, total, _ in chamadas} == {8}
+    assert {ident for *_, ident in chamadas} == {threading.get_ident()}
+    assert res == {k: f"[stub] Texto gerado para: Escreve a secção {k}." for k in tarefas}
+
+def test_lote_async_tambem_limita_a_concorrencia(stub):
+    cliente = stub(latency=0.05)
+    em_voo, pico, lock = [0], [0], threading.Lock()
+
+    def fn():
+        with lock:
+            em_voo[0] += 1
+            pico[0] = max(pico[0], em_voo[0])
+        try:
+            return chat_texto(cliente, "stub", _mensagens("x"), 0.4)
+        finally:
+            with lock:
+                em_voo[0] -= 1
+
+    res = asyncio.run(gerar_em_lote({f"c{i}": fn for i in range(6)}, max_concorrencia=2))
+    assert pico[0] == 2 and len(res) == 6
+
+def test_falha_e_429_nao_param_o_resto_do_lote(stub, monkeypatch):
+    monkeypatch.setattr(autofill_llm, "LLM_BACKOFF_BASE", 0.01)
+    cliente = stub(latency=0.02)
+    sempre_429 = stub(error_rate=1.0, retry_after=0)
+
+    def criar(c):
+        return lambda: c.chat.completions.create(model="stub", messages=_mensagens("429"))
+
+    def recupera():
+        # o primeiro pedido leva 429 (Retry-After: 0), a repetição vai ao servidor bom
+        clientes = iter([sempre_429, cliente])
+        return with_retry(lambda: criar(next(clientes))()).choices[0].message.content
+
+    def falha():
+        raise RuntimeError("falha injetada")
+
+    antes = autofill_llm.llm_client_stats()
+    tarefas = {
+        "ok_1": lambda: chat_texto(cliente, "stub", _mensagens("ok_1"), 0.4),
+        "falha": falha,
+        "429": lambda: chat_texto(sempre_429, "stub", _mensagens("429"), 0.4),
+        "recupera": recupera,
+        "ok_2": lambda: chat_texto(cliente, "stub", _mensagens("ok_2"), 0.4),
+    }
+    t0 = time.perf_counter()
+    res = gerar_em_lote_sync(tarefas, max_concorrencia=2)
+    assert time.perf_counter() - t0 < 10
+    depois = autofill_llm.llm_client_stats()
+
+    assert res["falha"] == "[ERRO AO GERAR]: falha injetada"
+    assert res["429"].startswith("[ERRO AO GERAR]")
+    assert res["recupera"].startswith("[stub]")
+    assert res["ok_1"].startswith("[stub]") and res["ok_2"].startswith("[stub]")
+    # o 429 permanente esgota as repetições; o outro recupera à primeira
+    assert depois["retries"] - antes["retries"] == autofill_llm.LLM_MAX_RETRIES + 1
+    assert depois["falhas"] - antes["falhas"] == 1
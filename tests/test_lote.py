@@ -0,0 +1,11 @@
+import subprocess
+import sys
+from pathlib import Path
+
+def test_lote_nao_importa_o_streamlit():
+    # Cada worker (spawn) do lote reimporta o módulo: a UI não pode vir atrás.
+    codigo = "import sys, autofill_lote; print('streamlit' in sys.modules)"
+    p = subprocess.run([sys.executable, "-c", codigo], cwd=Path(__file__).resolve().parent.parent,
+                       capture_output=True, text=True, timeout=120)
+    assert p.returncode == 0, p.stderr
+    assert p.stdout.strip() == "False"
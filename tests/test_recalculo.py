@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+import autofill_core_bp
+from autofill_core_bp import NOS_FINANCEIROS, RecalculoFinanceiro, calcular_financeiros
+
+ANOS = [2025, 2026, 2027]
+ASSUM = {
+    "crescimento_receitas": 0.08, "margem_bruta_target": 0.55, "fse_pct_receitas": 0.12,
+    "encargos_sociais_pct": 0.2375, "aumento_salarios_pct": 0.03,
+    "emprestimo_montante": 50_000.0, "emprestimo_taxa": 0.06, "emprestimo_anos": 5,
+    "capitais_proprios_iniciais": 10_000.0,
+}
+
+def _entradas():
+    vendas = pd.DataFrame({"designacao": ["A", "B"], "preco": [10.0, 25.5], "qtd_mensal": [100, 40], "meses_y1": [12, 6]})
+    pessoal = pd.DataFrame({"funcao": ["Gestor", "Técnico"], "venc_mensal": [1500.0, 1100.0], "n": [1, 2], "meses": [14, 14]})
+    investimento = pd.DataFrame({"tipo": ["equipamento", "informatica"], "descricao": ["Forno", "Portátil"], "valor": [8000.0, 1200.0]})
+    return {"anos": list(ANOS), "assum": dict(ASSUM), "vendas_df": vendas, "pessoal_df": pessoal, "investimento_df": investimento}
+
+def _assum(**kw):
+    def f(e):
+        e["assum"].update(kw)
+    return f
+
+def _celula(df, coluna, valor, linha=0):
+    def f(e):
+        e[df] = e[df].copy()
+        e[df].loc[linha, coluna] = valor
+    return f
+
+def _linha_nova(e):
+    e["vendas_df"] = pd.concat([e["vendas_df"], pd.DataFrame([{"designacao": "C", "preco": 3.0, "qtd_mensal": 500, "meses_y1": 12}])], ignore_index=True)
+
+def _mais_um_ano(e):
+    e["anos"] = ANOS + [2028]
+
+A_JUSANTE_DE_VENDAS = ["vendas", "cogs", "fse", "dr", "balanco"]
+# alteração → nós que têm de voltar a correr (pela ordem de NOS_FINANCEIROS)
+ALTERACOES = {
+    "preco de uma venda": (_celula("vendas_df", "preco", 12.0), A_JUSANTE_DE_VENDAS),
+    "nova linha de vendas": (_linha_nova, A_JUSANTE_DE_VENDAS),
+    "crescimento": (_assum(crescimento_receitas=0.1), A_JUSANTE_DE_VENDAS),
+    "margem": (_assum(margem_bruta_target=0.5), ["cogs", "dr"]),
+    "% FSE": (_assum(fse_pct_receitas=0.2), ["fse", "dr"]),
+    "vencimento": (_celula("pessoal_df", "venc_mensal", 1600.0), ["pessoal", "dr"]),
+    "encargos sociais": (_assum(encargos_sociais_pct=0.25), ["pessoal", "dr"]),
+    "valor de um bem": (_celula("investimento_df", "valor", 9000.0), ["depreciacoes", "dr", "balanco"]),
+    "descrição de um bem": (_celula("investimento_df", "descricao", "Forno a lenha"), ["depreciacoes", "dr"]),
+    "vida útil": (_assum(dep_equipamento_anos=4), ["depreciacoes", "dr"]),
+    "taxa do empréstimo": (_assum(emprestimo_taxa=0.07), ["financiamento", "dr"]),
+    "capitais próprios": (_assum(capitais_proprios_iniciais=20_000.0), ["balanco"]),
+    "pressuposto que nenhum nó lê": (_assum(outro=1), []),
+    "mais um ano": (_mais_um_ano, list(NOS_FINANCEIROS)),
+}
+
+@pytest.fixture
+def execucoes(monkeypatch):
+    """Conta as chamadas reais de cada função de nó."""
+    chamadas = []
+    for nome, (fn, deps, ks, fatias) in list(NOS_FINANCEIROS.items()):
+        def contar(*a, _fn=fn, _nome=nome):
+            chamadas.append(_nome)
+            return _fn(*a)
+        monkeypatch.setitem(autofill_core_bp.NOS_FINANCEIROS, nome, (contar, deps, ks, fatias))
+    return chamadas
+
+def _iguais(incremental, completo):
+    assert list(incremental) == list(completo)
+    for nome in completo:
+        pd.testing.assert_frame_equal(incremental[nome], completo[nome])
+
+@pytest.mark.parametrize("alteracao", list(ALTERACOES))
+def test_recalculo_igual_ao_completo_e_so_nos_dependentes(alteracao, execucoes):
+    alterar, esperados = ALTERACOES[alteracao]
+    rec, e = RecalculoFinanceiro(), _entradas()
+    rec.calcular(**e)
+    execucoes.clear()
+
+    alterar(e)
+    res = rec.calcular(**e)
+    assert execucoes == esperados
+    assert rec.ultimos == esperados
+    assert set(rec.stats()["reutilizados"]) == set(NOS_FINANCEIROS) - set(esperados)
+    execucoes.clear()
+    _iguais(res, calcular_financeiros(**e))
+
+def test_sem_alteracoes_nada_corre(execucoes):
+    rec, e = RecalculoFinanceiro(), _entradas()
+    primeiro = rec.calcular(**e)
+    assert execucoes == list(NOS_FINANCEIROS)
+    execucoes.clear()
+    _iguais(rec.calcular(**_entradas()), primeiro)
+    assert execucoes == [] and rec.ultimos == []
+
+def test_alteracoes_seguidas_continuam_iguais_ao_completo():
+    rec, e = RecalculoFinanceiro(), _entradas()
+    rec.calcular(**e)
+    for alterar, _ in ALTERACOES.values():
+        alterar(e)
+        _iguais(rec.calcular(**e), calcular_financeiros(**e))
+
+def test_tabelas_devolvidas_sao_copias():
+    rec, e = RecalculoFinanceiro(), _entradas()
+    dr = rec.calcular(**e)["dr"]
+    dr.iloc[0, 1] = -1.0
+    _iguais(rec.calcular(**e), calcular_financeiros(**e))
+
+def test_limpar_volta_a_calcular_tudo(execucoes):
+    rec, e = RecalculoFinanceiro(), _entradas()
+    rec.calcular(**e)
+    rec.limpar()
+    execucoes.clear()
+    rec.calcular(**e)
+    assert execucoes == list(NOS_FINANCEIROS)
+    assert rec.stats()["reutilizados"] == {}
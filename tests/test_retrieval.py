@@ -0,0 +1,122 @@
+import hashlib
+
+import pytest
+
+from autofill_retrieval import IndiceBM25, sincronizar, tokens
+
+def _doc(tema: str, n: int = 20) -> str:
+    """n parágrafos de ~200 letras sobre `tema` (cada um vira parte de um pedaço)."""
+    return "\n\n".join(
+        f"Parágrafo {i} sobre {tema}. " + f"O {tema} da empresa é descrito aqui com detalhe suficiente. " * 3
+        for i in range(n)
+    )
+
+DOCS = {
+    "mercado.pdf": _doc("mercado") + "\n\nOs concorrentes diretos são três padarias no bairro.",
+    "equipa.docx": _doc("recrutamento"),
+    "contas.xlsx": _doc("financiamento") + "\n\nO empréstimo bancário tem taxa fixa de 6%.",
+}
+
+def _digest(txt: str) -> str:
+    return hashlib.sha256(txt.encode()).hexdigest()
+
+def _indice(docs=DOCS) -> IndiceBM25:
+    ind = IndiceBM25()
+    for nome, txt in docs.items():
+        ind.adicionar(nome, _digest(txt), txt)
+    return ind
+
+def _ficheiros(ind, pids):
+    return {ind._docs[ind._pedacos[pid][0]][0] for pid in pids}
+
+# --- adicionar / remover
+
+def test_adicionar_indexa_e_repetir_nao_duplica():
+    ind = _indice()
+    antes = ind.stats()
+    assert antes["ficheiros"] == 3 and antes["pedacos"] >= 3
+    ind.adicionar("mercado.pdf", _digest(DOCS["mercado.pdf"]), DOCS["mercado.pdf"])
+    assert ind.stats() == antes
+    assert _ficheiros(ind, [pid for pid, _ in ind.pesquisar("concorrentes padarias", k=1)]) == {"mercado.pdf"}
+
+def test_remover_equivale_a_indexar_sem_o_documento():
+    ind = _indice()
+    ind.remover(_digest(DOCS["contas.xlsx"]))
+    sem = _indice({k: v for k, v in DOCS.items() if k != "contas.xlsx"})
+    assert ind.stats() == sem.stats()
+    assert ind._total_tokens == sem._total_tokens and ind._total_chars == sem._total_chars
+    assert ind.pesquisar("empréstimo bancário taxa") == []
+    # mesmas pontuações (os ids dos pedaços diferem: compara-se o texto)
+    consulta = "mercado recrutamento empresa"
+    assert [(ind._pedacos[p][1], round(s, 9)) for p, s in ind.pesquisar(consulta, k=50)] == \
+        [(sem._pedacos[p][1], round(s, 9)) for p, s in sem.pesquisar(consulta, k=50)]
+    assert tokens("empréstimo")[0] not in ind._postings
+
+def test_remover_desconhecido_nao_faz_nada():
+    ind = _indice()
+    antes = ind.stats()
+    ind.remover("nao-existe")
+    assert ind.stats() == antes
+
+# --- sincronizar
+
+class Extrator:
+    def __init__(self):
+        self.pedidos = []
+
+    def __call__(self, ficheiros):
+        self.pedidos.append([nome for nome, _ in ficheiros])
+        return [b.decode() for _, b in ficheiros]
+
+def test_sincronizar_so_reindexa_o_que_mudou():
+    extrair = Extrator()
+    ind = sincronizar(IndiceBM25(), [(n, t.encode()) for n, t in DOCS.items()], extrair)
+    assert extrair.pedidos == [list(DOCS)]
+
+    sincronizar(ind, [(n, t.encode()) for n, t in DOCS.items()], extrair)
+    assert extrair.pedidos == [list(DOCS)]   # nada mudou: nada extraído
+
+    mercado = DOCS["mercado.pdf"].replace("três padarias", "quatro pastelarias")
+    atuais = [("contas.xlsx", DOCS["contas.xlsx"].encode()), ("mercado.pdf", mercado.encode())]
+    sincronizar(ind, atuais, extrair)
+    assert extrair.pedidos[-1] == ["mercado.pdf"]
+    assert len(extrair.pedidos) == 2
+    assert ind.digests() == [_digest(DOCS["contas.xlsx"]), _digest(mercado)]   # ordem dos ficheiros atuais
+    # o documento retirado e a versão antiga deixam de aparecer
+    assert "equipa.docx" not in _ficheiros(ind, [p for p, _ in ind.pesquisar("recrutamento", k=50)])
+    assert ind.pesquisar("padarias") == []
+    assert _ficheiros(ind, [p for p, _ in ind.pesquisar("pastelarias")]) == {"mercado.pdf"}
+
+def test_sincronizar_sem_ficheiros_esvazia():
+    ind = sincronizar(IndiceBM25(), [(n, t.encode()) for n, t in DOCS.items()], Extrator())
+    sincronizar(ind, [], Extrator())
+    assert ind.stats() == {"ficheiros": 0, "pedacos": 0, "termos": 0}
+    assert ind.contexto("mercado", 10_000) == ""
+
+# --- contexto
+
+def test_contexto_tudo_cabe_devolve_o_texto_completo():
+    ind = _indice()
+    completo = ind.texto_completo()
+    assert ind.contexto("qualquer coisa", len(completo)) == completo
+    assert "Ficheiro: equipa.docx" in completo and "(excertos)" not in completo
+
+@pytest.mark.parametrize("orcamento", [1_400, 3_000, 6_000])
+def test_contexto_respeita_o_orcamento_e_escolhe_o_relevante(orcamento):
+    ind = _indice()
+    assert len(ind.texto_completo()) > orcamento
+    txt = ind.contexto("empréstimo bancário e taxa de financiamento", orcamento)
+    assert len(txt) <= orcamento
+    assert "Ficheiro: contas.xlsx (excertos)" in txt
+    assert "equipa.docx" not in txt
+
+def test_contexto_limita_a_k_pedacos_pela_ordem_do_documento():
+    ind = _indice()
+    txt = ind.contexto("mercado empresa", 5_000, k=2)
+    assert txt.count("[…]") + txt.count("Ficheiro:") == 2
+    pedacos = [p for p, _ in ind.pesquisar("mercado empresa", k=2)]
+    textos = [ind._pedacos[p][1] for p in sorted(pedacos)]
+    assert txt.index(textos[0]) < txt.index(textos[1])
+
+def test_contexto_orcamento_menor_que_um_pedaco_fica_vazio():
+    assert _indice().contexto("mercado", 50) == ""
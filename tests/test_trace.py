@@ -0,0 +1,40 @@
+import io
+
+import pandas as pd
+import pytest
+
+import autofill_trace
+from autofill_core_bp import build_docx_bp, build_xlsx_bp
+
+TABS = {"vendas": pd.DataFrame({"designacao": ["A"], "2025": [100.0]})}
+
+@pytest.fixture
+def spans():
+    autofill_trace.limpar()
+    autofill_trace.ativar(True, ficheiro="")
+    yield lambda nome: [s for s in autofill_trace.spans_recentes() if s["nome"] == nome]
+    autofill_trace.ativar(False)
+    autofill_trace.limpar()
+
+@pytest.mark.parametrize("em_memoria", [True, False])
+def test_bytes_do_docx_em_memoria_e_em_disco(spans, tmp_path, em_memoria):
+    destino = io.BytesIO() if em_memoria else tmp_path / "bp.docx"
+    build_docx_bp({}, TABS, {"Sumário": "texto"}, destino)
+    escritos = len(destino.getvalue()) if em_memoria else destino.stat().st_size
+    (s,) = spans("build_docx_bp")
+    assert s["bytes"] == escritos > 0
+    assert s["tabelas"] == 1 and s["seccoes"] == 1
+
+@pytest.mark.parametrize("em_memoria", [True, False])
+def test_bytes_do_xlsx_em_memoria_e_em_disco(spans, tmp_path, em_memoria):
+    destino = io.BytesIO() if em_memoria else tmp_path / "bp.xlsx"
+    build_xlsx_bp(TABS, destino)
+    escritos = len(destino.getvalue()) if em_memoria else destino.stat().st_size
+    (s,) = spans("build_xlsx_bp")
+    assert s["bytes"] == escritos > 0
+
+def test_tamanho_de_ficheiro_aberto(tmp_path):
+    with open(tmp_path / "x.bin", "wb") as f:
+        f.write(b"12345")
+        assert autofill_trace.tamanho(f) == 5
+    assert autofill_trace.tamanho(tmp_path / "x.bin") == 5
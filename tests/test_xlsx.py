@@ -0,0 +1,84 @@
+import re
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from autofill_core_bp import build_xlsx_bp, calcular_financeiros
+
+ASSUM = {"crescimento_receitas": 0.10, "margem_bruta_target": 0.40, "fse_pct_receitas": 0.15}
+ANOS = [2025, 2026, 2027]
+
+# Referência a uma célula ou a um bloco, com ou sem folha: 'VENDAS'!$B$2:$B$4, B2.
+_REF = re.compile(r"(?:'([^']+)'!)?\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?")
+_FUNCOES = {"ROUND": round, "SUM": sum, "SUMIF": lambda c, k, v: sum(b for a, b in zip(c, v) if a == k)}
+
+class Livro:
+    """Recalcula as fórmulas do XLSX (só o que o build_xlsx_bp escreve), como o Excel faria."""
+
+    def __init__(self, caminho):
+        self.wb = openpyxl.load_workbook(caminho)
+
+    def valor(self, folha, coord):
+        v = self.wb[folha][coord].value
+        if isinstance(v, str) and v.startswith("="):
+            return self._avaliar(folha, v[1:])
+        return v
+
+    def _avaliar(self, folha, expr):
+        def ref(m):
+            f, col, ini, fim = m.group(1) or folha, m.group(2), int(m.group(3)), m.group(5)
+            if fim:
+                return repr([self.valor(f, f"{col}{r}") for r in range(ini, int(fim) + 1)])
+            return repr(self.valor(f, f"{col}{ini}"))
+        return eval(_REF.sub(ref, expr), dict(_FUNCOES))
+
+@pytest.fixture
+def livro(tmp_path):
+    vendas = pd.DataFrame({"designacao": ["A", "B"], "preco": [10.0, 25.5], "qtd_mensal": [100, 40], "meses_y1": [12, 6]})
+    pessoal = pd.DataFrame({"funcao": ["Gestor"], "venc_mensal": [1500.0], "n": [1], "meses": [14]})
+    investimento = pd.DataFrame({"tipo": ["equipamento"], "descricao": ["Forno"], "valor": [8000.0]})
+    tabs = calcular_financeiros(ANOS, ASSUM, vendas, pessoal, investimento)
+    caminho = tmp_path / "bp.xlsx"
+    assert build_xlsx_bp(tabs, caminho, assum=ASSUM) > 0
+    return Livro(caminho)
+
+def test_formulas_reproduzem_os_valores_calculados(livro, tmp_path):
+    guardados = openpyxl.load_workbook(tmp_path / "bp.xlsx", data_only=True)
+    formulas = 0
+    for ws in livro.wb:
+        for linha in ws.iter_rows():
+            for c in linha:
+                if isinstance(c.value, str) and c.value.startswith("="):
+                    formulas += 1
+                    assert livro.valor(ws.title, c.coordinate) == pytest.approx(guardados[ws.title][c.coordinate].value, abs=0.01)
+    assert formulas > 0
+
+def test_vendas_dos_anos_seguintes_cogs_e_fse_sao_formulas(livro):
+    assert not str(livro.wb["VENDAS"]["B2"].value).startswith("=")   # o 1.º ano é dado
+    for folha, coord in (("VENDAS", "C2"), ("VENDAS", "D3"), ("COGS", "B2"), ("FSE", "D2")):
+        assert "'PRESSUPOSTOS'!" in livro.wb[folha][coord].value
+
+def test_mudar_uma_venda_chega_a_dr(livro):
+    antes = {c: livro.valor("DR", c) for c in ("B2", "B3", "B4", "B8", "C2")}
+    livro.wb["VENDAS"]["B2"].value += 1_000
+    assert livro.valor("VENDAS", "C2") == pytest.approx(livro.wb["VENDAS"]["B2"].value * 1.10, abs=0.01)
+    assert livro.valor("DR", "B2") - antes["B2"] == pytest.approx(1_000, abs=0.01)
+    assert livro.valor("DR", "B3") - antes["B3"] == pytest.approx(600, abs=0.01)    # COGS: 1 - margem
+    assert livro.valor("DR", "B4") - antes["B4"] == pytest.approx(150, abs=0.01)    # FSE
+    assert livro.valor("DR", "B8") - antes["B8"] == pytest.approx(250, abs=0.02)    # Resultado
+    assert livro.valor("DR", "C2") - antes["C2"] == pytest.approx(1_100, abs=0.01)
+
+def test_mudar_um_pressuposto_chega_a_dr(livro):
+    vendas = livro.valor("DR", "C2")
+    livro.wb["PRESSUPOSTOS"]["B3"].value = 0.50   # margem_bruta_target
+    assert livro.valor("COGS", "C2") == pytest.approx(round(0.50 * vendas, 2))
+    assert livro.valor("DR", "C3") == pytest.approx(round(0.50 * vendas, 2))
+
+def test_sem_pressupostos_nao_ha_folha_nem_formulas_nas_vendas(tmp_path):
+    vendas = pd.DataFrame({"designacao": ["A"], "preco": [10.0], "qtd_mensal": [10], "meses_y1": [12]})
+    tabs = calcular_financeiros(ANOS, ASSUM, vendas, pd.DataFrame(), pd.DataFrame())
+    build_xlsx_bp(tabs, tmp_path / "bp.xlsx")
+    wb = openpyxl.load_workbook(tmp_path / "bp.xlsx")
+    assert "PRESSUPOSTOS" not in wb.sheetnames
+    assert not str(wb["VENDAS"]["C2"].value).startswith("=")